@@ -0,0 +1,214 @@
+# bench/recommend.py
+"""
+Benchmark CarrierRecommendationModel.recommend_carriers on synthetic carrier tables.
+
+    python -m bench.recommend                                  # 10k / 100k / 1M rows
+    python -m bench.recommend --sizes 10000 100000 --save bench/baseline.json
+    python -m bench.recommend --compare bench/baseline.json    # exit 1 on regression
+
+For every table size it reports the snapshot build time and peak memory, and for each
+scenario (city_hit, province_fallback, miss, plus cached repeats of city hits) latency
+percentiles, throughput and peak memory. Query results are checked against the
+row-at-a-time reference in bench.reference before anything is timed.
+"""
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from bench.reference import compare_recommendations, normalize_locations, reference_recommend
+from bench.synthetic import SCENARIOS, make_carriers, make_lanes
+from src.recom import CarrierRecommendationModel, CarrierSnapshot
+from utils.cache import TTLCache
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+
+
+def quiet_logger():
+    # the model logs each result frame at INFO; keep that formatting out of the timings
+    logger = logging.getLogger("bench.recommend")
+    logger.setLevel(logging.WARNING)
+    return logger
+
+
+def get_model():
+    model = CarrierRecommendationModel(quiet_logger())
+    model.logger = quiet_logger()
+    return model
+
+
+def summarize(latencies_ms, elapsed_s):
+    values = np.asarray(latencies_ms)
+    return {
+        "queries": len(values),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+        "throughput_qps": round(len(values) / elapsed_s, 1),
+    }
+
+
+def time_queries(model, snapshot, lanes):
+    latencies = []
+    start = time.perf_counter()
+    for lane in lanes:
+        t = time.perf_counter()
+        model.recommend_carriers(snapshot, *lane)
+        latencies.append((time.perf_counter() - t) * 1000)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def peak_memory_mb(fn, *args):
+    """Peak Python heap growth while running fn (tracemalloc slows the call, so it is timed separately)."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    try:
+        result = fn(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, round((peak - base) / 2**20, 2)
+
+
+def golden_check(model, frame, snapshot, lanes_by_scenario):
+    """Compare the model with the reference on every lane; returns a list of failures."""
+    reference_frame = normalize_locations(frame)
+    failures = []
+    for scenario, lanes in lanes_by_scenario.items():
+        for lane in lanes:
+            expected = reference_recommend(model, reference_frame, *lane)
+            actual = model.recommend_carriers(snapshot, *lane)
+            for problem in compare_recommendations(expected, actual):
+                failures.append({"scenario": scenario, "lane": list(lane), "problem": problem})
+    return failures
+
+
+def run_size(rows, queries, golden_queries, seed):
+    model = get_model()
+    frame = make_carriers(rows, seed=seed)
+
+    start = time.perf_counter()
+    snapshot = CarrierSnapshot(frame, version=f"bench-{rows}-{seed}")
+    build_s = time.perf_counter() - start
+    _, build_mb = peak_memory_mb(CarrierSnapshot, frame)
+
+    lanes = {scenario: make_lanes(frame, scenario, queries, seed=seed + i) for i, scenario in enumerate(SCENARIOS)}
+    result = {
+        "rows": rows,
+        "city_lanes": len(snapshot.city_index),
+        "province_lanes": len(snapshot.province_index),
+        "build": {"seconds": round(build_s, 3), "peak_mb": build_mb},
+        "scenarios": {},
+    }
+
+    model.cache = TTLCache(maxsize=0)  # measure the computation, not the route cache
+    if golden_queries:
+        sample = {scenario: lanes[scenario][:golden_queries] for scenario in SCENARIOS}
+        result["golden"] = {"lanes": sum(map(len, sample.values())), "failures": golden_check(model, frame, snapshot, sample)}
+
+    for scenario in SCENARIOS:
+        model.recommend_carriers(snapshot, *lanes[scenario][0])  # warm-up
+        stats = time_queries(model, snapshot, lanes[scenario])
+        _, stats["peak_mb"] = peak_memory_mb(time_queries, model, snapshot, lanes[scenario][:max(1, queries // 10)])
+        result["scenarios"][scenario] = stats
+
+    model.cache = TTLCache(maxsize=4096, ttl=3600)
+    hot = lanes["city_hit"][:20] * max(1, queries // 20)
+    time_queries(model, snapshot, hot[:20])  # fill the cache
+    result["scenarios"]["city_hit_cached"] = time_queries(model, snapshot, hot)
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of p50/p95 latency against a baseline, beyond `tolerance` (0.2 = 20% slower)."""
+    regressions = []
+    for size, current in results.items():
+        previous = baseline.get("results", {}).get(size)
+        if previous is None:
+            continue
+        for scenario, stats in current["scenarios"].items():
+            before = previous["scenarios"].get(scenario)
+            if before is None:
+                continue
+            for metric in ("p50_ms", "p95_ms"):
+                ratio = stats[metric] / before[metric] if before[metric] else 1.0
+                line = f"{size:>8} rows {scenario:<18} {metric}: {before[metric]:>9.3f} -> {stats[metric]:>9.3f} ms ({ratio:.2f}x)"
+                print(line)
+                if ratio > 1 + tolerance:
+                    regressions.append(line)
+    return regressions
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor() or platform.machine(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--queries", type=int, default=200, help="queries per scenario")
+    parser.add_argument("--golden-queries", type=int, default=20, help="lanes per scenario checked against the reference (0 to skip)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--save", help="write the results as a baseline JSON file")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before failing --compare")
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings("ignore", category=pd.errors.PerformanceWarning)
+    results = {}
+    for rows in args.sizes:
+        print(f"== {rows} rows", flush=True)
+        results[str(rows)] = result = run_size(rows, args.queries, args.golden_queries, args.seed)
+        print(f"   build {result['build']['seconds']}s, {result['build']['peak_mb']} MB; "
+              f"{result['city_lanes']} city lanes, {result['province_lanes']} province lanes")
+        for scenario, stats in result["scenarios"].items():
+            print(f"   {scenario:<18} p50 {stats['p50_ms']:>8.3f} ms  p95 {stats['p95_ms']:>8.3f} ms  "
+                  f"p99 {stats['p99_ms']:>8.3f} ms  {stats['throughput_qps']:>8.1f} q/s  {stats.get('peak_mb', '-')} MB")
+        if "golden" in result:
+            failures = result["golden"]["failures"]
+            print(f"   golden: {result['golden']['lanes'] - len(failures)}/{result['golden']['lanes']} lanes match")
+            for failure in failures[:5]:
+                print(f"     {failure}")
+
+    report = {
+        "environment": environment(),
+        "settings": {"queries": args.queries, "seed": args.seed, "golden_queries": args.golden_queries},
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline written to {args.save}")
+
+    failed = any(r.get("golden", {}).get("failures") for r in results.values())
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("environment") != report["environment"]:
+            print(f"note: baseline was recorded on {baseline.get('environment')}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions beyond {args.tolerance:.0%}:")
+            print("\n".join(regressions))
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
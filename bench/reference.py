@@ -0,0 +1,91 @@
+# bench/reference.py
+"""
+Row-at-a-time reference for recommend_carriers, used as the golden output.
+
+It follows the original implementation step by step (full-table filters, per-row
+apply of the scalar scorers, sort and cut to 14) using the model's scalar `_*_m`
+methods, so the optimized path is checked against the formulas it replaced.
+"""
+import numpy as np
+import pandas as pd
+
+from src.recom import LOCATION_COLUMNS
+from utils.helpers import normalize_text
+
+AGGREGATES = {
+    'Pickup City': 'first', 'Pickup State/Province': 'first', 'Pickup Country': 'first',
+    'Destination City': 'first', 'Destination State/Province': 'first', 'Destination Country': 'first',
+    'Transport Requests': 'sum', 'Avg. Cost Per Km': 'mean', 'Estimated Amount': 'mean',
+    'Avg. Delivery Day': 'mean', 'On-time': 'mean', 'Late Delivery': 'mean', 'CountRequest': 'sum',
+}
+
+
+def normalize_locations(carrierT):
+    """The location normalization the original did on every call; done once per table here."""
+    frame = carrierT.copy()
+    frame[LOCATION_COLUMNS] = frame[LOCATION_COLUMNS].fillna('').map(normalize_text)
+    return frame
+
+
+def reference_recommend(model, frame, pickup_city, destination_city, pickup_province, dropoff_province, top_n=14):
+    """`frame` must come from normalize_locations()."""
+    city = frame[(frame['Pickup City'] == normalize_text(pickup_city)) &
+                 (frame['Destination City'] == normalize_text(destination_city))].copy()
+    city['matching_score'] = 10
+
+    remaining = frame[~frame['Carrier Name'].isin(city['Carrier Name'])].fillna(0)
+    province = remaining[(remaining['Pickup State/Province'] == normalize_text(pickup_province)) &
+                         (remaining['Destination State/Province'] == normalize_text(dropoff_province))]
+    province = province.groupby('Carrier Name').agg(AGGREGATES).reset_index()
+    province['matching_score'] = -5
+
+    carriers = pd.concat([city, province], ignore_index=True).drop_duplicates(subset='Carrier Name', keep='first')
+    if carriers.empty:
+        return carriers
+
+    max_day, min_day = carriers['Avg. Delivery Day'].max(), carriers['Avg. Delivery Day'].min()
+    max_cost, min_cost = carriers['Estimated Amount'].max(), carriers['Estimated Amount'].min()
+    carriers['Transport Eff. Score'] = carriers.apply(
+        lambda r: model._transport_eff_m(r['Avg. Delivery Day'], max_day, min_day, r['CountRequest']), axis=1)
+    carriers['Reliability Score'] = carriers.apply(
+        lambda r: model._reliability_m(r['On-time'], r['Late Delivery'], r['CountRequest']), axis=1)
+    carriers['Cost Eff. Score'] = carriers.apply(
+        lambda r: model._cost_eff_m(r['Estimated Amount'], max_cost, min_cost), axis=1)
+    carriers['CScore'] = (carriers['Transport Eff. Score'] + carriers['Reliability Score'] +
+                          carriers['Cost Eff. Score'] + carriers['matching_score'])
+    carriers['Lead Score'] = carriers['CScore'].apply(lambda s: model._categorize_intensity_dynamic(s, carriers['CScore']))
+    return carriers.sort_values(by='CScore', ascending=False)[:top_n].sort_values(by='CScore', ascending=True)
+
+
+def compare_recommendations(expected, actual, tolerance=1e-9):
+    """
+    Differences between two recommendation frames, as a list of messages (empty if equal).
+
+    Carriers, CScores and lead tiers must match. Carriers tied on score at the top-N cut-off
+    may be picked differently (the original sort was not stable), so only their scores
+    and tiers are compared.
+    """
+    if len(expected) != len(actual):
+        return [f"{len(expected)} carriers expected, got {len(actual)}"]
+    if expected.empty:
+        return []
+    problems = []
+    scores = actual['CScore'].to_numpy(dtype=float)
+    if np.any(np.diff(scores) < 0):
+        problems.append("result is not sorted by ascending CScore")
+
+    cutoff = expected['CScore'].min()
+    def rows(frame, at_cutoff):
+        mask = np.isclose(frame['CScore'], cutoff, rtol=0, atol=tolerance)
+        part = frame[mask if at_cutoff else ~mask]
+        keys = ['CScore', 'Lead Score'] if at_cutoff else ['Carrier Name', 'CScore', 'Lead Score']
+        return sorted((tuple(round(v, 9) if isinstance(v, float) else v for v in row)
+                       for row in part[keys].itertuples(index=False)), key=repr)
+
+    for at_cutoff in (False, True):
+        want, got = rows(expected, at_cutoff), rows(actual, at_cutoff)
+        if want != got:
+            missing = [r for r in want if r not in got][:3]
+            extra = [r for r in got if r not in want][:3]
+            problems.append(f"{'cut-off ties' if at_cutoff else 'carriers'} differ: missing {missing}, unexpected {extra}")
+    return problems
@@ -0,0 +1,109 @@
+# bench/synthetic.py
+"""
+Synthetic CarriersT-shaped tables and lane workloads for benchmarking recommend_carriers.
+
+City and carrier popularity follow Zipf-like weights, so a few lanes carry most of the
+rows like the real export, and sampled lanes hit popular routes more often.
+"""
+import numpy as np
+import pandas as pd
+
+COLUMNS = [
+    "Carrier Name", "Pickup City", "Pickup State/Province", "Pickup Country",
+    "Destination City", "Destination State/Province", "Destination Country",
+    "Transport Requests", "Avg. Cost Per Km", "Estimated Amount", "Avg. Delivery Day",
+    "On-time", "Late Delivery", "CountRequest",
+]
+
+COUNTRIES = {
+    "Canada": ["Ontario", "Québec", "British Columbia", "Alberta", "Manitoba", "Saskatchewan",
+               "Nova Scotia", "New Brunswick", "Newfoundland and Labrador", "Prince Edward Island"],
+    "United States": ["California", "Texas", "Florida", "New York", "Illinois", "Washington", "Georgia",
+                      "Ohio", "Michigan", "Arizona", "Colorado", "Oregon", "Nevada", "Utah"],
+}
+
+SCENARIOS = ("city_hit", "province_fallback", "miss")
+
+
+def _zipf_weights(n, exponent, rng):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def make_locations(n_cities, rng):
+    """Cities with their province and country; some names carry accents and stray case/whitespace."""
+    provinces = [(p, c) for c, ps in COUNTRIES.items() for p in ps]
+    picks = rng.integers(0, len(provinces), n_cities)
+    cities = []
+    for i, p in enumerate(picks):
+        name = f"City {i:05d}"
+        if i % 11 == 0:
+            name = f"Sainte-Émilie {i:05d}"
+        elif i % 7 == 0:
+            name = f"  city {i:05d} "
+        cities.append((name, *provinces[p]))
+    return cities
+
+
+def make_carriers(rows, seed=0, n_cities=None, n_carriers=None, city_skew=1.1, carrier_skew=0.9):
+    """A CarriersT-shaped DataFrame with `rows` lane rows."""
+    rng = np.random.default_rng(seed)
+    n_cities = n_cities or int(min(5000, max(200, rows // 40)))
+    n_carriers = n_carriers or int(min(20000, max(50, rows // 15)))
+    cities = make_locations(n_cities, rng)
+    city_weights = _zipf_weights(n_cities, city_skew, rng)
+    carrier_names = np.array([f"Carrier {i:05d} Transport Inc." for i in range(n_carriers)], dtype=object)
+
+    pickup = rng.choice(n_cities, rows, p=city_weights)
+    dropoff = rng.choice(n_cities, rows, p=city_weights)
+    carrier = rng.choice(n_carriers, rows, p=_zipf_weights(n_carriers, carrier_skew, rng))
+    city_name, province, country = (np.array(col, dtype=object) for col in zip(*cities))
+
+    count = rng.geometric(0.35, rows).astype(float)
+    on_time = np.floor(count * rng.uniform(0.5, 1.0, rows))
+    late = count - on_time
+    delivery = np.round(rng.gamma(2.0, 1.8, rows) + 1, 1)
+    amount = np.round(rng.lognormal(6.3, 0.6, rows), -1)
+
+    frame = pd.DataFrame({
+        "Carrier Name": carrier_names[carrier],
+        "Pickup City": city_name[pickup],
+        "Pickup State/Province": province[pickup],
+        "Pickup Country": country[pickup],
+        "Destination City": city_name[dropoff],
+        "Destination State/Province": province[dropoff],
+        "Destination Country": country[dropoff],
+        "Transport Requests": count.astype(int),
+        "Avg. Cost Per Km": np.where(rng.random(rows) < 0.9, np.nan, np.round(rng.uniform(1, 4, rows), 2)),
+        "Estimated Amount": amount,
+        "Avg. Delivery Day": np.where(rng.random(rows) < 0.05, np.nan, delivery),
+        "On-time": np.where(rng.random(rows) < 0.03, np.nan, on_time),
+        "Late Delivery": late,
+        "CountRequest": count,
+    }, columns=COLUMNS)
+    return frame
+
+
+def make_lanes(frame, scenario, n, seed=0):
+    """
+    `n` (pickup city, destination city, pickup province, dropoff province) queries:
+    city_hit      - a lane present in the table, sampled by row so busy lanes come up more
+    province_fallback - an unknown city pair between provinces present in the table
+    miss          - unknown cities and provinces
+    """
+    rng = np.random.default_rng(seed)
+    if scenario == "miss":
+        return [(f"Nowhere {i}", f"Nothing {i}", f"Noprov {i % 7}", f"Noprov {i % 5}") for i in range(n)]
+
+    rows = frame.iloc[rng.integers(0, len(frame), n)]
+    lanes = []
+    for i, row in enumerate(rows.itertuples(index=False)):
+        pickup_province, dropoff_province = row[2], row[5]
+        if scenario == "city_hit":
+            lanes.append((row[1], row[4], pickup_province, dropoff_province))
+        elif scenario == "province_fallback":
+            lanes.append((f"Unlisted {i}", f"Unlisted {i + 1}", pickup_province, dropoff_province))
+        else:
+            raise ValueError(f"Unknown scenario {scenario!r}")
+    return lanes
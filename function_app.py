@@ -1,56 +1,102 @@
-import azure.functions as func
-from src.funcmain import *
-import pandas as pd
-from azure.storage.blob import BlobServiceClient, BlobClient
-
-Lead = LeadHandler()
-Quote = QuoteHandler()
-
-app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
-
-@app.route(route="v1/ping", methods=['GET', 'POST'])
-async def ping(req: func.HttpRequest) -> func.HttpResponse:
-    logger.info(f'Request received from {req.url}')
-    logger.info('Ping request received.')
-    return func.HttpResponse("Service is up", status_code=200)
-
-@app.route(route="v1/leads", methods=["POST"])
-async def lead_and_pricing(req: func.HttpRequest) -> func.HttpResponse:
-    logger.info(f"Request received from {req.url}")
-        
-    body = req.get_json()
-    logger.info(f"body : {body}")
-    try:
-        response = await Lead.add_carrier_and_quotes(body)
-
-        logger.info(f"Func app :{response}")
-        return func.HttpResponse(json.dumps(response), status_code=200)
-
-    except Exception as e:
-        logger.error(f"Error processing request: {str(e)}")
-        return func.HttpResponse("Internal server error", status_code=500)
-
-@app.route(route="v1/store-quotes", methods=["POST"])
-async def store_quote_in_sql(req: func.HttpRequest) -> func.HttpResponse:
-    logger.info(f"Request received from {req.url}")
-    body = req.get_json()
-    logger.info(f"body : {body}")
-    response = await Quote.store_sql_quote(body)
-    return func.HttpResponse(json.dumps(body), status_code=200)
-
-
-@app.route(route="v1/update-quotes", methods=["POST"])
-async def update_quotes_in_sql(req: func.HttpRequest) -> func.HttpResponse:
-    logger.info(f"Request received from {req.url}")
-    body = req.get_json()
-    logger.info(f"body : {body}")
-    response = await Quote.update_sql_quote(body)
-    return func.HttpResponse(json.dumps(body), status_code=200)
-
-
-@app.route(route="v1/get-quote", methods=["GET"])
-async def get_quote_from_sql(req: func.HttpRequest) -> func.HttpResponse:
-    pickupcity = req.params.get("pickupcity")
-    destinationcity = req.params.get("destinationcity")
-    response = await Quote.get_quote(pickupcity,destinationcity)
-    return func.HttpResponse(json.dumps(response), status_code=200)
+from utils.startup import timed, startup_report
+
+with timed("import azure.functions"):
+    import azure.functions as func
+with timed("import src.funcmain"):
+    from src.funcmain import *
+from utils.tracing import TRACER
+
+Lead = LeadHandler()
+Quote = QuoteHandler()
+
+app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
+
+@app.route(route="v1/ping", methods=['GET', 'POST'])
+async def ping(req: func.HttpRequest) -> func.HttpResponse:
+    logger.info('Request received from %s', req.url)
+    logger.info('Ping request received.')
+    return func.HttpResponse("Service is up", status_code=200)
+
+@app.route(route="v1/leads", methods=["POST"])
+async def lead_and_pricing(req: func.HttpRequest) -> func.HttpResponse:
+    logger.info("Request received from %s", req.url)
+        
+    body = req.get_json()
+    log_payload(logger, "body", body)
+    try:
+        response = await Lead.add_carrier_and_quotes(body, idempotency_key=req.headers.get("Idempotency-Key"))
+
+        log_payload(logger, "Func app", response)
+        return func.HttpResponse(json.dumps(response), status_code=200)
+
+    except Exception as e:
+        logger.error(f"Error processing request: {str(e)}")
+        return func.HttpResponse("Internal server error", status_code=500)
+
+@app.route(route="v1/recommendations/batch", methods=["POST"])
+async def recommendations_batch(req: func.HttpRequest) -> func.HttpResponse:
+    logger.info("Request received from %s", req.url)
+    body = req.get_json()
+    response = await Lead.recommend_batch(body)
+
+    # ?format=ndjson (or Accept: application/x-ndjson): one JSON line per lane, in request order
+    if req.params.get("format") == "ndjson" or "application/x-ndjson" in (req.headers.get("Accept") or ""):
+        lines = response["results"] or [{"status": response["status"], "message": response.get("message")}]
+        return func.HttpResponse("".join(json.dumps(line) + "\n" for line in lines),
+                                 status_code=200, mimetype="application/x-ndjson")
+    return func.HttpResponse(json.dumps(response), status_code=200, mimetype="application/json")
+
+
+@app.route(route="v1/store-quotes", methods=["POST"])
+async def store_quote_in_sql(req: func.HttpRequest) -> func.HttpResponse:
+    logger.info("Request received from %s", req.url)
+    body = req.get_json()
+    log_payload(logger, "body", body)
+    response = await Quote.store_sql_quote(body)
+    return func.HttpResponse(json.dumps(body), status_code=200)
+
+
+@app.route(route="v1/store-quotes/batch", methods=["POST"])
+async def store_quotes_batch_in_sql(req: func.HttpRequest) -> func.HttpResponse:
+    logger.info("Request received from %s", req.url)
+    body = req.get_json()
+    response = await Quote.store_sql_quotes_batch(body)
+    return func.HttpResponse(json.dumps(response), status_code=200, mimetype="application/json")
+
+
+@app.route(route="v1/update-quotes", methods=["POST"])
+async def update_quotes_in_sql(req: func.HttpRequest) -> func.HttpResponse:
+    logger.info("Request received from %s", req.url)
+    body = req.get_json()
+    log_payload(logger, "body", body)
+    response = await Quote.update_sql_quote(body)
+    return func.HttpResponse(json.dumps(body), status_code=200)
+
+
+@app.route(route="v1/get-quote", methods=["GET"])
+async def get_quote_from_sql(req: func.HttpRequest) -> func.HttpResponse:
+    pickupcity = req.params.get("pickupcity")
+    destinationcity = req.params.get("destinationcity")
+    response = await Quote.get_quote(pickupcity,destinationcity)
+    return func.HttpResponse(json.dumps(response), status_code=200)
+
+
+@app.route(route="v1/diagnostics/startup", methods=["GET"])
+async def startup_diagnostics(req: func.HttpRequest) -> func.HttpResponse:
+    return func.HttpResponse(json.dumps(startup_report()), status_code=200, mimetype="application/json")
+
+
+@app.route(route="v1/diagnostics/caches", methods=["GET"])
+async def cache_diagnostics(req: func.HttpRequest) -> func.HttpResponse:
+    return func.HttpResponse(json.dumps(cache_report(Lead)), status_code=200, mimetype="application/json")
+
+
+@app.route(route="v1/diagnostics/pool", methods=["GET"])
+async def pool_diagnostics(req: func.HttpRequest) -> func.HttpResponse:
+    report = {"pool": DatabaseConnection.pool_stats(), "sql_runner": SQL_RUNNER.stats()}
+    return func.HttpResponse(json.dumps(report), status_code=200, mimetype="application/json")
+
+
+@app.route(route="v1/metrics", methods=["GET"])
+async def latency_metrics(req: func.HttpRequest) -> func.HttpResponse:
+    return func.HttpResponse(json.dumps(TRACER.snapshot()), status_code=200, mimetype="application/json")
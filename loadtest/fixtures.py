@@ -0,0 +1,122 @@
+# loadtest/fixtures.py
+"""
+SQLite database and request traces for the load test.
+
+The database holds the service schema (TransportQuotation, Taxdb, Vendors) seeded from
+the carrier export: a vendor per carrier, tax rates for every province, and active
+quotes on the busiest Canadian lanes. Traces are JSON lines of
+{"endpoint": ..., "method": ..., "params": {...}, "body": {...}}.
+"""
+import json
+import random
+
+import pandas as pd
+from sqlalchemy import MetaData, create_engine
+from sqlalchemy.orm import Session
+
+from src.dbConnector import TaxDataBase, TransportQuotation, Vendor
+from utils.helpers import route_key, standardize_name
+
+TAX_RATES = {
+    "Alberta": ("GST", 5.0), "British Columbia": ("GST + PST", 12.0), "Manitoba": ("GST + PST", 12.0),
+    "New Brunswick": ("HST", 15.0), "Newfoundland and Labrador": ("HST", 15.0), "Nova Scotia": ("HST", 15.0),
+    "Ontario": ("HST", 13.0), "Prince Edward Island": ("HST", 15.0), "Quebec": ("GST + QST", 14.975),
+    "Saskatchewan": ("GST + PST", 11.0), "Northwest Territories": ("GST", 5.0), "Nunavut": ("GST", 5.0),
+    "Yukon": ("GST", 5.0),
+}
+
+ENDPOINT_MIX = {"v1/get-quote": 0.55, "v1/leads": 0.2, "v1/store-quotes": 0.15, "v1/update-quotes": 0.1}
+
+
+def busiest_lanes(carriers: pd.DataFrame, n=50, canada_only=False):
+    """[(pickup city, destination city, pickup province, dropoff province, [carrier names])], busiest first."""
+    frame = carriers.dropna(subset=["Pickup City", "Destination City"])
+    if canada_only:
+        frame = frame[(frame["Pickup Country"] == "Canada") & (frame["Destination Country"] == "Canada")]
+    keys = ["Pickup City", "Destination City", "Pickup State/Province", "Destination State/Province"]
+    grouped = frame.groupby(keys)["Carrier Name"].agg(list)
+    top = grouped[grouped.map(len).sort_values(ascending=False).index[:n]]
+    return [(*lane, names) for lane, names in top.items()]
+
+
+def create_database(path, carriers: pd.DataFrame, quote_lanes=30, seed=0):
+    """Create and seed the SQLite database at `path`; returns its connection string."""
+    url = f"sqlite:///{path}?timeout=30"
+    engine = create_engine(url)
+    TransportQuotation.metadata.create_all(engine)
+    # SQLite only allows AUTOINCREMENT on a single-column integer key, so Vendors gets plain ids here
+    vendors = Vendor.__table__.to_metadata(MetaData())
+    vendors.c.id.autoincrement = False
+    vendors.create(engine)
+
+    rng = random.Random(seed)
+    with Session(engine) as session:
+        for province, (name, rate) in TAX_RATES.items():
+            session.add(TaxDataBase(tax_id=province[:2], province=province, tax_name=name, tax_rate=rate, tax_type=name))
+        names = sorted({standardize_name(n) for n in carriers["Carrier Name"].dropna().unique()})
+        session.execute(vendors.insert(), [
+            {"id": i, "VendorName": name, "NumTransportJobs": 0, "ZohoRecordID": f"V{i:08d}"} for i, name in enumerate(names)
+        ])
+        for pickup, destination, pickup_province, dropoff_province, lane_carriers in busiest_lanes(carriers, quote_lanes, canada_only=True):
+            for carrier in rng.sample(sorted(set(lane_carriers)), k=min(3, len(set(lane_carriers)))):
+                session.add(TransportQuotation(
+                    CarrierName=carrier, CarrierID=f"V-{carrier[:8]}", PickupCity=pickup, DestinationCity=destination,
+                    PickupKey=route_key(pickup), DestinationKey=route_key(destination),
+                    Estimated_Amount=str(rng.randrange(300, 2500, 50)), EstimatedPickupTime="1 - 2 Business Days",
+                    EstimatedDropoffTime="3 - 5 Business Days", QuoteStatus="ACTIVE", TaxRate=13.0, TaxName="HST",
+                    Additional=0, Surcharge=0, Rating=0,
+                ))
+        session.commit()
+    engine.dispose()
+    return url
+
+
+def synthetic_trace(carriers: pd.DataFrame, n=1000, mix=None, seed=0):
+    """`n` requests drawn from `mix` (endpoint -> share) over the busiest lanes."""
+    rng = random.Random(seed)
+    mix = mix or ENDPOINT_MIX
+    lanes = busiest_lanes(carriers, 200)
+    quote_lanes = busiest_lanes(carriers, 30, canada_only=True)
+    endpoints = rng.choices(list(mix), weights=list(mix.values()), k=n)
+
+    trace = []
+    for i, endpoint in enumerate(endpoints):
+        if endpoint == "v1/leads":
+            pickup, destination, pickup_province, dropoff_province, _ = rng.choice(lanes)
+            trace.append({"endpoint": endpoint, "method": "POST", "body": {
+                "deal_id": f"D{i}", "order_id": f"O{i}", "pickup_city": pickup, "dropoff_city": destination,
+                "pickup_province": pickup_province, "dropoff_province": dropoff_province,
+                "pickup_loc": f"1 Main St, {pickup}", "dropoff_loc": f"2 Main St, {destination}",
+            }})
+            continue
+
+        pickup, destination, pickup_province, _, lane_carriers = rng.choice(quote_lanes)
+        if endpoint == "v1/get-quote":
+            trace.append({"endpoint": endpoint, "method": "GET",
+                          "params": {"pickupcity": pickup, "destinationcity": destination}})
+        elif endpoint == "v1/store-quotes":
+            trace.append({"endpoint": endpoint, "method": "POST", "body": {
+                "CarrierName": rng.choice(lane_carriers), "CarrierID": f"V{i}", "Pickup_City": pickup,
+                "Dropoff_City": destination, "Estimated_Amount": str(rng.randrange(300, 2500, 50)),
+                "EstimatedPickupTime": "1 - 2 Business Days", "EstimatedDropoffTime": "3 - 5 Business Days",
+                "Tax_Province": pickup_province, "QuotationRequestID": f"Q{i}",
+            }})
+        elif endpoint == "v1/update-quotes":
+            trace.append({"endpoint": endpoint, "method": "POST", "body": {
+                "CarrierName": rng.choice(lane_carriers), "PickupCity": pickup, "DestinationCity": destination,
+                "Customer_Price": rng.randrange(400, 3000, 25), "Approval_status": rng.choice(["Accepted", "Sent"]),
+            }})
+        else:
+            raise ValueError(f"Unknown endpoint {endpoint!r}")
+    return trace
+
+
+def save_trace(trace, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for request in trace:
+            f.write(json.dumps(request) + "\n")
+
+
+def load_trace(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
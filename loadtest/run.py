@@ -0,0 +1,228 @@
+# loadtest/run.py
+"""
+End-to-end load test of the function app against local stand-ins.
+
+    python -m loadtest.run --requests 500 --concurrency 16
+    python -m loadtest.run --trace trace.jsonl --concurrency 32 --zoho-rate 10 --report report.json
+    python -m loadtest.run --target https://<app>.azurewebsites.net/api --trace trace.jsonl
+
+By default it starts a stub Zoho (API and OAuth), a stub Slack sink and a seeded SQLite
+database, points the app at them through its usual settings, and serves the
+function_app routes in-process over HTTP at /api/<route>. The trace (recorded JSON lines
+or a synthetic mix) is replayed by `--concurrency` workers, each sending its next request
+as soon as the previous one finished. Per endpoint the report gives throughput, p50/p99
+latency and error rates. HTTP errors are 5xx responses or failed connections; app
+errors are responses whose JSON says "status": "failed" (store-quotes and update-quotes
+echo the request body, so their failures only show in the logs and the stage metrics).
+Run it from the repository root so the app finds CarriersT.csv.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+from loadtest.fixtures import create_database, load_trace, save_trace, synthetic_trace
+from loadtest.stubs import BackgroundServer, StubBehaviour, serve, slack_app, zoho_app
+
+
+def configure_app_environment(sql_url, zoho_url, slack_url, workdir):
+    """Point the app's settings at the stand-ins; must run before function_app is imported."""
+    os.environ.update({
+        "SQL_CONN_STR": sql_url,
+        "ZOHO_API_BASE_URL": f"{zoho_url}/crm/v2",
+        "ZOHO_ACCOUNTS_URL": zoho_url,
+        "CLIENT_ZOHO_ID": "loadtest", "CLIENT_ZOHO_SECRET": "loadtest", "REFRESH_TOKEN": "loadtest",
+        "SLACK_API_URL": f"{slack_url}/api/",
+        "BOT_TOKEN": "xoxb-loadtest", "QUOTE_CHANNEL_ID": "C-LOADTEST",
+        "SLACK_SPILL_PATH": os.path.join(workdir, "slack_spill.jsonl"),
+        "CARRIER_SOURCE": "",
+        "TRACE_LOG_SPANS": "false",
+    })
+
+
+def function_app_host(app) -> web.Application:
+    """Serve an azure.functions FunctionApp's HTTP routes at /api/<route>, like the Functions host."""
+    import azure.functions as func
+
+    routes = {}
+    for function in app.get_functions():
+        trigger = function.get_trigger()
+        for method in getattr(trigger, "methods", None) or ["GET", "POST"]:
+            routes[(str(getattr(method, "value", method)).upper(), trigger.route)] = function.get_user_function()
+
+    async def dispatch(request):
+        handler = routes.get((request.method, request.match_info["route"]))
+        if handler is None:
+            return web.Response(status=404, text="No such function route")
+        body = await request.read()
+        http_request = func.HttpRequest(
+            request.method, str(request.url), headers=dict(request.headers), params=dict(request.query), body=body
+        )
+        response = await handler(http_request)
+        return web.Response(status=response.status_code, body=response.get_body(),
+                            content_type=response.mimetype or "text/plain")
+
+    host = web.Application(client_max_size=16 * 2**20)
+    host.router.add_route("*", "/api/{route:.*}", dispatch)
+    return host
+
+
+async def replay(trace, base_url, concurrency, timeout):
+    """Send the trace with `concurrency` workers; returns per-request samples and the wall time."""
+    queue = asyncio.Queue()
+    for request in trace:
+        queue.put_nowait(request)
+    samples = []
+
+    async def worker(session):
+        while True:
+            try:
+                request = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            endpoint = request["endpoint"]
+            start = time.perf_counter()
+            status, app_failed = None, False
+            try:
+                async with session.request(request.get("method", "GET"), f"{base_url}/{endpoint}",
+                                           params=request.get("params"), json=request.get("body")) as response:
+                    status = response.status
+                    text = await response.text()
+                try:
+                    payload = json.loads(text)
+                    app_failed = isinstance(payload, dict) and payload.get("status") == "failed"
+                except ValueError:
+                    pass
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            samples.append((endpoint, (time.perf_counter() - start) * 1000, status, app_failed))
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        return samples, time.perf_counter() - start
+
+
+def summarize(samples, wall_seconds):
+    by_endpoint = defaultdict(list)
+    for sample in samples:
+        by_endpoint[sample[0]].append(sample)
+    by_endpoint["all"] = samples
+
+    report = {}
+    for endpoint, rows in sorted(by_endpoint.items()):
+        latencies = np.array([row[1] for row in rows])
+        http_errors = sum(1 for row in rows if row[2] is None or row[2] >= 500)
+        app_errors = sum(1 for row in rows if row[3])
+        report[endpoint] = {
+            "requests": len(rows),
+            "throughput_rps": round(len(rows) / wall_seconds, 1),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 1),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 1),
+            "http_errors": http_errors,
+            "app_errors": app_errors,
+            "error_rate": round((http_errors + app_errors) / len(rows), 4),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"{'endpoint':<20}{'requests':>9}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'http err':>10}{'app err':>9}{'err %':>8}")
+    for endpoint, row in report.items():
+        print(f"{endpoint:<20}{row['requests']:>9}{row['throughput_rps']:>9}{row['p50_ms']:>10}{row['p99_ms']:>10}"
+              f"{row['http_errors']:>10}{row['app_errors']:>9}{100 * row['error_rate']:>8.1f}")
+
+
+async def run(args):
+    if args.trace:
+        trace = load_trace(args.trace)
+    else:
+        import pandas as pd
+        trace = synthetic_trace(pd.read_csv(args.carriers), n=args.requests, seed=args.seed)
+    if args.save_trace:
+        save_trace(trace, args.save_trace)
+
+    if args.target:  # drive an existing deployment, nothing local is started
+        samples, wall = await replay(trace, args.target.rstrip("/"), args.concurrency, args.timeout)
+        return {"endpoints": summarize(samples, wall)}
+
+    zoho = StubBehaviour(latency=args.zoho_latency, jitter=args.zoho_jitter, rate_limit=args.zoho_rate,
+                         error_rate=args.zoho_error_rate)
+    slack = StubBehaviour(latency=args.slack_latency, jitter=args.slack_latency / 2, rate_limit=args.slack_rate)
+    slack_sink = slack_app(slack)
+    servers = [BackgroundServer(zoho_app(zoho)), BackgroundServer(slack_sink)]
+    host = None
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            zoho_url, slack_url = (server.start() for server in servers)
+
+            import pandas as pd
+            sql_url = create_database(os.path.join(workdir, "loadtest.db"), pd.read_csv(args.carriers), seed=args.seed)
+            configure_app_environment(sql_url, zoho_url, slack_url, workdir)
+
+            import function_app
+            from src.funcmain import get_slack_dispatcher, get_zoho_api
+            host, host_url = await serve(function_app_host(function_app.app))
+
+            samples, wall = await replay(trace, f"{host_url}/api", args.concurrency, args.timeout)
+            await asyncio.to_thread(get_slack_dispatcher().flush, 10)
+
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"{host_url}/api/v1/metrics") as response:
+                    stages = await response.json()
+            await get_zoho_api().close()
+            return {
+                "endpoints": summarize(samples, wall),
+                "stages": stages,
+                "zoho": zoho.stats(),
+                "slack": {**slack.stats(), "messages": len(slack_sink["messages"])},
+            }
+        finally:
+            if host is not None:
+                await host.cleanup()
+            for server in servers:
+                if server.url is not None:
+                    server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", help="JSON lines trace to replay (default: a synthetic mix)")
+    parser.add_argument("--requests", type=int, default=500, help="size of the synthetic trace")
+    parser.add_argument("--save-trace", help="write the replayed trace to this file")
+    parser.add_argument("--carriers", default="CarriersT.csv", help="carrier export used for lanes and seed data")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=60, help="per-request client timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--target", help="base URL of a running deployment (…/api); skips the local stand-ins")
+    parser.add_argument("--zoho-latency", type=float, default=0.15)
+    parser.add_argument("--zoho-jitter", type=float, default=0.05)
+    parser.add_argument("--zoho-rate", type=float, default=0, help="Zoho requests per second before 429s (0 = unlimited)")
+    parser.add_argument("--zoho-error-rate", type=float, default=0, help="share of Zoho calls answered with 500")
+    parser.add_argument("--slack-latency", type=float, default=0.05)
+    parser.add_argument("--slack-rate", type=float, default=1, help="Slack posts per second before 429s (0 = unlimited)")
+    parser.add_argument("--report", help="write the full report as JSON")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    print_report(report["endpoints"])
+    if "zoho" in report:
+        print(f"zoho: {report['zoho']}")
+        print(f"slack: {report['slack']}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
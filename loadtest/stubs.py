@@ -0,0 +1,138 @@
+# loadtest/stubs.py
+"""
+Local stand-ins for Zoho CRM (API and OAuth token endpoint) and the Slack Web API.
+
+Both are small aiohttp apps with configurable response latency and a requests-per-second
+limit; calls over the limit get HTTP 429 with Retry-After, like the real services.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+
+@dataclass
+class StubBehaviour:
+    latency: float = 0.05       # mean response delay in seconds
+    jitter: float = 0.02        # delay varies uniformly by +/- jitter
+    rate_limit: float = 0       # max requests per second, 0 for unlimited
+    error_rate: float = 0       # share of requests answered with HTTP 500
+    calls: Counter = field(default_factory=Counter)
+    throttled: int = 0
+    failed: int = 0
+
+    def __post_init__(self):
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def over_limit(self):
+        """Fixed one-second window limiter."""
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        if now - self._window_start >= 1:
+            self._window_start, self._window_count = now, 0
+        self._window_count += 1
+        return self._window_count > self.rate_limit
+
+    async def delay(self):
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def stats(self):
+        return {"calls": dict(self.calls), "throttled": self.throttled, "failed": self.failed}
+
+
+def zoho_app(behaviour: StubBehaviour) -> web.Application:
+    """Zoho CRM v2 record endpoints plus the accounts /oauth/v2/token endpoint."""
+    record_ids = iter(range(10**12, 10**13))
+
+    async def token(request):
+        behaviour.calls["oauth/token"] += 1
+        return web.json_response({"access_token": f"stub-token-{int(time.time())}", "expires_in": 3600})
+
+    async def records(request):
+        module = request.match_info["module"]
+        behaviour.calls[f"{request.method} {module}"] += 1
+        if behaviour.over_limit():
+            behaviour.throttled += 1
+            return web.json_response({"code": "TOO_MANY_REQUESTS", "message": "API rate limit exceeded"},
+                                     status=429, headers={"Retry-After": "1"})
+        await behaviour.delay()
+        if behaviour.error_rate and random.random() < behaviour.error_rate:
+            behaviour.failed += 1
+            return web.json_response({"code": "INTERNAL_ERROR"}, status=500)
+        try:
+            payload = await request.json()
+        except ValueError:
+            payload = {}
+        data = [
+            {"code": "SUCCESS", "status": "success", "details": {"id": str(next(record_ids))}}
+            for _ in payload.get("data", [{}]) or [{}]
+        ]
+        return web.json_response({"data": data}, status=201 if request.method == "POST" else 200)
+
+    app = web.Application()
+    app.router.add_post("/oauth/v2/token", token)
+    app.router.add_route("*", "/crm/v2/{module}", records)
+    app.router.add_route("*", "/crm/v2/{module}/{record_id}", records)
+    return app
+
+
+def slack_app(behaviour: StubBehaviour) -> web.Application:
+    """Accepts chat.postMessage calls from slack_sdk's WebClient and keeps the messages."""
+    messages = []
+
+    async def post_message(request):
+        behaviour.calls["chat.postMessage"] += 1
+        if behaviour.over_limit():
+            behaviour.throttled += 1
+            return web.json_response({"ok": False, "error": "ratelimited"}, status=429, headers={"Retry-After": "1"})
+        await behaviour.delay()
+        form = await request.post() if request.content_type != "application/json" else await request.json()
+        messages.append({"channel": form.get("channel"), "text": form.get("text")})
+        return web.json_response({"ok": True, "channel": form.get("channel"), "ts": f"{time.time():.6f}"})
+
+    app = web.Application()
+    app["messages"] = messages
+    app.router.add_post("/api/chat.postMessage", post_message)
+    return app
+
+
+async def serve(app, host="127.0.0.1", port=0):
+    """Start `app` and return (runner, base_url); stop it with `await runner.cleanup()`."""
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+class BackgroundServer:
+    """
+    Serve an aiohttp app from its own thread and event loop, like a separate process.
+    The app under test makes some blocking calls (the token refresh) that would stall a
+    stub running on its own loop.
+    """
+
+    def __init__(self, app, host="127.0.0.1"):
+        self.app = app
+        self.host = host
+        self.url = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    def start(self) -> str:
+        self._thread.start()
+        self._runner, self.url = asyncio.run_coroutine_threadsafe(serve(self.app, self.host), self._loop).result()
+        return self.url
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
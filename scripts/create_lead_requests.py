@@ -0,0 +1,38 @@
+# scripts/create_lead_requests.py
+"""
+Creates the LeadRequests table that makes v1/leads idempotent, and purges its expired
+rows. Safe to re-run: an existing table is left alone.
+
+    python -m scripts.create_lead_requests [--purge]
+
+Expired rows are never read again, but nothing deletes them either; run with --purge
+from a scheduled job to keep the table small. Uses SQL_CONN_STR, like the function app.
+"""
+import argparse
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.dbConnector import LeadRequest
+from src.idempotency import purge_expired
+from utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+
+def create_lead_requests(engine):
+    LeadRequest.__table__.create(bind=engine, checkfirst=True)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Create the LeadRequests table and purge expired rows")
+    parser.add_argument("--purge", action="store_true", help="delete expired rows")
+    args = parser.parse_args()
+    engine = create_engine(os.getenv("SQL_CONN_STR"))
+    create_lead_requests(engine)
+    if args.purge:
+        with Session(engine) as session:
+            print(f"{purge_expired(session)} expired lead requests deleted")
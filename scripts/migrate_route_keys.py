@@ -0,0 +1,82 @@
+# scripts/migrate_route_keys.py
+"""
+Adds the PickupKey / DestinationKey columns and the (QuoteStatus, PickupKey, DestinationKey)
+index to TransportQuotation, then backfills the keys of existing rows in batches.
+Safe to re-run: existing columns and the index are left alone and only rows without
+keys are touched.
+
+    python -m scripts.migrate_route_keys [--batch-size 1000]
+
+Uses SQL_CONN_STR, like the function app.
+"""
+import argparse
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, inspect, or_, text
+from sqlalchemy.orm import Session
+
+from src.dbConnector import TransportQuotation
+from utils.helpers import get_logger, route_key
+
+logger = get_logger(__name__)
+
+KEY_COLUMNS = ("PickupKey", "DestinationKey")
+
+
+def add_key_columns(engine):
+    """Add the key columns that do not exist yet; returns the names added."""
+    table = TransportQuotation.__table__
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    # SQL Server spells it "ADD <column>", everything else "ADD COLUMN <column>"
+    add = "ADD" if engine.dialect.name == "mssql" else "ADD COLUMN"
+    added = []
+    with engine.begin() as conn:
+        for name in KEY_COLUMNS:
+            if name not in existing:
+                column_type = table.c[name].type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} {add} {name} {column_type} NULL"))
+                added.append(name)
+    return added
+
+
+def create_route_index(engine):
+    for index in TransportQuotation.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+
+def backfill_route_keys(engine, batch_size=1000) -> int:
+    """Fill the keys of rows that have none, one committed batch at a time; returns rows updated."""
+    updated = 0
+    while True:
+        with Session(engine) as session:
+            rows = session.query(TransportQuotation).filter(
+                or_(TransportQuotation.PickupKey.is_(None), TransportQuotation.DestinationKey.is_(None))
+            ).limit(batch_size).all()
+            if not rows:
+                return updated
+            for row in rows:
+                row.PickupKey = route_key(row.PickupCity)
+                row.DestinationKey = route_key(row.DestinationCity)
+            session.commit()
+            updated += len(rows)
+            logger.info(f"Backfilled route keys for {updated} quotes")
+
+
+def migrate(engine, batch_size=1000) -> int:
+    added = add_key_columns(engine)
+    if added:
+        logger.info(f"Added columns {added}")
+    updated = backfill_route_keys(engine, batch_size)
+    create_route_index(engine)
+    return updated
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Add and backfill quote route keys")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    engine = create_engine(os.getenv("SQL_CONN_STR"))
+    print(f"{migrate(engine, args.batch_size)} quotes backfilled")
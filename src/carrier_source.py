@@ -0,0 +1,145 @@
+# src/carrier_source.py
+"""
+Hot reload of the carrier statistics.
+
+A CarrierDataSource hands out the latest carrier export (CSV or snapshot bundle) using
+ETag-conditional fetches. CarrierDataReloader polls it from a background thread, builds
+the new CarrierSnapshot and its indexes off the request path, and only then publishes
+it, so in-flight recommendations keep the snapshot they started with.
+"""
+import os
+import threading
+import time
+
+from src.snapshot import load_carrier_bytes, payload_version
+from utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+
+class CarrierDataSource:
+    """Base class for places the carrier export can be fetched from."""
+
+    def fetch(self, etag=None):
+        """
+        Return (name, payload, etag) for the current export, or None if it still
+        matches `etag`.
+        """
+        raise NotImplementedError
+
+
+class LocalDirectorySource(CarrierDataSource):
+    """Reads the export from a local directory; the ETag is the file's mtime and size."""
+
+    def __init__(self, directory, filenames=("CarriersT.npz", "CarriersT.csv")):
+        self.directory = directory
+        self.filenames = filenames
+
+    def fetch(self, etag=None):
+        for name in self.filenames:
+            path = os.path.join(self.directory, name)
+            if not os.path.exists(path):
+                continue
+            stat = os.stat(path)
+            current = f"{name}:{stat.st_mtime_ns}:{stat.st_size}"
+            if current == etag:
+                return None
+            with open(path, "rb") as f:
+                return name, f.read(), current
+        raise FileNotFoundError(f"No carrier export in {self.directory}")
+
+
+class BlobCarrierSource(CarrierDataSource):
+    """Reads the export from an Azure Storage blob with If-None-Match downloads."""
+
+    def __init__(self, connection_string, container_name, blob_name):
+        from azure.storage.blob import BlobClient
+
+        self.blob_name = blob_name
+        self.client = BlobClient.from_connection_string(
+            connection_string, container_name=container_name, blob_name=blob_name
+        )
+
+    def fetch(self, etag=None):
+        from azure.core import MatchConditions
+        from azure.core.exceptions import ResourceNotModifiedError
+
+        try:
+            if etag:
+                downloader = self.client.download_blob(etag=etag, match_condition=MatchConditions.IfModified)
+            else:
+                downloader = self.client.download_blob()
+        except ResourceNotModifiedError:
+            return None
+        return self.blob_name, downloader.readall(), downloader.properties.etag
+
+
+class CarrierDataReloader:
+    """
+    Polls a CarrierDataSource every `interval` seconds and calls `on_update` with each
+    new CarrierSnapshot. `current` returns the snapshot in use, to skip unchanged data:
+    when one is already loaded at start the first poll waits a full interval, and an
+    export with the same version is not rebuilt.
+    """
+
+    def __init__(self, source, on_update, current=None, interval=300):
+        self.source = source
+        self.on_update = on_update
+        self.current = current
+        self.interval = interval
+        self.etag = None
+        self.reloads = 0
+        self.failures = 0
+        self.last_reload_seconds = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll_once(self) -> bool:
+        """Fetch and publish the export if it changed; returns True when a new snapshot was published."""
+        fetched = self.source.fetch(self.etag)
+        if fetched is None:
+            return False
+
+        name, payload, etag = fetched
+        start = time.perf_counter()
+        in_use = self.current() if self.current else None
+        if in_use is not None and in_use.version == payload_version(name, payload):
+            self.etag = etag
+            return False
+        snapshot = load_carrier_bytes(name, payload)
+        self.etag = etag
+
+        self.on_update(snapshot)
+        self.reloads += 1
+        self.last_reload_seconds = round(time.perf_counter() - start, 4)
+        logger.info(f"Carrier data reloaded from {name}: version {snapshot.version}, {len(snapshot)} rows in {self.last_reload_seconds}s")
+        return True
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="carrier-reloader", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        # the snapshot in use was just loaded at startup: don't download and rebuild it right away
+        if self.current is not None and self.current() is not None:
+            self._stop.wait(self.interval)
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"Carrier data reload failed: {e}")
+            self._stop.wait(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            "etag": self.etag,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_reload_seconds": self.last_reload_seconds,
+        }
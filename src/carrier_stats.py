@@ -0,0 +1,429 @@
+# src/carrier_stats.py
+"""
+Incremental carrier statistics from completed TransportOrders.
+
+The carrier table used by CarrierRecommendationModel holds one row per carrier and lane.
+Here it is kept as running aggregates per carrier-lane: request counts, and sums plus
+counts for the averages. Each run reads only the orders delivered since the stored
+watermark, adds them to the aggregates in place, and publishes the result as a carrier
+snapshot bundle (CarriersT.npz). CARRIER_SOURCE=local|blob hot-reloads that bundle into
+the app.
+
+    python -m src.carrier_stats seed --csv CarriersT.csv --since 2025-01-01 --dir carrier-data
+    python -m src.carrier_stats update --dir carrier-data
+    python -m src.carrier_stats update --blob-container carrier-data   # CARRIER_BLOB_CONN_STR
+
+`seed` starts the aggregates from the CSV export. Use `--since` for the date the export
+was taken, so orders it already counts are not added twice. `update` is safe to run on a
+schedule. Orders whose ActualDeliveryTime falls within `--lookback-hours` before the
+watermark are re-read, so a delivery recorded late is still counted. The order ids seen
+in that window keep those orders from being counted twice.
+
+The aggregates count orders: each order adds 1 to `requests` and, once its delivery is
+rated, 1 to `rated` and to `on_time` or `late`. The export counts each rated delivery
+twice in `On-time`, `Late Delivery` and `CountRequest` (CountRequest is mostly twice
+`Transport Requests`), and the model's scoring is tuned to that scale, so those columns
+are halved when seeding and doubled again when publishing (EXPORT_COUNTS_PER_ORDER).
+"""
+import argparse
+import datetime
+import io
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.snapshot import SNAPSHOT_PATH, file_digest, read_snapshot, write_snapshot
+from utils.helpers import PROVINCE_CODES, US_STATE_CODES, get_logger, normalize_text, route_key
+
+logger = get_logger(__name__)
+
+STATE_NAME = "CarrierStats.state.npz"
+LANE_COLUMNS = [
+    "Carrier Name",
+    "Pickup City", "Pickup State/Province", "Pickup Country",
+    "Destination City", "Destination State/Province", "Destination Country",
+]
+# running aggregates kept per carrier-lane, in orders
+SUM_COLUMNS = [
+    "requests",
+    "cost_per_km_sum", "cost_per_km_n",
+    "amount_sum", "amount_n",
+    "days_sum", "days_n",
+    "on_time", "late", "rated",
+]
+
+# the export's On-time / Late Delivery / CountRequest per rated order
+EXPORT_COUNTS_PER_ORDER = 2.0
+
+_REGIONS = {"Canada": PROVINCE_CODES, "United States": US_STATE_CODES}
+_COUNTRY_NAMES = {"CANADA": "Canada", "CA": "Canada", "USA": "United States", "US": "United States",
+                  "UNITED STATES": "United States", "UNITED STATES OF AMERICA": "United States"}
+_DAY_RANGE = re.compile(r"(\d+)(?:\s*-\s*(\d+))?\s*(business\s+)?day", re.IGNORECASE)
+
+
+def _region(part):
+    """(province or state name, country) named by one address part, e.g. "ON M5V 2T6" or "Texas"."""
+    folded = route_key(part)
+    words = part.replace(".", "").split()
+    code = words[0].upper() if 0 < len(words) <= 3 else None  # a code, maybe with a postal code
+    for country, regions in _REGIONS.items():
+        if code in regions:
+            return regions[code], country
+        for name in regions.values():
+            key = route_key(name)
+            if folded == key or folded.startswith(key + " "):
+                return name, country
+    return None, None
+
+
+def parse_location(address):
+    """
+    (city, province/state, country) from an order address such as
+    "12 King St W, Toronto, ON M5V 2T6, Canada"; (None, None, None) if it can't be read.
+    """
+    if not isinstance(address, str):
+        return None, None, None
+    parts = [part.strip() for part in address.split(",") if part.strip()]
+    if parts and parts[-1].upper() in _COUNTRY_NAMES:
+        parts = parts[:-1]
+    for i in range(len(parts) - 1, 0, -1):
+        province, country = _region(parts[i])
+        if province:
+            return parts[i - 1], province, country
+    return None, None, None
+
+
+def estimate_limit(window):
+    """Upper bound of a delivery estimate like "3 - 5 Business Days": (5, True); None if absent."""
+    match = _DAY_RANGE.search(window) if isinstance(window, str) else None
+    if not match:
+        return None
+    return int(match.group(2) or match.group(1)), bool(match.group(3))
+
+
+def parse_amount(value):
+    if value is None:
+        return np.nan
+    cleaned = re.sub(r"[^\d.\-]", "", str(value))
+    try:
+        return float(cleaned)
+    except ValueError:
+        return np.nan
+
+
+def order_facts(orders: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row of aggregate increments per order (see SUM_COLUMNS), with the lane columns.
+    Orders without a carrier or a readable pickup/dropoff address are dropped.
+    """
+    rows = []
+    for order in orders.itertuples(index=False):
+        carrier = order.CarrierName.strip() if isinstance(order.CarrierName, str) else ""
+        pickup = parse_location(order.PickupLocation)
+        dropoff = parse_location(order.DropoffLocation)
+        if not carrier or pickup[0] is None or dropoff[0] is None:
+            continue
+
+        amount = parse_amount(order.CarrierCost)
+        days = on_time = np.nan
+        if pd.notna(order.ActualPickupTime) and pd.notna(order.ActualDeliveryTime):
+            picked_up, delivered = pd.Timestamp(order.ActualPickupTime), pd.Timestamp(order.ActualDeliveryTime)
+            if delivered >= picked_up:
+                days = (delivered.date() - picked_up.date()).days
+                limit = estimate_limit(order.EstimatedDropoffTime)
+                if limit is not None:
+                    allowed, business = limit
+                    taken = np.busday_count(picked_up.date(), delivered.date()) if business else days
+                    on_time = float(taken <= allowed)
+        rows.append((carrier, *pickup, *dropoff, 1.0,
+                     0.0, 0.0,
+                     0.0 if np.isnan(amount) else amount, float(not np.isnan(amount)),
+                     0.0 if np.isnan(days) else float(days), float(not np.isnan(days)),
+                     0.0 if np.isnan(on_time) else on_time,
+                     0.0 if np.isnan(on_time) else 1.0 - on_time,
+                     float(not np.isnan(on_time))))
+    return pd.DataFrame(rows, columns=LANE_COLUMNS + SUM_COLUMNS)
+
+
+def _lane_keys(frame: pd.DataFrame) -> pd.Index:
+    """Grouping key per row: the lane columns compared the way the model matches them."""
+    normalized = [frame[column].map(normalize_text).fillna("").astype(str) for column in LANE_COLUMNS]
+    return pd.Index(normalized[0].str.cat(normalized[1:], sep="|"), name="lane_key")
+
+
+class CarrierStats:
+    """
+    Running per-carrier-lane aggregates plus the ingestion watermark.
+
+    `state` is indexed by lane key and holds LANE_COLUMNS (as first seen) and
+    SUM_COLUMNS. `watermark` is the latest ActualDeliveryTime applied; `recent_ids` maps
+    order ids in the lookback window to their delivery time, to skip them on re-reads.
+    Orders delivered at or before `seeded_through` are already counted by the export the
+    aggregates were seeded from.
+    """
+
+    def __init__(self, state: pd.DataFrame, watermark=None, recent_ids=None, seeded_through=None):
+        self.state = state
+        self.watermark = watermark
+        self.recent_ids = dict(recent_ids or {})
+        self.seeded_through = seeded_through
+
+    @classmethod
+    def from_carrier_frame(cls, frame: pd.DataFrame, watermark=None):
+        """
+        Seed from a carrier export (CarriersT.csv layout); averages are weighted by their
+        counts, and the rated counts converted to orders.
+        """
+        requests = frame["Transport Requests"].fillna(0).astype(float)
+        rated = frame["CountRequest"].fillna(0).astype(float) / EXPORT_COUNTS_PER_ORDER
+        cost_per_km_n = requests.where(frame["Avg. Cost Per Km"].notna(), 0.0)
+        amount_n = requests.clip(lower=1).where(frame["Estimated Amount"].notna(), 0.0)
+        days_n = rated.clip(lower=1).where(frame["Avg. Delivery Day"].notna(), 0.0)
+        state = frame[LANE_COLUMNS].copy()
+        state["requests"] = requests
+        state["cost_per_km_sum"] = frame["Avg. Cost Per Km"].fillna(0) * cost_per_km_n
+        state["cost_per_km_n"] = cost_per_km_n
+        state["amount_sum"] = frame["Estimated Amount"].fillna(0) * amount_n
+        state["amount_n"] = amount_n
+        state["days_sum"] = frame["Avg. Delivery Day"].fillna(0) * days_n
+        state["days_n"] = days_n
+        state["on_time"] = frame["On-time"].fillna(0).astype(float) / EXPORT_COUNTS_PER_ORDER
+        state["late"] = frame["Late Delivery"].fillna(0).astype(float) / EXPORT_COUNTS_PER_ORDER
+        state["rated"] = rated
+        state.index = _lane_keys(state)
+        return cls(cls._combine(state), watermark=watermark, seeded_through=watermark)
+
+    @staticmethod
+    def _combine(frame: pd.DataFrame) -> pd.DataFrame:
+        """Merge rows sharing a lane key: sums add up, lane columns keep the first spelling."""
+        if frame.index.is_unique:
+            return frame
+        grouped = frame.groupby(level=0, sort=False)
+        return pd.concat([grouped[LANE_COLUMNS].first(), grouped[SUM_COLUMNS].sum()], axis=1)
+
+    def apply(self, orders: pd.DataFrame, lookback=datetime.timedelta(hours=72)) -> int:
+        """
+        Add completed orders (OrdersDB columns) to the aggregates, skipping ones already
+        applied, and advance the watermark. Returns the number of orders counted.
+        """
+        if orders.empty:
+            return 0
+        delivered = pd.to_datetime(orders["ActualDeliveryTime"])
+        unseen = ~orders["OrderID"].isin(list(self.recent_ids))
+        if self.seeded_through is not None:
+            unseen &= delivered > pd.Timestamp(self.seeded_through)
+        fresh = orders[unseen]
+        facts = order_facts(fresh)
+        if not facts.empty:
+            facts.index = _lane_keys(facts)
+            delta = self._combine(facts)
+
+            existing = delta.index.intersection(self.state.index)
+            self.state.loc[existing, SUM_COLUMNS] += delta.loc[existing, SUM_COLUMNS]
+            added = delta.index.difference(self.state.index)
+            if len(added):
+                self.state = pd.concat([self.state, delta.loc[added]])
+
+        latest = delivered.max().to_pydatetime()
+        self.watermark = latest if self.watermark is None else max(self.watermark, latest)
+        self.recent_ids.update(zip(fresh["OrderID"].tolist(), delivered[fresh.index].tolist()))
+        horizon = pd.Timestamp(self.watermark - lookback)
+        self.recent_ids = {order_id: at for order_id, at in self.recent_ids.items() if pd.Timestamp(at) >= horizon}
+        return len(facts)
+
+    def carrier_frame(self) -> pd.DataFrame:
+        """The aggregates in the CarriersT.csv layout read by CarrierSnapshot."""
+        state = self.state
+
+        def mean(total, count):
+            return (state[total] / state[count]).where(state[count] > 0)
+
+        frame = state[LANE_COLUMNS].reset_index(drop=True)
+        rated = state["rated"] > 0
+        frame["Transport Requests"] = state["requests"].round().astype(np.int64).to_numpy()
+        frame["Avg. Cost Per Km"] = mean("cost_per_km_sum", "cost_per_km_n").to_numpy()
+        frame["Estimated Amount"] = mean("amount_sum", "amount_n").to_numpy()
+        frame["Avg. Delivery Day"] = mean("days_sum", "days_n").to_numpy()
+        frame["On-time"] = (state["on_time"] * EXPORT_COUNTS_PER_ORDER).where(rated).to_numpy()
+        frame["Late Delivery"] = (state["late"] * EXPORT_COUNTS_PER_ORDER).where(rated).to_numpy()
+        frame["CountRequest"] = (state["rated"] * EXPORT_COUNTS_PER_ORDER).where(rated).to_numpy()
+        return frame
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        extra = {
+            "kind": "carrier_stats_state",
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "recent_ids": [[order_id, pd.Timestamp(at).isoformat()] for order_id, at in self.recent_ids.items()],
+            "seeded_through": self.seeded_through.isoformat() if self.seeded_through else None,
+        }
+        write_snapshot(self.state.reset_index(), buffer, extra=extra)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, payload: bytes):
+        frame, manifest = read_snapshot(io.BytesIO(payload))
+        if manifest.get("kind") != "carrier_stats_state":
+            raise ValueError("Not a carrier statistics state bundle")
+        state = frame.set_index("lane_key")
+        watermark, seeded_through = manifest.get("watermark"), manifest.get("seeded_through")
+        return cls(
+            state,
+            watermark=datetime.datetime.fromisoformat(watermark) if watermark else None,
+            recent_ids={order_id: datetime.datetime.fromisoformat(at) for order_id, at in manifest.get("recent_ids", [])},
+            seeded_through=datetime.datetime.fromisoformat(seeded_through) if seeded_through else None,
+        )
+
+    def snapshot_bytes(self) -> bytes:
+        """The published carrier snapshot; its version is a digest of the table's content."""
+        frame = self.carrier_frame()
+        version = file_digest(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+        buffer = io.BytesIO()
+        write_snapshot(frame, buffer, source_digest=version)
+        return buffer.getvalue()
+
+
+def fetch_completed_orders(session, since=None, batch_size=5000):
+    """
+    Yield DataFrames of orders with an ActualDeliveryTime after `since` (all orders if
+    None), in (ActualDeliveryTime, OrderID) order, `batch_size` rows at a time.
+    """
+    from sqlalchemy import and_, or_
+    from src.dbConnector import OrdersDB
+
+    columns = [OrdersDB.OrderID, OrdersDB.CarrierName, OrdersDB.PickupLocation, OrdersDB.DropoffLocation,
+               OrdersDB.CarrierCost, OrdersDB.EstimatedDropoffTime, OrdersDB.ActualPickupTime,
+               OrdersDB.ActualDeliveryTime]
+    names = [column.key for column in columns]
+    delivered, order_id = OrdersDB.ActualDeliveryTime, OrdersDB.OrderID
+    last = None
+    while True:
+        query = session.query(*columns).filter(delivered.isnot(None))
+        if since is not None:
+            query = query.filter(delivered > since)
+        if last is not None:
+            query = query.filter(or_(delivered > last[0], and_(delivered == last[0], order_id > last[1])))
+        rows = query.order_by(delivered, order_id).limit(batch_size).all()
+        if not rows:
+            return
+        yield pd.DataFrame([tuple(row) for row in rows], columns=names)
+        last = (rows[-1].ActualDeliveryTime, rows[-1].OrderID)
+        if len(rows) < batch_size:
+            return
+
+
+class LocalStatsStore:
+    """Keeps the state and the published snapshot in a local directory (CARRIER_SOURCE=local)."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def read(self, name):
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def write(self, name, payload):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        # write then rename, so a reloader polling the directory never sees a partial file
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(payload)
+        os.replace(f"{path}.tmp", path)
+
+
+class BlobStatsStore:
+    """Keeps the state and the published snapshot in an Azure Storage container (CARRIER_SOURCE=blob)."""
+
+    def __init__(self, connection_string, container_name):
+        from azure.storage.blob import ContainerClient
+
+        self.container = ContainerClient.from_connection_string(connection_string, container_name=container_name)
+
+    def read(self, name):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            return self.container.download_blob(name).readall()
+        except ResourceNotFoundError:
+            return None
+
+    def write(self, name, payload):
+        self.container.upload_blob(name, payload, overwrite=True)
+
+
+def update(store, session, snapshot_name=SNAPSHOT_PATH, lookback_hours=72, batch_size=5000) -> dict:
+    """Apply the orders delivered since the stored watermark, then save the state and publish the snapshot."""
+    start = time.perf_counter()
+    payload = store.read(STATE_NAME)
+    if payload is None:
+        raise FileNotFoundError(f"No {STATE_NAME}; run `python -m src.carrier_stats seed` first")
+    stats = CarrierStats.from_bytes(payload)
+    previous = stats.watermark
+    lookback = datetime.timedelta(hours=lookback_hours)
+
+    read = counted = 0
+    for orders in fetch_completed_orders(session, previous - lookback if previous else None, batch_size):
+        read += len(orders)
+        counted += stats.apply(orders, lookback=lookback)
+
+    store.write(STATE_NAME, stats.to_bytes())
+    publish = bool(counted) or store.read(snapshot_name) is None
+    if publish:
+        store.write(snapshot_name, stats.snapshot_bytes())
+    summary = {
+        "orders_read": read,
+        "orders_counted": counted,
+        "lanes": len(stats.state),
+        "watermark": stats.watermark.isoformat() if stats.watermark else None,
+        "published": publish,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    logger.info(f"Carrier statistics updated: {summary}")
+    return summary
+
+
+def seed(store, frame: pd.DataFrame, since=None, snapshot_name=SNAPSHOT_PATH) -> dict:
+    """Start the aggregates from a carrier export and publish it as the first snapshot."""
+    stats = CarrierStats.from_carrier_frame(frame, watermark=since)
+    store.write(STATE_NAME, stats.to_bytes())
+    store.write(snapshot_name, stats.snapshot_bytes())
+    return {"lanes": len(stats.state), "watermark": since.isoformat() if since else None}
+
+
+def _store_from_args(args):
+    if args.blob_container:
+        return BlobStatsStore(os.getenv("CARRIER_BLOB_CONN_STR"), args.blob_container)
+    return LocalStatsStore(args.dir)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Maintain the carrier statistics from completed TransportOrders.")
+    parser.add_argument("command", choices=["seed", "update"])
+    parser.add_argument("--dir", default="carrier-data", help="local directory holding the state and snapshot")
+    parser.add_argument("--blob-container", help="Azure Storage container instead of --dir (CARRIER_BLOB_CONN_STR)")
+    parser.add_argument("--snapshot-name", default=os.getenv("CARRIER_BLOB_NAME", SNAPSHOT_PATH))
+    parser.add_argument("--csv", default="CarriersT.csv", help="seed: carrier export to start from")
+    parser.add_argument("--since", type=datetime.datetime.fromisoformat,
+                        help="seed: orders delivered up to this time are already in the export")
+    parser.add_argument("--lookback-hours", type=float, default=72)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    store = _store_from_args(args)
+    if args.command == "seed":
+        print(seed(store, pd.read_csv(args.csv), since=args.since, snapshot_name=args.snapshot_name))
+    else:
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import Session
+
+        with Session(create_engine(os.getenv("SQL_CONN_STR"))) as session:
+            print(update(store, session, args.snapshot_name, args.lookback_hours, args.batch_size))
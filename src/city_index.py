@@ -0,0 +1,229 @@
+# src/city_index.py
+"""
+Alias-aware lookup of city names in the carrier table.
+
+CarrierSnapshot keys its lanes by normalize_text() of the city ("montréal" ->
+"montreal", but "trois-rivières" keeps its accent). Requests spell cities in many
+ways: "Montreal QC", "St. John's" / "Saint John's", "Trois-Rivieres", a missing
+letter. CityAliasIndex is built once per snapshot from the table's distinct cities. It
+maps a requested city to the table's keys for that city in a few dictionary lookups,
+in this order:
+
+    exact            the normalize_text() key is in the table
+    alias            same folded form: accents removed, punctuation dropped and
+                     abbreviations expanded (st -> saint, mt -> mount, ...)
+    province_suffix  same, after dropping a trailing province ("Montreal QC", "Halifax, Nova Scotia")
+    place            no match: the name is a real place of its own (per the gazetteer),
+                     so it is not fuzzy-matched to a table city one letter away
+                     ("Hilton" is not "Milton")
+    fuzzy            one unambiguous table city within a small edit distance, found
+                     through a trigram index. Numbers must match and, when the province
+                     is known, the city must appear in that province.
+
+Without a gazetteer a real town can't be told from a typo, so there is no fuzzy rule:
+a name that is not in the table under any of the other rules is a miss.
+
+All table spellings that share the folded form are returned together, so
+"Trois-Rivières" and "Trois-Rivieres" rows are both found.
+"""
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import NamedTuple
+
+import pandas as pd
+
+from utils.cache import TTLCache
+from utils.helpers import PROVINCE_CODES, normalize_text
+
+ABBREVIATIONS = {
+    "st": "saint", "ste": "sainte", "mt": "mount", "ft": "fort",
+}
+# only expanded as the first word: "N Vancouver", but not "Saint John's" -> "... s"
+LEADING_ABBREVIATIONS = {"n": "north", "s": "south", "e": "east", "w": "west"}
+
+
+def fold_accents(text: str) -> str:
+    return "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+
+
+def _words(text: str):
+    return re.sub(r"[\W_]+", " ", fold_accents(text).casefold()).split()
+
+
+def _province_words():
+    names = {code.lower(): name for code, name in PROVINCE_CODES.items()}
+    names.update({name: name for name in map(str.lower, PROVINCE_CODES.values())})
+    names.update({"pei": "prince edward island", "nfld": "newfoundland and labrador", "que": "quebec"})
+    return {tuple(_words(alias)): normalize_text(name) for alias, name in names.items()}
+
+
+PROVINCE_SUFFIXES = _province_words()
+
+
+def alias_key(city) -> str:
+    """Folded comparison form of a city name: "St. Jérôme" -> "saint jerome"."""
+    if not isinstance(city, str):
+        return ""
+    words = _words(city)
+    if words and words[0] in LEADING_ABBREVIATIONS and len(words) > 1:
+        words[0] = LEADING_ABBREVIATIONS[words[0]]
+    return " ".join(ABBREVIATIONS.get(word, word) for word in words)
+
+
+def strip_province_suffix(city):
+    """(city without a trailing province, that province's normalized name), or (city, None)."""
+    words = _words(city) if isinstance(city, str) else []
+    for length in (4, 3, 2, 1):
+        if len(words) > length and tuple(words[-length:]) in PROVINCE_SUFFIXES:
+            return " ".join(words[:-length]), PROVINCE_SUFFIXES[tuple(words[-length:])]
+    return city, None
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _max_edits(key):
+    return 0 if len(key) < 5 else 1 if len(key) < 9 else 2
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance of a and b, or limit + 1 once it is known to exceed `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class CityMatch(NamedTuple):
+    keys: tuple          # normalize_text() keys of the table rows to use, empty on a miss
+    rule: str            # "exact", "alias", "province_suffix", "fuzzy", "place" or "miss"
+    alias: str = None    # the folded form that matched, for logging
+
+
+class CityAliasIndex:
+    """Built once from the table's cities (normalize_text() keys) and the provinces they appear in."""
+
+    def __init__(self, city_provinces, counts=None, cache_size=4096, fuzzy_candidates=20, is_place=None):
+        """
+        `city_provinces` maps each table city key to the set of normalized provinces it
+        appears with; `counts` (rows per city) breaks ties between fuzzy candidates.
+        `is_place(city, province)` tells whether a name is a known place, which is then
+        never fuzzy-matched; without it, nothing is.
+        """
+        self.city_provinces = {city: set(provinces) for city, provinces in city_provinces.items() if city}
+        self.counts = counts or {}
+        self.is_place = is_place
+        self.fuzzy_candidates = fuzzy_candidates
+        self.by_alias = defaultdict(list)
+        for city in self.city_provinces:
+            self.by_alias[alias_key(city)].append(city)
+        self.by_alias = {alias: tuple(sorted(cities)) for alias, cities in self.by_alias.items()}
+        self.aliases = list(self.by_alias)
+        self.postings = defaultdict(list)
+        for position, alias in enumerate(self.aliases):
+            for gram in _trigrams(alias):
+                self.postings[gram].append(position)
+        self.provinces = set().union(*self.city_provinces.values()) if self.city_provinces else set()
+        self._cache = TTLCache(maxsize=cache_size, ttl=float("inf"))
+        self.rules = Counter()
+
+    @classmethod
+    def from_columns(cls, *pairs, **kwargs):
+        """
+        Index from (city Series, province Series) pairs of normalized values, e.g. the
+        pickup and the destination columns; counted per distinct pair, not per row.
+        """
+        sizes = pd.concat([
+            pd.DataFrame({"city": cities.to_numpy(), "province": provinces.to_numpy()}).value_counts(sort=False)
+            for cities, provinces in pairs
+        ])
+        counts = sizes.groupby(level="city").sum().to_dict()
+        city_provinces = sizes.index.to_frame(index=False).groupby("city")["province"].agg(set).to_dict()
+        return cls(city_provinces, counts, **kwargs)
+
+    def __len__(self):
+        return len(self.city_provinces)
+
+    def resolve(self, city, province=None) -> CityMatch:
+        """Table keys for a requested city; `province` (any spelling) narrows fuzzy matches."""
+        cache_key = (city, province)
+        match = self._cache.get(cache_key)
+        if match is None:
+            match = self._resolve(city, self._province_key(province))
+            self._cache.set(cache_key, match)
+        self.rules[match.rule] += 1
+        return match
+
+    def _province_key(self, province):
+        """The table's spelling of a province given by name or code; None if the table doesn't have it."""
+        if not isinstance(province, str):
+            return None
+        key = PROVINCE_SUFFIXES.get(tuple(_words(province)), normalize_text(province))
+        return key if key in self.provinces else None
+
+    def _resolve(self, city, province):
+        if not isinstance(city, str) or not city.strip():
+            return CityMatch((), "miss")
+        key = normalize_text(city)
+        alias = alias_key(city)
+        siblings = self.by_alias.get(alias, ())
+        if key in self.city_provinces:
+            return CityMatch(siblings or (key,), "exact" if len(siblings) <= 1 else "alias", alias)
+        if siblings:
+            return CityMatch(siblings, "alias", alias)
+
+        stripped, suffix_province = strip_province_suffix(city)
+        if suffix_province is not None:
+            stripped_alias = alias_key(stripped)
+            if stripped_alias in self.by_alias:
+                return CityMatch(self.by_alias[stripped_alias], "province_suffix", stripped_alias)
+            alias, province = stripped_alias, province or (suffix_province if suffix_province in self.provinces else None)
+            city = stripped
+
+        if self.is_place is None:
+            return CityMatch((), "miss", alias)
+        if self.is_place(city, province):
+            return CityMatch((), "place", alias)
+        fuzzy = self._fuzzy(alias, province)
+        if fuzzy is not None:
+            return CityMatch(self.by_alias[fuzzy], "fuzzy", fuzzy)
+        return CityMatch((), "miss", alias)
+
+    def _fuzzy(self, alias, province):
+        limit = _max_edits(alias)
+        if not limit:
+            return None
+        shared = Counter()
+        for gram in _trigrams(alias):
+            shared.update(self.postings.get(gram, ()))
+        digits = re.sub(r"\D", "", alias)
+        ranked = []
+        for position, _ in shared.most_common(self.fuzzy_candidates):
+            candidate = self.aliases[position]
+            if re.sub(r"\D", "", candidate) != digits:
+                continue
+            cities = self.by_alias[candidate]
+            if province and not any(province in self.city_provinces[city] for city in cities):
+                continue
+            distance = edit_distance(alias, candidate, limit)
+            if distance <= limit:
+                ranked.append((distance, -sum(self.counts.get(city, 0) for city in cities), candidate))
+        if not ranked:
+            return None
+        ranked.sort()
+        if not province and len(ranked) > 1 and ranked[1][0] == ranked[0][0]:
+            return None  # ambiguous without a province to tell the candidates apart
+        return ranked[0][2]
+
+    def stats(self) -> dict:
+        return {"cities": len(self), "aliases": len(self.aliases), "resolved": dict(self.rules)}
@@ -1,16 +1,134 @@
 
-from sqlalchemy import create_engine, Column, String, DateTime, PrimaryKeyConstraint, Integer, ForeignKey, Float
+from sqlalchemy import create_engine, event, exc, Column, String, DateTime, PrimaryKeyConstraint, Integer, ForeignKey, Float, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.pool import QueuePool
 from sqlalchemy import func as sqlfunc
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import logging
+import os
+import threading
+import time
 
 
 Base = declarative_base()
 
+
+def pool_settings_from_env():
+    """Connection pool settings, tunable per deployment through app settings."""
+    return {
+        "pool_size": int(os.getenv("SQL_POOL_SIZE", "10")),          # connections kept in the pool
+        "max_overflow": int(os.getenv("SQL_MAX_OVERFLOW", "5")),     # extra connections beyond pool_size
+        "pool_timeout": float(os.getenv("SQL_POOL_TIMEOUT", "30")),  # seconds to wait for a connection
+        "pool_recycle": int(os.getenv("SQL_POOL_RECYCLE", "1800")),  # reconnect connections older than this
+        "pool_pre_ping": os.getenv("SQL_POOL_PRE_PING", "false").lower() in ("1", "true", "yes"),
+    }
+
+
+class PoolMetrics:
+    """Counters fed by InstrumentedQueuePool and the pool events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.peak_checked_out = 0
+        self.peak_overflow = 0
+        self.connects = 0
+        self.recycles = 0
+        self.invalidations = 0
+
+    def listen(self, pool):
+        event.listen(pool, "connect", self._on_connect)
+        event.listen(pool, "invalidate", self._on_invalidate)
+        event.listen(pool, "soft_invalidate", self._on_invalidate)
+
+    def record_wait(self, seconds, pool, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.peak_checked_out = max(self.peak_checked_out, pool.checkedout())
+                self.peak_overflow = max(self.peak_overflow, pool.overflow())
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+            # a record that connected before is reconnecting: recycled, unless it was invalidated
+            info = connection_record.record_info  # survives reconnects, unlike .info
+            if info.get("metrics_connected") and not info.pop("metrics_invalidated", False):
+                self.recycles += 1
+            info["metrics_connected"] = True
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+            connection_record.record_info["metrics_invalidated"] = True
+
+    def stats(self):
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(1000 * self.wait_seconds_total / attempts, 2) if attempts else None,
+                "wait_max_ms": round(1000 * self.wait_seconds_max, 2),
+                "peak_checked_out": self.peak_checked_out,
+                "peak_overflow": self.peak_overflow,
+                "connects": self.connects,
+                "recycles": self.recycles,
+                "invalidations": self.invalidations,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records how long callers wait for a connection (including opening a
+    new one and the pre-ping) and how often that wait times out.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+        if "_dispatch" not in kwargs:  # recreate() copies the listeners of the pool it replaces
+            self.metrics.listen(self)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.record_wait(time.perf_counter() - start, self, timed_out=True)
+            raise
+        self.metrics.record_wait(time.perf_counter() - start, self)
+        return connection
+
+
+def create_pooled_engine(connection_string, **settings):
+    """Engine on an InstrumentedQueuePool; `settings` override pool_settings_from_env()."""
+    return create_engine(
+        connection_string,
+        poolclass=InstrumentedQueuePool,
+        **{**pool_settings_from_env(), **settings},
+    )
+
+
 class DatabaseConnection:
     # Class variable to hold the engine
     engine = None
+    # one session factory, rebuilt only if the engine is swapped
+    _session_factory = None
 
     def __init__(self, connection_string):
         self.connection_string = connection_string
@@ -18,16 +136,42 @@ class DatabaseConnection:
 
         # Create the engine only once when the class is first initialized
         if DatabaseConnection.engine is None:
-            DatabaseConnection.engine = create_engine(
-                self.connection_string,
-                pool_size=10,          # Max connections to keep in the pool
-                max_overflow=5,       # Max additional connections beyond pool_size
-                pool_timeout=30,      # Timeout for getting a connection
-                pool_recycle=1800     # Recycle connections every 30 minutes
-            )
+            DatabaseConnection.engine = create_pooled_engine(self.connection_string)
+
+    @classmethod
+    def session_factory(cls):
+        factory = cls._session_factory
+        if factory is None or factory.kw.get("bind") is not cls.engine:
+            factory = cls._session_factory = sessionmaker(bind=cls.engine)
+        return factory
+
+    @classmethod
+    def pool_stats(cls):
+        """Configuration, live usage and counters of the engine's pool; None before first use."""
+        if cls.engine is None:
+            return None
+        pool = cls.engine.pool
+        stats = {
+            "pool_class": type(pool).__name__,
+            "pre_ping": getattr(pool, "_pre_ping", False),
+            "recycle": getattr(pool, "_recycle", None),
+        }
+        if isinstance(pool, QueuePool):
+            stats.update({
+                "pool_size": pool.size(),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+            })
+        metrics = getattr(pool, "metrics", None)
+        if metrics is not None:
+            stats.update(metrics.stats())
+        return stats
 
     def __enter__(self):
-        self.session = sessionmaker(bind=DatabaseConnection.engine)()
+        self.session = DatabaseConnection.session_factory()()
         return self.session
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -38,6 +182,66 @@ class DatabaseConnection:
         if self.session:
             self.session.close()
 
+class AsyncSessionRunner:
+    """
+    Runs blocking session work on a bounded thread pool, so SQL round trips do not
+    stall the event loop. Each call has a timeout. A call that times out while still
+    queued is dropped and never runs. One that already started keeps its worker thread
+    until the database answers: the caller just stops waiting, and a write can still
+    commit after the caller was told it timed out, so writes run here should be safe
+    to repeat.
+    """
+
+    def __init__(self, max_workers=8, timeout=30):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sql")
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+
+    async def run(self, connect, work, *args, timeout=None):
+        """Open a session with `connect()` and return `work(session, *args)`, run on the pool."""
+        state = {"started": False, "abandoned": False}
+
+        def call():
+            with self._lock:
+                if state["abandoned"]:
+                    return None  # the caller gave up before a worker picked the call up
+                state["started"] = True
+                self.running += 1
+            try:
+                with connect() as session:
+                    return work(session, *args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.pending -= 1
+
+        with self._lock:
+            self.pending += 1
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self.executor, call),
+                timeout=self.timeout if timeout is None else timeout,
+            )
+        finally:
+            with self._lock:
+                if not state["started"] and not state["abandoned"]:
+                    # timed out or cancelled while queued: count it out here, call() won't
+                    state["abandoned"] = True
+                    self.pending -= 1
+
+    def stats(self):
+        """Calls running on a worker and calls waiting for one."""
+        with self._lock:
+            return {"max_workers": self.max_workers, "running": self.running, "queued": self.pending - self.running}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
 class Vendor(Base):
     __tablename__ = 'Vendors'
 
@@ -46,7 +250,7 @@ class Vendor(Base):
     NumTransportJobs = Column(Integer, default=0)
     ZohoRecordID = Column(String(255), unique=True, nullable=False, primary_key=True)
 
-from sqlalchemy import Column, String, DateTime
+from sqlalchemy import Column, String, DateTime, Index
 from sqlalchemy.sql import func as sqlfunc
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -101,6 +305,9 @@ class TransportQuotation(Base):
     Additional = Column(Float, nullable=False, default=0)
     Surcharge = Column(Float, nullable=False, default=0)
     DeactivatedDateTime = Column(DateTime, nullable=True)
+    # route_key() of PickupCity / DestinationCity, written with the row; used by every lookup
+    PickupKey = Column(String(255), nullable=True)
+    DestinationKey = Column(String(255), nullable=True)
         # Composite primary key
     __table_args__ = (
         PrimaryKeyConstraint(
@@ -113,6 +320,7 @@ class TransportQuotation(Base):
             'Surcharge',
             name='quotation_request_pk'
         ),
+        Index('ix_quote_status_route', 'QuoteStatus', 'PickupKey', 'DestinationKey'),
     )
 
 
@@ -126,3 +334,16 @@ class TaxDataBase(Base):
     tax_name = Column(String(255), nullable=False)
     tax_rate = Column(Float, nullable=False)
     tax_type = Column(String(255), nullable=False)
+
+
+class LeadRequest(Base):
+    """One v1/leads request per idempotency key: claimed while it runs, then its response until it expires."""
+    __tablename__ = 'LeadRequests'
+
+    IdempotencyKey = Column(String(255), primary_key=True)
+    DealID = Column(String(255), nullable=True)
+    Status = Column(String(20), nullable=False)  # "processing" or "done"
+    Response = Column(Text, nullable=True)  # JSON response of a finished request
+    CrmWrites = Column(Text, nullable=True)  # JSON {module: "created" | "unknown" | "rejected"} of its CRM writes
+    CreatedAt = Column(DateTime, nullable=False)
+    ExpiresAt = Column(DateTime, nullable=False, index=True)  # end of the claim lease, or of the stored response
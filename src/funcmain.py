@@ -1,17 +1,25 @@
 # src/funcmain.py
-from utils.helpers import *
-from utils.model import *
+from utils.startup import timed
+
+with timed("import utils.helpers"):
+    from utils.helpers import *
 
 import azure.functions as func
+import asyncio
 import json
 import os
-import pandas as pd
-from src.dbConnector import *
-from src.recom import CarrierRecommendationModel
+import threading
+
+with timed("import sqlalchemy"):
+    from src.dbConnector import *
+    from sqlalchemy import and_, or_, text, func as sqlfunc
+    from sqlalchemy.exc import IntegrityError
 
-from sqlalchemy import and_, text, func as sqlfunc
-from sqlalchemy.exc import IntegrityError
-from pyzohocrm import ZohoApi, TokenManager
+from src.idempotency import WRITTEN, LeadIdempotency, lead_request_key
+from src.tax_rates import TaxRate, TaxRateTable, UnknownTaxProvince
+from utils.cache import ReadThroughCache
+from utils.log import log_payload
+from utils.tracing import span, traced
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -22,17 +30,197 @@ logger = get_logger(__name__)
 
 TEMP_DIR = "/tmp"
 
-TOKEN_INSTANCE =  TokenManager(
-                                domain_name="Canada",
-                                refresh_token=os.getenv("REFRESH_TOKEN"),
-                                client_id=os.getenv("CLIENT_ZOHO_ID"),
-                                client_secret=os.getenv("CLIENT_ZOHO_SECRET"),
-                                grant_type="refresh_token",
-                                token_dir=TEMP_DIR
-                                )
+# blocking SQL work from both handlers runs here, off the event loop
+SQL_RUNNER = AsyncSessionRunner(
+    max_workers=int(os.getenv("SQL_MAX_WORKERS", "8")),
+    timeout=float(os.getenv("SQL_TIMEOUT", "30")),
+)
+
+# largest batch v1/store-quotes/batch accepts, and how many routes go into one OR filter
+# (SQL Server allows ~2100 parameters per statement)
+QUOTE_BATCH_LIMIT = int(os.getenv("QUOTE_BATCH_LIMIT", "1000"))
+ROUTE_FILTER_CHUNK = 300
+# largest batch v1/recommendations/batch accepts
+RECOMMEND_BATCH_LIMIT = int(os.getenv("RECOMMEND_BATCH_LIMIT", "1000"))
+LANE_FIELDS = ("pickup_city", "dropoff_city", "pickup_province", "dropoff_province")
+# v1/leads responses are kept this long per deal (0 disables); a claim on a deal that is being
+# processed lapses after the lease, and a repeat waits at most IDEMPOTENCY_WAIT for it
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_LEASE = float(os.getenv("IDEMPOTENCY_LEASE", "600"))
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", "120"))
+IDEMPOTENCY_POLL_INTERVAL = float(os.getenv("IDEMPOTENCY_POLL_INTERVAL", "0.5"))
+
+# Heavy clients and the carrier table are created on first use, so endpoints that do not
+# need them (ping, get-quote, update-quotes) never pay for pandas or the CRM clients.
+_SINGLETONS = {}
+_SINGLETON_LOCK = threading.Lock()
+
+
+def _singleton(name, factory):
+    instance = _SINGLETONS.get(name)
+    if instance is None:
+        with _SINGLETON_LOCK:
+            instance = _SINGLETONS.get(name)
+            if instance is None:
+                with timed(f"init {name}"):
+                    instance = factory()
+                _SINGLETONS[name] = instance
+    return instance
+
+
+def get_token_instance():
+    def build():
+        from src.token_cache import AccessTokenCache, zoho_token_fetcher
+        # the accounts server of the Zoho data center the org lives in; Canada, as before
+        return AccessTokenCache(
+            zoho_token_fetcher(
+                accounts_url=os.getenv("ZOHO_ACCOUNTS_URL", "https://accounts.zohocloud.ca"),
+                client_id=os.getenv("CLIENT_ZOHO_ID"),
+                client_secret=os.getenv("CLIENT_ZOHO_SECRET"),
+                refresh_token=os.getenv("REFRESH_TOKEN"),
+            ),
+            refresh_margin=float(os.getenv("ZOHO_TOKEN_REFRESH_MARGIN", "300")),
+        )
+    return _singleton("TOKEN_INSTANCE", build)
+
+
+def get_zoho_api():
+    def build():
+        with timed("import src.zoho_client (aiohttp)"):
+            from src.zoho_client import AsyncZohoClient
+        return AsyncZohoClient(
+            base_url=os.getenv("ZOHO_API_BASE_URL", "https://www.zohoapis.ca/crm/v2"),
+            timeout=float(os.getenv("ZOHO_TIMEOUT", "15")),
+            connect_timeout=float(os.getenv("ZOHO_CONNECT_TIMEOUT", "5")),
+            pool_size=int(os.getenv("ZOHO_POOL_SIZE", "20")),
+        )
+    return _singleton("ZOHO_API", build)
+
+
+def get_carrier_data():
+    def build():
+        with timed("import src.snapshot (pandas)"):
+            from src.snapshot import load_carrier_data
+        return load_carrier_data("CarriersT.csv", "CarriersT.npz")
+    snapshot = _singleton("CARRIER_DATA", build)
+    _singleton("CARRIER_RELOADER", _start_carrier_reloader)
+    return snapshot
+
+
+def set_carrier_data(snapshot):
+    """Publish a new carrier snapshot; requests already running keep the one they hold."""
+    _SINGLETONS["CARRIER_DATA"] = snapshot
+
+
+def _start_carrier_reloader():
+    """
+    Poll the configured carrier source (CARRIER_SOURCE=blob|local) in the background.
+    Returns False when hot reload is not configured.
+    """
+    source_type = os.getenv("CARRIER_SOURCE", "").lower()
+    if not source_type:
+        return False
+
+    from src.carrier_source import BlobCarrierSource, CarrierDataReloader, LocalDirectorySource
+
+    if source_type == "blob":
+        source = BlobCarrierSource(
+            os.getenv("CARRIER_BLOB_CONN_STR"),
+            os.getenv("CARRIER_BLOB_CONTAINER", "carrier-data"),
+            os.getenv("CARRIER_BLOB_NAME", "CarriersT.npz"),
+        )
+    elif source_type == "local":
+        source = LocalDirectorySource(os.getenv("CARRIER_LOCAL_DIR", "."))
+    else:
+        logger.warning(f"Unknown CARRIER_SOURCE {source_type!r}, carrier data will not be reloaded")
+        return False
+
+    reloader = CarrierDataReloader(
+        source,
+        on_update=set_carrier_data,
+        current=lambda: _SINGLETONS.get("CARRIER_DATA"),
+        interval=float(os.getenv("CARRIER_RELOAD_INTERVAL", "300")),
+    )
+    _SINGLETONS["CARRIER_RELOADER"] = reloader
+    return reloader.start()
+
+
+def _load_tax_rows(session):
+    return [TaxRate(row.province, row.tax_name, row.tax_rate, row.tax_type) for row in session.query(TaxDataBase).all()]
+
+
+def get_tax_table():
+    def build():
+        async def load():
+            connect = lambda: DatabaseConnection(connection_string=os.getenv("SQL_CONN_STR"))
+            return await SQL_RUNNER.run(connect, _load_tax_rows)
+        return TaxRateTable(load, ttl=float(os.getenv("TAX_TABLE_TTL", "3600")))
+    return _singleton("TAX_TABLE", build)
+
+
+def get_quote_cache():
+    def build():
+        return ReadThroughCache(
+            maxsize=int(os.getenv("QUOTE_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("QUOTE_CACHE_TTL", "30")),
+            negative_ttl=float(os.getenv("QUOTE_CACHE_NEGATIVE_TTL", "5")),
+            is_negative=lambda response: response.get("code") == 404,
+        )
+    return _singleton("QUOTE_CACHE", build)
+
+
+def invalidate_route_quotes(pickup_city, destination_city):
+    """Drop the cached get-quote answer for a route; call after committing a change to its quotes."""
+    get_quote_cache().invalidate((route_key(pickup_city), route_key(destination_city)))
+
+
+def cache_report(lead_handler=None) -> dict:
+    """Stats of the in-process caches that have been created in this worker."""
+    report = {}
+    for name, key in (("quotes", "QUOTE_CACHE"), ("tax_rates", "TAX_TABLE"), ("access_token", "TOKEN_INSTANCE")):
+        if _SINGLETONS.get(key) is not None:
+            report[name] = _SINGLETONS[key].stats()
+    if lead_handler is not None and lead_handler._recom_model is not None:
+        report["recommendations"] = lead_handler._recom_model.cache_stats()
+    if lead_handler is not None:
+        report["lead_requests"] = lead_handler.idempotency.stats()
+    if _SINGLETONS.get("CARRIER_DATA") is not None:
+        report["city_aliases"] = _SINGLETONS["CARRIER_DATA"].cities.stats()
+        if _SINGLETONS["CARRIER_DATA"].nearby is not None:
+            report["gazetteer"] = _SINGLETONS["CARRIER_DATA"].nearby.stats()
+    return report
+
+
+def get_slack_dispatcher():
+    def build():
+        from utils.notifier import SlackDispatcher
+        return SlackDispatcher(
+            os.getenv("BOT_TOKEN"),
+            max_queue=int(os.getenv("SLACK_QUEUE_SIZE", "500")),
+            batch_window=float(os.getenv("SLACK_BATCH_WINDOW", "2")),
+            spill_path=os.getenv("SLACK_SPILL_PATH", os.path.join(TEMP_DIR, "slack_spill.jsonl")),
+            base_url=os.getenv("SLACK_API_URL"),
+        )
+    return _singleton("SLACK_DISPATCHER", build)
+
+
+def notify_quote_channel(message):
+    """Queue a message for the quote Slack channel; never waits on Slack."""
+    get_slack_dispatcher().notify(os.getenv("QUOTE_CHANNEL_ID"), message)
+
 
-ZOHO_API = ZohoApi(base_url="https://www.zohoapis.ca/crm/v2")
-CARRIER_DATA = pd.read_csv("CarriersT.csv")
+_LAZY_ATTRIBUTES = {
+    "TOKEN_INSTANCE": get_token_instance,
+    "ZOHO_API": get_zoho_api,
+    "CARRIER_DATA": get_carrier_data,
+}
+
+
+def __getattr__(name):
+    # keeps `src.funcmain.TOKEN_INSTANCE` and friends importable (and patchable) while lazy
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class LeadHandler:
@@ -41,14 +229,112 @@ class LeadHandler:
         """
         Initialize the Lead handler class.
         """
-        self.recom_model = CarrierRecommendationModel(logger)
+        self._recom_model = None
+        self._recom_model_lock = threading.Lock()
+        self.idempotency = LeadIdempotency(
+            SQL_RUNNER, self._connect,
+            ttl=IDEMPOTENCY_TTL, lease=IDEMPOTENCY_LEASE,
+            wait=IDEMPOTENCY_WAIT, poll_interval=IDEMPOTENCY_POLL_INTERVAL,
+        )
+
+    @property
+    def recom_model(self):
+        """Recommendation model, created on the first lead request (on a worker thread)."""
+        with self._recom_model_lock:
+            if self._recom_model is None:
+                with timed("import src.recom (pandas)"):
+                    from src.recom import CarrierRecommendationModel
+                self._recom_model = CarrierRecommendationModel(
+                    logger,
+                    cache_size=int(os.getenv("RECOM_CACHE_SIZE", "256")),
+                    cache_ttl=float(os.getenv("RECOM_CACHE_TTL", "300")),
+                )
+        return self._recom_model
+
+    def _recommend(self, *lane):
+        """Leads for one lane. Blocking: the first call loads the model and the carrier snapshot."""
+        return self.recom_model.recommend_carriers(get_carrier_data(), *lane)
+
+    def _recommend_many(self, lanes, top_n):
+        """Leads for many lanes, scored together; blocking, like _recommend."""
+        return self.recom_model.recommend_carriers_batch(get_carrier_data(), lanes, top_n)
+
+    def _connect(self):
+        return DatabaseConnection(connection_string=os.getenv("SQL_CONN_STR"))
+
+    @traced("recommendations.batch")
+    async def recommend_batch(self, body) -> dict:
+        """
+        Ranked carriers and lead tiers for many lanes, without touching the CRM. The lanes
+        are scored together in one pass, on a worker thread.
+        """
+        lanes = body.get("lanes") if isinstance(body, dict) else body
+        if not isinstance(lanes, list) or not lanes:
+            return {"status": "failed", "message": "No lanes given", "code": 400, "results": []}
+        if len(lanes) > RECOMMEND_BATCH_LIMIT:
+            return {"status": "failed", "message": f"At most {RECOMMEND_BATCH_LIMIT} lanes per batch", "code": 413, "results": []}
+        top_n = body.get("top_n", 14) if isinstance(body, dict) else 14
+        if not isinstance(top_n, int) or top_n < 1:
+            return {"status": "failed", "message": "top_n must be a positive integer", "code": 400, "results": []}
+
+        results = []
+        accepted = []
+        for i, lane in enumerate(lanes):
+            fields = {f: lane.get(f, "") for f in LANE_FIELDS} if isinstance(lane, dict) else None
+            results.append({"index": i, **(fields or {})})
+            if not fields or not ((fields["pickup_city"] and fields["dropoff_city"])
+                                  or (fields["pickup_province"] and fields["dropoff_province"])):
+                results[i].update(status="failed", code=400,
+                                  message="pickup_city and dropoff_city, or pickup_province and dropoff_province, are required")
+                continue
+            accepted.append((i, tuple(fields[f] for f in LANE_FIELDS)))
+
+        if accepted:
+            try:
+                with span("recommendations.score", lanes=len(accepted)):
+                    ranked = await asyncio.to_thread(self._recommend_many, [lane for _, lane in accepted], top_n)
+            except Exception as e:
+                logger.error(f"Batch recommendation error: {e}")
+                return {"status": "failed", "message": "error recommending carriers", "code": 500, "results": []}
+            for (i, _), leads in zip(accepted, ranked):
+                results[i].update(status="success", code=200, city_match=leads.attrs.get("city_match"),
+                                  carriers=self._ranked_carriers(leads))
+
+        failed = sum(r["status"] == "failed" for r in results)
+        status = "success" if not failed else "partial" if failed < len(results) else "failed"
+        return {"status": status, "code": 200 if status != "failed" else 400, "results": results}
+
+    @staticmethod
+    def _ranked_carriers(leads) -> list:
+        """Leads frame (lowest score first) as JSON rows, best carrier first."""
+        return [
+            {"rank": rank, "carrier": name, "lead_score": tier, "score": round(float(score), 3),
+             "matching_score": round(float(matching), 3)}
+            for rank, (name, tier, score, matching) in enumerate(zip(
+                leads["Carrier Name"][::-1], leads["Lead Score"][::-1], leads["CScore"][::-1], leads["matching_score"][::-1]
+            ), 1)
+        ]
+
+    @traced("leads")
+    async def add_carrier_and_quotes(self, body, idempotency_key=None) -> dict:
+        """
+        Create a Potential Carrier in the CRM, once per deal_id (and Idempotency-Key): a
+        repeat gets the stored response, and one that arrives while the deal is still being
+        processed waits for it. A repeat of a request whose CRM writes were rejected, or
+        failed before they were sent, retries those writes only.
+        """
+        key = lead_request_key(body.get("deal_id"), idempotency_key)
+        return await self.idempotency.run(key, body.get("deal_id"), lambda writes: self._add_carrier_and_quotes(body, writes))
 
-    async def add_carrier_and_quotes(self, body) -> dict:
+    async def _add_carrier_and_quotes(self, body, writes=None) -> dict:
         """
-        Create a Potential Carrier in the CRM.
+        `writes` collects the outcome of each CRM create by module (see src.idempotency);
+        modules it already marks as written are skipped.
         """
+        writes = {} if writes is None else writes
         try:
-            token = TOKEN_INSTANCE.get_access_token()
+            with span("leads.token"):
+                token = await get_token_instance().get_access_token()
             deal_id = body.get("deal_id", "")
             order_id = body.get("order_id", "")
             pickupcity = body.get("pickup_city", "")
@@ -58,56 +344,82 @@ class LeadHandler:
             pickup_location = body.get("pickup_loc", "")
             dropoff_location = body.get("dropoff_loc", "")
 
-            logger.info(f"Adding Potential Carriers for {deal_id}")
-
-            # Handle database operations
-            with DatabaseConnection(connection_string=os.getenv("SQL_CONN_STR")) as session:
-                logger.info("Database connection established")
-                leads= self.recom_model.recommend_carriers(
-                        CARRIER_DATA, pickupcity, dropoffcity, pickup_province, dropoff_province
-                    )
-                
-                quote_response = self._check_and_create_quotes_in_crm(
-                    session, token, pickupcity, dropoffcity, pickup_location, dropoff_location, order_id, deal_id
-                )
+            logger.info("Adding Potential Carriers for %s", deal_id)
+
+            with span("leads.recommend") as stage:
+                # on a worker thread, so a cold load or a cache miss doesn't hold up other requests
+                leads = await asyncio.to_thread(self._recommend, pickupcity, dropoffcity, pickup_province, dropoff_province)
+                stage["carriers"] = len(leads)
+
+            with span("leads.quote_query") as stage:
+                matching_quotes = await SQL_RUNNER.run(self._connect, self._find_active_quotes, pickupcity, dropoffcity)
+                stage["quotes"] = len(matching_quotes)
+            existing_quotes = {quote.CarrierName: quote for quote in matching_quotes}
+
+            # the Transport_Offers/Deals updates and the Potential_Carrier batch are independent;
+            # both are let finish before a failure of either is reported, so `writes` is final
+            quote_response, carrier_response = await asyncio.gather(
+                self._check_and_create_quotes_in_crm(
+                    token, matching_quotes, pickupcity, dropoffcity, pickup_location, dropoff_location, order_id, deal_id,
+                    writes,
+                ),
+                self._create_n_attach_carrier_in_crm(
+                    token, leads, deal_id, existing_quotes, pickup_location, dropoff_location, writes
+                ),
+                return_exceptions=True,
+            )
+            if isinstance(quote_response, BaseException):
+                writes.setdefault("Transport_Offers", "failed")  # failed before the create was sent
+            for response in (quote_response, carrier_response):
+                if isinstance(response, BaseException):
+                    raise response
 
-                carrier_response =  self._create_n_attach_carrier_in_crm(
-                    session, token, leads, deal_id, quote_response['existing_quotes'], pickup_location, dropoff_location
-                )
-                # drop quote object
-                del quote_response['existing_quotes']
-
-                return {
-                    "status": "success",
-                    "attach_response": {
-                        "potential carrier": carrier_response,
-                        "quotations": quote_response
-                    }
-                }
+            return {
+                "status": "success",
+                "attach_response": {
+                    "potential carrier": carrier_response,
+                    "quotations": quote_response
+                },
+                "city_match": leads.attrs.get("city_match"),
+                "crm_writes": dict(writes),
+            }
 
         except Exception as e:
             logger.error(f"Main function error: {e}")
             return {
                 "status":"failed",
                 "error": str(e),
-                "code":500
+                "code":500,
+                "crm_writes": dict(writes),
             }
 
+    async def _create_crm_records(self, writes, module, payload, token):
+        """create_record, with its outcome recorded in `writes[module]`: "unknown" until Zoho answers."""
+        writes[module] = "unknown"
+        response = await get_zoho_api().create_record(moduleName=module, data=payload, token=token)
+        writes[module] = "created" if response.status_code < 400 else "rejected"
+        return response
+
 
-    def _create_n_attach_carrier_in_crm(self, session, token, leads, deal_id, existing_quotes, pickup_location, dropoff_location):
+    @traced("leads.crm_carriers")
+    async def _create_n_attach_carrier_in_crm(self, token, leads, deal_id, existing_quotes, pickup_location, dropoff_location,
+                                              writes=None):
         """
         Process carrier recommendations and update the CRM.
         """
-        logger.info(existing_quotes)
+        writes = {} if writes is None else writes
+        if writes.get("Potential_Carrier") in WRITTEN:
+            return {"status": "success", "message": "Leads already added"}
+        logger.debug("Existing quotes: %s", existing_quotes)
         try:
             if not leads.empty:
-                logger.info(f"Processing recommendations: {leads['Carrier Name'].tolist()}")
+                logger.info("Processing %d recommendations", len(leads))
                 leads["Carrier Name"] = leads["Carrier Name"].apply(standardize_name)
                 carrier_names = leads["Carrier Name"].tolist()
                 preprocess_quotes = {standardize_name(k): v for k, v in existing_quotes.items()}
 
-                carriers = session.query(Vendor).filter(Vendor.VendorName.in_(carrier_names)).all()
-                carriers_with_ids = {c.VendorName: c.ZohoRecordID for c in carriers}
+                with span("leads.vendor_lookup"):
+                    carriers_with_ids = await SQL_RUNNER.run(self._connect, self._find_vendor_ids, carrier_names)
 
                 data = []
                 for index, row in leads.iterrows(): ## prepare batch request data
@@ -129,14 +441,14 @@ class LeadHandler:
                             lead_data["Est_Delivery_Date"] = preprocess_quotes[carrier_name].EstimatedDropoffTime
 
                         data.append(lead_data)
-                        logger.info(f"data {lead_data}")
+                        logger.debug("data %s", lead_data)
                     except Exception as e:
                         logger.error(f"Error Adding/Parsing lead: {e}")
 
                 payload = {"data": data}
 
-                lead_response = ZOHO_API.create_record(moduleName="Potential_Carrier",data=payload,token=token)
-                logger.info(f"lead_response {lead_response.json()}")
+                lead_response = await self._create_crm_records(writes, "Potential_Carrier", payload, token)
+                log_payload(logger, "lead_response", lead_response.json())
                 if lead_response.status_code == 200:
                     return {
                         "status": "success",
@@ -151,33 +463,44 @@ class LeadHandler:
 
         except Exception as e:
             logger.warning(f"Error while generating recommendations: {e}")
+            writes.setdefault("Potential_Carrier", "failed")  # unless the create was sent, a retry runs it again
             return {
                 "status": "failed",
                 "message": "No Potential Carrier Found",
                 "code": 500
             }
 
-    def _check_and_create_quotes_in_crm(self, session, token, pickup_city, destination_city, pickup_location, dropoff_location, order_id, deal_id):
-        """
-        Check for existing quotes and create them if applicable.
-        """
-        logger.info("Checking existing quote availability")
-        matching_quotes = session.query(TransportQuotation).filter(
+    def _find_vendor_ids(self, session, carrier_names):
+        """Map vendor names to their Zoho record ids."""
+        carriers = session.query(Vendor).filter(Vendor.VendorName.in_(carrier_names)).all()
+        return {c.VendorName: c.ZohoRecordID for c in carriers}
+
+    def _find_active_quotes(self, session, pickup_city, destination_city):
+        """Fetch the active quotes stored for the route."""
+        logger.debug("Checking existing quote availability")
+        return session.query(TransportQuotation).filter(
             and_(
-                TransportQuotation.QuoteStatus == "Active",
-                TransportQuotation.PickupCity.like(f"%{pickup_city}%"),
-                TransportQuotation.DestinationCity.like(f"%{destination_city}%")
+                TransportQuotation.QuoteStatus == "ACTIVE",
+                TransportQuotation.PickupKey == route_key(pickup_city),
+                TransportQuotation.DestinationKey == route_key(destination_city),
             )
         ).all()
 
-        existing_quotes = dict()
+    @traced("leads.crm_quotes")
+    async def _check_and_create_quotes_in_crm(self, token, matching_quotes, pickup_city, destination_city, pickup_location, dropoff_location, order_id, deal_id,
+                                              writes=None):
+        """
+        Create Transport Offers for the existing quotes and move the deal forward.
+        """
+        writes = {} if writes is None else writes
+        if writes.get("Transport_Offers") in WRITTEN:
+            return {"status": "success", "message": "Quotes already created", "code": 200}
         if matching_quotes:
             batch_quote = []
 
             for quote in matching_quotes:
-                logger.info(f"Quote Details: {[quote.CarrierID, quote.Estimated_Amount, quote.EstimatedPickupTime, quote.EstimatedDropoffTime, quote.CreateDate]}")
-                logger.info(f"pcikup city {pickup_city}, dropoff {destination_city}")
-                existing_quotes[quote.CarrierName] = quote
+                logger.debug("Quote details for %s -> %s: %s %s %s %s %s", pickup_city, destination_city, quote.CarrierID,
+                             quote.Estimated_Amount, quote.EstimatedPickupTime, quote.EstimatedDropoffTime, quote.CreateDate)
                 data = {
                     "Name": f"{quote.CarrierName}-{order_id}",
                     "VendorID": quote.CarrierID,
@@ -196,28 +519,28 @@ class LeadHandler:
                 batch_quote.append(data)
 
             payload = {"data":batch_quote}
-            batch_quote_response = ZOHO_API.create_record(moduleName="Transport_Offers",data=payload,token=token)
-        
-            logger.info(f"{batch_quote_response.json()}")
+            zoho_api = get_zoho_api()
+            batch_quote_response, _ = await asyncio.gather(
+                self._create_crm_records(writes, "Transport_Offers", payload, token),
+                zoho_api.update_record(moduleName="Deals",id=deal_id,data={"data":[{
+                    "Stage": "Confirm Quote Details",
+                    "Order_Status": "Quote Pending"
+                }]},token=token),
+            )
 
+            log_payload(logger, "Transport_Offers response", batch_quote_response.json())
 
-            ZOHO_API.update_record(moduleName="Deals",id=deal_id,data={"data":[{
-                "Stage": "Confirm Quote Details",
-                "Order_Status": "Quote Pending"
-            }]},token=token)
             return {
                 "status": "success",
                 "message": "Quotes created successfully",
-                "existing_quotes": existing_quotes,
                 "code":200
             }
-        
+
         else:
             logger.info("No matching quotes found.")
             return {
                 "status": "failed",
                 "message": "No matching quotes found.",
-                "existing_quotes": existing_quotes,
                 "code":500
             }
 
@@ -231,55 +554,66 @@ class QuoteHandler:
         self.slack_token = os.getenv("BOT_TOKEN")
         self.slack_channel = os.getenv("QUOTE_CHANNEL_ID")
 
+    @traced("quotes.store")
     async def store_sql_quote(self, body: dict) -> func.HttpResponse:
         """
         Handle the storage of a new quote in the database.
         """
         try:
-            token = TOKEN_INSTANCE.get_access_token()
+            try:
+                with span("quotes.tax_lookup"):
+                    tax = await get_tax_table().lookup(body.get("Tax_Province", ""))
+            except UnknownTaxProvince as e:
+                logger.error(f"Quote Creation Error: {e}")
+                return {"status": "failed", "message": str(e), "code": 400}
+
+            with span("quotes.token"):
+                token = await get_token_instance().get_access_token()
             pickup_city = body.get("Pickup_City", "")
             destination_city = body.get("Dropoff_City", "")
-            tax_Province = body.get("Tax_Province", "")
-            
-            tax = self._fetch_tax_details(tax_Province)
-        
-            with DatabaseConnection(connection_string=self.db_connection_string) as session:
-                if self._quote_exists(session, body, pickup_city, destination_city):
-                    return {"status": "failed", "message": "Quote already exists", "code": 500}
-                try:
-                    self._deactivate_existing_quotes(session, pickup_city, destination_city, body.get("CarrierName"))
-                except Exception as e:
-                    logger.info(f"Failed to deactivate")
-                self._add_new_quote(session, body, pickup_city, destination_city, tax)
-                ZOHO_API.update_record(moduleName="Transport_Offers",data={"data":[{
-                       "Pickup_City":pickup_city,
-                        "Drop_off_City":destination_city
-                }] },id=body.get("QuotationRequestID","-"),token=token)
-
-                slack_msg = f"""💼📜 New Quote Added in Database! \n *Details* \n - Carrier Name: `{ body.get("CarrierName")}` \n - Pickup City: `{pickup_city}` \n - Destination City: `{destination_city}` \n - Est. Amount: `{body.get("Estimated_Amount", "-")}` \n - Est. Pickup Time: `{body.get("EstimatedPickupTime", "-")}` \n - Est. Dropoff Time: `{body.get("EstimatedDropoffTime", "-")}`"""
-                send_message_to_channel(os.getenv("BOT_TOKEN"),os.getenv("QUOTE_CHANNEL_ID"),slack_msg)
-            
-                return {"status":"success","message":"quote is successfully addded!","code":200}
+
+            with span("quotes.sql_write"):
+                stored = await SQL_RUNNER.run(self._connect, self._store_quote, body, pickup_city, destination_city, tax)
+            if not stored:
+                return {"status": "failed", "message": "Quote already exists", "code": 500}
+
+            await get_zoho_api().update_record(moduleName="Transport_Offers",data={"data":[{
+                   "Pickup_City":pickup_city,
+                    "Drop_off_City":destination_city
+            }] },id=body.get("QuotationRequestID","-"),token=token)
+
+            slack_msg = f"""💼📜 New Quote Added in Database! \n *Details* \n - Carrier Name: `{ body.get("CarrierName")}` \n - Pickup City: `{pickup_city}` \n - Destination City: `{destination_city}` \n - Est. Amount: `{body.get("Estimated_Amount", "-")}` \n - Est. Pickup Time: `{body.get("EstimatedPickupTime", "-")}` \n - Est. Dropoff Time: `{body.get("EstimatedDropoffTime", "-")}`"""
+            notify_quote_channel(slack_msg)
+
+            return {"status":"success","message":"quote is successfully addded!","code":200}
         except Exception as e:
             logger.error(f"Quote Creation Error: {e}")
-            send_message_to_channel(
-                os.getenv("BOT_TOKEN"),
-                os.getenv("QUOTE_CHANNEL_ID"),
-                f" \n *Details* \n - Carrier Name: `{body.get('CarrierName')}` \n - Pickup City: `{pickup_city}` \n - Destination City: `{destination_city}` \n Error adding quote in sql: {e}"
-            )            
+            notify_quote_channel(
+                f" \n *Details* \n - Carrier Name: `{body.get('CarrierName')}` \n - Pickup City: `{body.get('Pickup_City', '')}` \n - Destination City: `{body.get('Dropoff_City', '')}` \n Error adding quote in sql: {e}"
+            )
             return  {"status":"failed","message":"error adding quote in sql","code":500}
 
-    def _fetch_tax_details(self, tax_province):
-        """Fetch tax details based on location."""
-        with DatabaseConnection(connection_string=self.db_connection_string) as session:
-            return session.query(TaxDataBase).filter(TaxDataBase.province == tax_province).first()
+    def _connect(self):
+        return DatabaseConnection(connection_string=self.db_connection_string)
+
+    def _store_quote(self, session, body, pickup_city, destination_city, tax):
+        """Replace the carrier's active quote for the route; returns False if the same quote already exists."""
+        if self._quote_exists(session, body, pickup_city, destination_city):
+            return False
+        try:
+            self._deactivate_existing_quotes(session, pickup_city, destination_city, body.get("CarrierName"))
+        except Exception as e:
+            logger.info(f"Failed to deactivate")
+        self._add_new_quote(session, body, pickup_city, destination_city, tax)
+        invalidate_route_quotes(pickup_city, destination_city)
+        return True
 
     def _quote_exists(self, session, body, pickup_city, destination_city):
         """Check if a similar quote already exists."""
         return session.query(TransportQuotation).filter(
             and_(
-                TransportQuotation.PickupCity == pickup_city,
-                TransportQuotation.DestinationCity == destination_city,
+                TransportQuotation.PickupKey == route_key(pickup_city),
+                TransportQuotation.DestinationKey == route_key(destination_city),
                 TransportQuotation.CarrierName == body.get("CarrierName"),
                 TransportQuotation.QuoteStatus == "ACTIVE",
                 TransportQuotation.Estimated_Amount == body.get("Estimated_Amount"),
@@ -292,8 +626,8 @@ class QuoteHandler:
         """Deactivate existing quotes for the same route and carrier."""
         session.query(TransportQuotation).filter(
             and_(
-                TransportQuotation.PickupCity == pickup_city,
-                TransportQuotation.DestinationCity == destination_city,
+                TransportQuotation.PickupKey == route_key(pickup_city),
+                TransportQuotation.DestinationKey == route_key(destination_city),
                 TransportQuotation.CarrierName == carrier_name,
                 TransportQuotation.QuoteStatus == "ACTIVE",
             )
@@ -301,7 +635,11 @@ class QuoteHandler:
 
     def _add_new_quote(self, session, body, pickup_city, destination_city, tax):
         """Add a new quote to the database."""
-        new_quote = TransportQuotation(
+        session.add(self._new_quote(body, pickup_city, destination_city, tax))
+        session.commit()
+
+    def _new_quote(self, body, pickup_city, destination_city, tax):
+        return TransportQuotation(
             CarrierID=body.get("CarrierID", "-"),
             CarrierName=body.get("CarrierName", "-"),
             DropoffLocation=body.get("DropoffLocation", "-"),
@@ -311,14 +649,165 @@ class QuoteHandler:
             Estimated_Amount=body.get("Estimated_Amount", "-"),
             PickupCity=pickup_city,
             DestinationCity=destination_city,
+            PickupKey=route_key(pickup_city),
+            DestinationKey=route_key(destination_city),
             TaxRate=tax.tax_rate,
             TaxName=tax.tax_name,
             QuoteStatus="ACTIVE",
             Additional=body.get("Additional", "0"),
             Surcharge=body.get("Surcharge", "0"),
         )
-        session.add(new_quote)
+
+    @traced("quotes.store_batch")
+    async def store_sql_quotes_batch(self, body) -> dict:
+        """
+        Store many quotes at once: one dedupe query, one UPDATE for superseded quotes,
+        one insert transaction, one Zoho batch update and one Slack summary.
+        """
+        quotes = body.get("quotes") if isinstance(body, dict) else body
+        if not isinstance(quotes, list) or not quotes:
+            return {"status": "failed", "message": "No quotes given", "code": 400, "results": []}
+        if len(quotes) > QUOTE_BATCH_LIMIT:
+            return {"status": "failed", "message": f"At most {QUOTE_BATCH_LIMIT} quotes per batch", "code": 413, "results": []}
+
+        results = [
+            {"index": i, "CarrierName": q.get("CarrierName") if isinstance(q, dict) else None, "status": "pending"}
+            for i, q in enumerate(quotes)
+        ]
+        accepted = []
+        tax_table = get_tax_table()
+        for result, quote in zip(results, quotes):
+            try:
+                if not isinstance(quote, dict) or not all(quote.get(f) for f in ("CarrierName", "Pickup_City", "Dropoff_City")):
+                    raise ValueError("CarrierName, Pickup_City and Dropoff_City are required")
+                key = self._quote_key(quote["Pickup_City"], quote["Dropoff_City"], quote["CarrierName"],
+                                      quote.get("Estimated_Amount", "-"), quote.get("Additional"), quote.get("Surcharge"))
+                tax = await tax_table.lookup(quote.get("Tax_Province", ""))
+            except (ValueError, UnknownTaxProvince) as e:
+                result.update(status="failed", code=400, message=str(e))
+                continue
+            except Exception as e:
+                # the tax table could not be loaded: none of the remaining quotes can be priced
+                logger.error(f"Batch Quote Creation Error: {e}")
+                notify_quote_channel(f"Error looking up tax rates for a batch of {len(quotes)} quotes: {e}")
+                for pending in results:
+                    if pending["status"] == "pending":
+                        pending.update(status="failed", code=500, message="error looking up the tax rate")
+                return {"status": "failed", "message": "error looking up tax rates", "code": 500, "results": results}
+            accepted.append((result["index"], key, quote, tax))
+
+        if accepted:
+            try:
+                with span("quotes.sql_write_batch", quotes=len(accepted)):
+                    outcome = await SQL_RUNNER.run(self._connect, self._store_quotes_batch, accepted)
+            except Exception as e:
+                logger.error(f"Batch Quote Creation Error: {e}")
+                notify_quote_channel(f"Error adding a batch of {len(accepted)} quotes in sql: {e}")
+                for index, *_ in accepted:
+                    results[index].update(status="failed", code=500, message="error adding quote in sql")
+                return {"status": "failed", "message": "error adding quotes in sql", "code": 500, "results": results}
+            codes = {"stored": 200, "exists": 409, "superseded": 200}
+            for index, (status, message) in outcome.items():
+                results[index].update(status=status, code=codes[status], message=message)
+
+        stored = [quotes[r["index"]] for r in results if r["status"] == "stored"]
+        if stored:
+            records = [
+                {"id": q["QuotationRequestID"], "Pickup_City": q["Pickup_City"], "Drop_off_City": q["Dropoff_City"]}
+                for q in stored if q.get("QuotationRequestID")
+            ]
+            if records:
+                try:
+                    token = await get_token_instance().get_access_token()
+                    await get_zoho_api().update_records(moduleName="Transport_Offers", records=records, token=token)
+                except Exception as e:
+                    logger.error(f"Zoho batch update failed: {e}")
+            notify_quote_channel(self._batch_summary(stored))
+
+        failed = sum(r["status"] == "failed" for r in results)
+        if not failed:
+            status, code = "success", 200
+        elif failed < len(results):
+            status, code = "partial", 200
+        else:
+            status, code = "failed", 400
+        logger.info(f"Quote batch: {len(stored)} stored, {failed} failed of {len(results)}")
+        return {"status": status, "message": f"{len(stored)} of {len(results)} quotes added", "code": code, "results": results}
+
+    @staticmethod
+    def _quote_key(pickup_city, destination_city, carrier_name, amount, additional, surcharge):
+        """The columns _quote_exists compares, in comparable form; raises ValueError on bad numbers."""
+        return (route_key(pickup_city), route_key(destination_city), carrier_name, str(amount),
+                float(additional or 0), float(surcharge or 0))
+
+    @staticmethod
+    def _route_filters(routes):
+        """OR filters over (pickup key, destination key, carrier) routes, ROUTE_FILTER_CHUNK routes each."""
+        for start in range(0, len(routes), ROUTE_FILTER_CHUNK):
+            yield or_(*(
+                and_(
+                    TransportQuotation.PickupKey == pickup,
+                    TransportQuotation.DestinationKey == destination,
+                    TransportQuotation.CarrierName == carrier,
+                )
+                for pickup, destination, carrier in routes[start:start + ROUTE_FILTER_CHUNK]
+            ))
+
+    def _store_quotes_batch(self, session, accepted):
+        """
+        Apply a batch of validated quotes in one transaction; returns {index: (status, message)}.
+        The last quote for a route wins, like sending them one by one.
+        """
+        outcome = {}
+        latest = {}
+        for index, key, quote, tax in accepted:
+            route = key[:3]
+            if route in latest:
+                outcome[latest[route][0]] = ("superseded", "Replaced by a later quote in the same batch")
+            latest[route] = (index, key, quote, tax)
+
+        routes = list(latest)
+        existing = set()
+        for route_filter in self._route_filters(routes):
+            rows = session.query(
+                TransportQuotation.PickupKey, TransportQuotation.DestinationKey, TransportQuotation.CarrierName,
+                TransportQuotation.Estimated_Amount, TransportQuotation.Additional, TransportQuotation.Surcharge,
+            ).filter(TransportQuotation.QuoteStatus == "ACTIVE", route_filter).all()
+            existing.update(self._quote_key(*row) for row in rows)
+
+        replaced, new_quotes = [], []
+        for route, (index, key, quote, tax) in latest.items():
+            if key in existing:
+                outcome[index] = ("exists", "Quote already exists")
+                continue
+            replaced.append(route)
+            new_quotes.append(self._new_quote(quote, quote["Pickup_City"], quote["Dropoff_City"], tax))
+            outcome[index] = ("stored", "quote is successfully addded!")
+
+        if replaced:
+            try:
+                with session.begin_nested():
+                    for route_filter in self._route_filters(replaced):
+                        session.query(TransportQuotation).filter(
+                            TransportQuotation.QuoteStatus == "ACTIVE", route_filter
+                        ).update({"QuoteStatus": "INACTIVE"}, synchronize_session=False)
+            except Exception as e:
+                logger.info(f"Failed to deactivate: {e}")
+        session.add_all(new_quotes)
         session.commit()
+        for pickup, destination, _ in replaced:
+            get_quote_cache().invalidate((pickup, destination))
+        return outcome
+
+    @staticmethod
+    def _batch_summary(stored, limit=20):
+        lines = [
+            f" - `{q.get('CarrierName')}`: `{q.get('Pickup_City')}` → `{q.get('Dropoff_City')}` at `{q.get('Estimated_Amount', '-')}`"
+            for q in stored[:limit]
+        ]
+        if len(stored) > limit:
+            lines.append(f" - ...and {len(stored) - limit} more")
+        return f"💼📜 {len(stored)} New Quotes Added in Database! \n *Details* \n" + " \n".join(lines)
 
     def _format_quote(self, quote):
         """Format quote details into a dictionary."""
@@ -339,6 +828,7 @@ class QuoteHandler:
             "CustomerPrice_excl_tax": quote.CustomerPrice_excl_tax
         }
 
+    @traced("quotes.update")
     async def update_sql_quote(self, body: dict) -> dict:
         """
         Update an existing quote in the database.
@@ -347,41 +837,16 @@ class QuoteHandler:
                 # Extract data from the input
             primary_key_values = {
                 "CarrierName": body.get("CarrierName"),
-                "PickupCity": body.get("PickupCity"),
-                "DestinationCity": body.get("DestinationCity"),
+                "PickupKey": route_key(body.get("PickupCity")),
+                "DestinationKey": route_key(body.get("DestinationCity")),
                 "QuoteStatus": "ACTIVE",
             }
             customer_price = body.get("Customer_Price")
 
-            with DatabaseConnection(connection_string=self.db_connection_string) as session:
-                quote = session.query(TransportQuotation).filter_by(**primary_key_values).first()
-
-                if not quote:
-                    return {
-                        "status":"failed",
-                        "message":"invalid quote update",
-                        "code":400
-                    }
-
-                try:
-                    quote.CustomerPrice_excl_tax = float(customer_price)
-                    quote.TaxAmount = quote.CustomerPrice_excl_tax * (quote.TaxRate/100)
-                    quote.TotalAmount = quote.TaxAmount + quote.CustomerPrice_excl_tax
-                except Exception as e:
-                    logger.warning(f"Error converting Customer Price to float: {e}")
-
-                if body.get("Approval_status") == "Accepted":
-                    quote.Rating = quote.Rating + 1
-
-                # Commit the changes
-                session.commit()
-                logger.info("Record updated successfully")
-
-                return {
-                    "status":"success",
-                    "message":"quote update successfully",
-                    "code":200
-                }
+            with span("quotes.sql_update"):
+                return await SQL_RUNNER.run(
+                    self._connect, self._update_quote, primary_key_values, customer_price, body.get("Approval_status")
+                )
         except Exception as e:
             logger.error(f"Update Error: {e}")
             return {
@@ -390,33 +855,73 @@ class QuoteHandler:
                 "code":500
             }
 
+    def _update_quote(self, session, primary_key_values, customer_price, approval_status):
+        """Apply the customer price and approval to the active quote."""
+        quote = session.query(TransportQuotation).filter_by(**primary_key_values).first()
+
+        if not quote:
+            return {
+                "status":"failed",
+                "message":"invalid quote update",
+                "code":400
+            }
+
+        try:
+            quote.CustomerPrice_excl_tax = float(customer_price)
+            quote.TaxAmount = quote.CustomerPrice_excl_tax * (quote.TaxRate/100)
+            quote.TotalAmount = quote.TaxAmount + quote.CustomerPrice_excl_tax
+        except Exception as e:
+            logger.warning(f"Error converting Customer Price to float: {e}")
+
+        if approval_status == "Accepted":
+            quote.Rating = quote.Rating + 1
+
+        # Commit the changes
+        session.commit()
+        get_quote_cache().invalidate((primary_key_values["PickupKey"], primary_key_values["DestinationKey"]))
+        logger.info("Record updated successfully")
+
+        return {
+            "status":"success",
+            "message":"quote update successfully",
+            "code":200
+        }
+
+    def _get_quote(self, session, pickup_city, destination_city):
+        """Best rated active quote for the route, formatted."""
+        quote = session.query(TransportQuotation).filter(
+            and_(
+                TransportQuotation.QuoteStatus == "ACTIVE",
+                TransportQuotation.PickupKey == route_key(pickup_city),
+                TransportQuotation.DestinationKey == route_key(destination_city),
+            )
+        ).order_by(TransportQuotation.Rating.asc()).first()
+
+        if not quote:
+            return {
+                "status":"not found",
+                "message":"quote is not avaiable",
+                "code":404
+            }
+
+        return {
+            "status":"success",
+            "message":"quote retrieved successfully",
+            "code":200,
+            "data":self._format_quote(quote)
+        }
+
+    @traced("quotes.get")
     async def get_quote(self,pickup_city : str,destination_city : str) -> dict:
         """
         Retrieve an active quote based on input criteria.
         """
-        try:
-            with DatabaseConnection(connection_string=self.db_connection_string) as session:
-                quote = session.query(TransportQuotation).filter(
-                    and_(
-                        TransportQuotation.PickupCity == pickup_city,
-                        TransportQuotation.DestinationCity == destination_city,
-                        TransportQuotation.QuoteStatus == "ACTIVE",
-                    )
-                ).order_by(TransportQuotation.Rating.asc()).first()
-
-                if not quote:
-                    return {
-                        "status":"not found",
-                        "message":"quote is not avaiable",
-                        "code":404
-                    }
+        async def load():
+            with span("quotes.sql_read"):
+                return await SQL_RUNNER.run(self._connect, self._get_quote, pickup_city, destination_city)
 
-                return {
-                    "status":"success",
-                    "message":"quote retrieved successfully",
-                    "code":200,
-                    "data":self._format_quote(quote)
-                }
+        try:
+            return await get_quote_cache().get_or_load((route_key(pickup_city), route_key(destination_city)), load)
         except Exception as e:
             logger.error(f"Retrieval Error: {e}")
             return {
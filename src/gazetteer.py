@@ -0,0 +1,203 @@
+# src/gazetteer.py
+"""
+Offline city coordinates, and the spatial index of the carrier table's cities.
+
+The gazetteer is a small CSV (city, province, country, lat, lon, population) built
+from a GeoNames dump (https://download.geonames.org/export/dump/, e.g. cities500.txt).
+It keeps every place named like a city of the carrier table, plus the places above a
+population threshold so that requested towns the table has never served can be placed too:
+
+    python -m src.gazetteer cities500.txt gazetteer.csv --carriers CarriersT.csv
+
+The deploy workflow builds it next to CarriersT.npz. Nothing is fetched at runtime: when
+GAZETTEER_PATH (default gazetteer.csv) is missing, a warning is logged, the snapshot has
+no spatial index and recommendations skip the nearby-lane tier.
+
+NearbyCities is built once per CarrierSnapshot: the table's cities that the gazetteer
+can place, as unit vectors in a KDTree, so a radius query is a few node visits
+whatever the size of the table.
+"""
+import argparse
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.city_index import alias_key, fold_accents
+from utils.helpers import PROVINCE_CODES, US_STATE_CODES, get_logger
+from utils.kdtree import KDTree
+
+logger = get_logger(__name__)
+
+GAZETTEER_PATH = "gazetteer.csv"
+EARTH_RADIUS_KM = 6371.0088
+COLUMNS = ["city", "province", "country", "lat", "lon", "population"]
+# GeoNames admin1 codes of the Canadian provinces; US states use their postal codes
+GEONAMES_PROVINCES = {
+    "01": "Alberta", "02": "British Columbia", "03": "Manitoba", "04": "New Brunswick",
+    "05": "Newfoundland and Labrador", "07": "Nova Scotia", "08": "Ontario", "09": "Prince Edward Island",
+    "10": "Quebec", "11": "Saskatchewan", "12": "Yukon", "13": "Northwest Territories", "14": "Nunavut",
+}
+COUNTRIES = {"CA": ("Canada", GEONAMES_PROVINCES), "US": ("United States", US_STATE_CODES)}
+_PROVINCE_NAMES = {**PROVINCE_CODES, **US_STATE_CODES}
+
+
+def province_key(province):
+    """Comparison form of a province or state given by name or code: "QC", "Québec" -> "quebec"."""
+    if not isinstance(province, str) or not province.strip():
+        return None
+    province = province.strip()
+    return fold_accents(_PROVINCE_NAMES.get(province.upper(), province)).casefold()
+
+
+def unit_vectors(lat, lon) -> np.ndarray:
+    """(n, 3) points on the unit sphere; straight-line distance between them grows with arc length."""
+    lat, lon = np.radians(np.asarray(lat, dtype=float)), np.radians(np.asarray(lon, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _chord(km):
+    return 2 * np.sin(np.minimum(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+def _arc_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1))
+
+
+class Gazetteer:
+    """Coordinates by (alias_key(city), province_key(province)), and by city alone for the most populous place."""
+
+    def __init__(self, frame: pd.DataFrame):
+        frame = frame.dropna(subset=["city", "lat", "lon"])
+        if "population" in frame:
+            frame = frame.sort_values("population", ascending=False, kind="stable")
+        self.coordinates = {}
+        self.by_city = {}
+        for city, province, lat, lon in zip(frame["city"], frame["province"], frame["lat"], frame["lon"]):
+            alias, point = alias_key(city), (float(lat), float(lon))
+            self.coordinates.setdefault((alias, province_key(province)), point)
+            self.by_city.setdefault(alias, point)
+
+    @classmethod
+    def from_csv(cls, path: str):
+        return cls(pd.read_csv(path))
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    def locate(self, city, province=None):
+        """(lat, lon) of a city, or None; without a province the most populous place of that name."""
+        alias = alias_key(city)
+        if not alias:
+            return None
+        key = province_key(province)
+        if key is not None:
+            return self.coordinates.get((alias, key))
+        return self.by_city.get(alias)
+
+
+@functools.lru_cache(maxsize=1)
+def default_gazetteer():
+    """The gazetteer at GAZETTEER_PATH, loaded once; None if the file is not deployed."""
+    path = os.getenv("GAZETTEER_PATH", GAZETTEER_PATH)
+    if not os.path.exists(path):
+        logger.warning("No gazetteer at %s, recommendations skip the nearby-lane tier", path)
+        return None
+    try:
+        gazetteer = Gazetteer.from_csv(path)
+    except Exception as e:
+        logger.warning("Could not read gazetteer %s, recommendations skip the nearby-lane tier: %s", path, e)
+        return None
+    logger.info("Loaded %d gazetteer places from %s", len(gazetteer), path)
+    return gazetteer
+
+
+class NearbyCities:
+    """The carrier table's city keys that the gazetteer places, indexed for radius queries."""
+
+    def __init__(self, city_provinces: dict, gazetteer: Gazetteer):
+        """`city_provinces` maps each table city key to the normalized provinces it appears with."""
+        self.gazetteer = gazetteer
+        self.keys, points = [], []
+        for city, provinces in city_provinces.items():
+            point = next(filter(None, (gazetteer.locate(city, p) for p in sorted(provinces))), None)
+            if point is not None:
+                self.keys.append(city)
+                points.append(point)
+        self.positions = dict(zip(self.keys, points))
+        lat, lon = zip(*points) if points else ((), ())
+        self.tree = KDTree(unit_vectors(lat, lon))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def locate(self, city, province=None, keys=()):
+        """
+        (lat, lon) of a requested city: from the gazetteer, else from the table city keys
+        it resolved to.
+        """
+        point = self.gazetteer.locate(city, province)
+        if point is None:
+            point = next(filter(None, map(self.positions.get, keys)), None)
+        return point
+
+    def within(self, point, radius_km: float, limit: int = None):
+        """[(city key, distance in km)] of the table cities within `radius_km` of `point`, nearest first."""
+        if point is None or not len(self.keys):
+            return []
+        rows, chords = self.tree.query_radius(unit_vectors(*point)[0], _chord(radius_km))
+        rows, chords = rows[:limit], chords[:limit]
+        return list(zip((self.keys[row] for row in rows), _arc_km(chords).tolist()))
+
+    def stats(self) -> dict:
+        return {"places": len(self.gazetteer), "table_cities": len(self)}
+
+
+def build_gazetteer(dump_path: str, carrier_cities=(), min_population: int = 1000, countries=("CA", "US")) -> pd.DataFrame:
+    """
+    Gazetteer rows from a GeoNames dump: populated places of `countries` that are named
+    like one of `carrier_cities` or have at least `min_population` inhabitants.
+    """
+    names = ["geonameid", "name", "asciiname", "alternatenames", "lat", "lon", "feature_class",
+             "feature_code", "country_code", "cc2", "admin1", "admin2", "admin3", "admin4", "population"]
+    dump = pd.read_csv(dump_path, sep="\t", header=None, names=names, usecols=range(len(names)),
+                       dtype={"admin1": str, "country_code": str}, keep_default_na=False, na_values=[""],
+                       quoting=3, low_memory=False)
+    dump = dump[(dump["feature_class"] == "P") & dump["country_code"].isin(countries)]
+
+    wanted = {alias_key(city) for city in carrier_cities}
+    keep = (dump["population"] >= min_population) | dump["name"].map(alias_key).isin(wanted) \
+        | dump["asciiname"].map(alias_key).isin(wanted)
+    dump = dump[keep]
+
+    country = dump["country_code"].map(lambda code: COUNTRIES[code][0])
+    province = [COUNTRIES[code][1].get(admin1) for code, admin1 in zip(dump["country_code"], dump["admin1"])]
+    frame = pd.DataFrame({
+        "city": dump["name"].to_numpy(), "province": province, "country": country.to_numpy(),
+        "lat": dump["lat"].round(5).to_numpy(), "lon": dump["lon"].round(5).to_numpy(),
+        "population": dump["population"].to_numpy(),
+    }).dropna(subset=["province"])
+    frame = frame.sort_values("population", ascending=False, kind="stable")
+    frame = frame[~frame[["city", "province"]].assign(city=frame["city"].map(alias_key)).duplicated()]
+    return frame[COLUMNS].reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the city gazetteer from a GeoNames dump.")
+    parser.add_argument("dump", help="GeoNames dump, e.g. cities500.txt")
+    parser.add_argument("target", nargs="?", default=GAZETTEER_PATH)
+    parser.add_argument("--carriers", default="CarriersT.csv", help="carrier export whose cities are always kept")
+    parser.add_argument("--min-population", type=int, default=1000)
+    parser.add_argument("--countries", nargs="+", default=["CA", "US"], choices=sorted(COUNTRIES))
+    args = parser.parse_args()
+
+    carriers = pd.read_csv(args.carriers)
+    cities = pd.concat([carriers["Pickup City"], carriers["Destination City"]]).dropna().unique()
+    gazetteer = build_gazetteer(args.dump, cities, args.min_population, args.countries)
+    gazetteer.to_csv(args.target, index=False)
+    placed = Gazetteer(gazetteer)
+    missing = sorted({city for city in cities if placed.locate(city) is None})
+    print(f"{len(gazetteer)} places written to {args.target}; {len(missing)} carrier cities not found")
+    if missing:
+        print(", ".join(missing[:50]))
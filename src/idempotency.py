@@ -0,0 +1,209 @@
+# src/idempotency.py
+"""
+At-most-once processing of v1/leads requests.
+
+Zoho retries a webhook when it times out, and a retry must not create the Potential
+Carriers and Transport Offers a second time. Each request is keyed on its deal_id (plus
+the Idempotency-Key header when one is sent) and claimed in the LeadRequests table
+before any work starts:
+
+    no row / expired row   claim it and run; the response is stored for `ttl`
+    "done" row             return the stored response without running anything
+    "processing" row       another request is running it: wait (polling) for its response
+
+The work records what it wrote to the CRM in a `writes` dict, one entry per module:
+"unknown" once a create call is sent, then "created", or "rejected" when Zoho answered
+with an error; "failed" when the module's step failed before anything was sent. Whatever
+the response, a request that may have written something is stored, and a retry reruns
+only the modules that were rejected or failed (their state is passed back to the work,
+which skips the others). Only a request that wrote nothing and did
+not succeed releases its claim, so the deal can simply be run again.
+
+A claim is a lease: if the worker holding it dies, the row expires after `lease` seconds
+and the next retry takes over. Within one worker, concurrent requests for a key also
+share the running call directly.
+"""
+import asyncio
+import datetime
+import json
+import time
+
+from sqlalchemy.exc import IntegrityError
+
+from src.dbConnector import LeadRequest
+from utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+# CRM write states; "unknown" means the call was sent but no answer came back
+WRITTEN = ("created", "unknown")
+# states a retry runs again
+RETRIED = ("rejected", "failed")
+
+
+def lead_request_key(deal_id, idempotency_key=None):
+    """Key of a lead request, or None when there is nothing to key it on."""
+    deal_id = str(deal_id or "").strip()
+    idempotency_key = str(idempotency_key or "").strip()
+    if not deal_id and not idempotency_key:
+        return None
+    return f"{deal_id}|{idempotency_key}" if idempotency_key else deal_id
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class LeadIdempotency:
+
+    def __init__(self, runner, connect, ttl=86400, lease=600, wait=120, poll_interval=0.5):
+        """
+        `runner` is the AsyncSessionRunner and `connect` opens a session. Responses are kept
+        `ttl` seconds (0 disables idempotency); a request waits at most `wait` seconds for
+        one that is still running.
+        """
+        self.runner = runner
+        self.connect = connect
+        self.ttl = ttl
+        self.lease = lease
+        self.wait = wait
+        self.poll_interval = poll_interval
+        self._running = {}  # key -> future of the call running in this worker
+        self.outcomes = {"ran": 0, "resumed": 0, "replayed": 0, "joined": 0, "waited": 0, "timed_out": 0,
+                         "unavailable": 0}
+
+    def stats(self) -> dict:
+        return {**self.outcomes, "running": len(self._running)}
+
+    async def run(self, key, deal_id, work) -> dict:
+        """Return `await work(writes)`, run at most once per key while its response is kept."""
+        if key is None or self.ttl <= 0:
+            return await work({})
+
+        running = self._running.get(key)
+        if running is not None:
+            self.outcomes["joined"] += 1
+            logger.info("Lead request %s is already running here, waiting for it", key)
+            return await asyncio.shield(running)
+
+        future = asyncio.get_running_loop().create_future()
+        self._running[key] = future
+        try:
+            response = await self._run(key, deal_id, work)
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # the waiters, if any, get it; don't warn when there are none
+            raise
+        else:
+            future.set_result(response)
+            return response
+        finally:
+            del self._running[key]
+
+    async def _run(self, key, deal_id, work):
+        try:
+            state, response, writes = await self.runner.run(self.connect, self._claim, key, deal_id)
+            deadline = time.monotonic() + self.wait
+            if state == "busy":
+                self.outcomes["waited"] += 1
+                logger.info("Lead request %s is being processed elsewhere, waiting for it", key)
+            while state == "busy":
+                if time.monotonic() >= deadline:
+                    self.outcomes["timed_out"] += 1
+                    return {"status": "failed", "error": f"Lead request {key} is still being processed", "code": 409}
+                await asyncio.sleep(self.poll_interval)
+                state, response, writes = await self.runner.run(self.connect, self._claim, key, deal_id)
+        except Exception as e:
+            # without the table the request is still served, as it was before idempotency
+            self.outcomes["unavailable"] += 1
+            logger.error(f"Idempotency check failed for {key}, processing without it: {e}")
+            return await work({})
+
+        if state == "done":
+            self.outcomes["replayed"] += 1
+            logger.info("Lead request %s was already processed, returning the stored response", key)
+            return response
+
+        if writes:
+            self.outcomes["resumed"] += 1
+            logger.info("Lead request %s is retried for the CRM writes that failed: %s", key, dict(writes))
+        else:
+            self.outcomes["ran"] += 1
+        try:
+            response = await work(writes)
+        except BaseException as e:
+            await self._finish(key, {"status": "failed", "error": str(e), "code": 500, "crm_writes": writes}, writes)
+            raise
+        await self._finish(key, response, writes)
+        return response
+
+    async def _finish(self, key, response, writes):
+        """Store the response if the request succeeded or may have written to the CRM, else release the claim."""
+        written = any(state in WRITTEN for state in writes.values())
+        keep = written or response.get("status") == "success"
+        if written and response.get("status") != "success":
+            logger.warning("Lead request %s failed after writing to the CRM (%s); keeping it from running again", key, dict(writes))
+        try:
+            if keep:
+                await self.runner.run(self.connect, self._store, key, response, writes)
+            else:
+                await self.runner.run(self.connect, self._release, key)
+        except Exception as e:
+            logger.error(f"Could not record the outcome of lead request {key}: {e}")
+
+    def _claim(self, session, key, deal_id):
+        """
+        ("run", None, writes) if this call now holds the key, with the CRM writes of an
+        earlier attempt when it resumes one; ("done", response, writes) or ("busy", None, {}).
+        """
+        now = _utcnow()
+        lease = now + datetime.timedelta(seconds=self.lease)
+        row = session.get(LeadRequest, key)
+        if row is None:
+            session.add(LeadRequest(IdempotencyKey=key, DealID=deal_id, Status="processing", CreatedAt=now, ExpiresAt=lease))
+            try:
+                session.commit()
+            except IntegrityError:
+                session.rollback()
+                return "busy", None, {}  # claimed by another request in the meantime
+            return "run", None, {}
+
+        writes = {}
+        if row.ExpiresAt > now:
+            if row.Status != "done":
+                return "busy", None, {}
+            writes = json.loads(row.CrmWrites) if row.CrmWrites else {}
+            if not any(state in RETRIED for state in writes.values()):
+                return "done", json.loads(row.Response), writes
+            # else resume it: rerun the modules that were rejected or failed, and only those
+        # an expired response or an abandoned claim starts over
+
+        # take the row over; of several takers only one matches the old state
+        taken = session.query(LeadRequest).filter(
+            LeadRequest.IdempotencyKey == key, LeadRequest.Status == row.Status, LeadRequest.ExpiresAt == row.ExpiresAt
+        ).update({"Status": "processing", "DealID": deal_id, "Response": None, "CrmWrites": json.dumps(writes) if writes else None,
+                  "CreatedAt": now, "ExpiresAt": lease}, synchronize_session=False)
+        session.commit()
+        return ("run", None, writes) if taken else ("busy", None, {})
+
+    def _store(self, session, key, response, writes):
+        session.query(LeadRequest).filter(LeadRequest.IdempotencyKey == key).update({
+            "Status": "done",
+            "Response": json.dumps(response),
+            "CrmWrites": json.dumps(writes) if writes else None,
+            "ExpiresAt": _utcnow() + datetime.timedelta(seconds=self.ttl),
+        }, synchronize_session=False)
+        session.commit()
+
+    def _release(self, session, key):
+        session.query(LeadRequest).filter(
+            LeadRequest.IdempotencyKey == key, LeadRequest.Status == "processing"
+        ).delete(synchronize_session=False)
+        session.commit()
+
+
+def purge_expired(session) -> int:
+    """Delete expired rows; returns how many."""
+    deleted = session.query(LeadRequest).filter(LeadRequest.ExpiresAt <= _utcnow()).delete(synchronize_session=False)
+    session.commit()
+    return deleted
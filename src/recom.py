@@ -1,6 +1,290 @@
+import logging
+import os
+import uuid
 import pandas as pd
 import numpy as np
 from utils.helpers import *
+from utils.cache import TTLCache
+from src.city_index import CityAliasIndex
+
+LOCATION_COLUMNS = ["Pickup City", "Destination City", "Pickup State/Province", "Destination State/Province"]
+
+# nearby-lane tier: lanes starting and ending within these radii of the requested cities
+PICKUP_RADIUS_KM = float(os.getenv("RECOMMEND_PICKUP_RADIUS_KM", "75"))
+DROPOFF_RADIUS_KM = float(os.getenv("RECOMMEND_DROPOFF_RADIUS_KM", "75"))
+NEARBY_CITY_LIMIT = int(os.getenv("RECOMMEND_NEARBY_CITIES", "25"))
+# matching_score of a city lane by how its requested cities were resolved (the weaker side
+# counts): an alias may be another spelling of the name, a fuzzy match only looks like it
+CITY_MATCH_SCORES = {"exact": 10, "province_suffix": 10, "alias": 9, "fuzzy": 6}
+# matching_score of a nearby lane, from next to the requested cities down to the radius edge;
+# between the exact city match (10) and the province match (-5)
+NEARBY_SCORE_NEAR = 8
+NEARBY_SCORE_FAR = -3
+# matching_score of the fallback tiers: the province pair, or the country corridor when
+# the table has no lane between the two provinces
+FALLBACK_SCORES = {"province": -5, "corridor": -8}
+REGION_CODES = {**PROVINCE_CODES, **US_STATE_CODES}
+PROVINCE_COLUMNS = ("Pickup State/Province", "Destination State/Province")
+
+
+def region_key(province):
+    """One key per province or state, given by name or code: "QC", "Québec" -> "quebec"."""
+    if not isinstance(province, str):
+        return province
+    return normalize_text(REGION_CODES.get(province.strip().upper(), province))
+
+CARRIER_AGGREGATION = {
+    'Pickup City': 'first',  # Assuming the Pickup City is the same for each carrier
+    'Pickup State/Province': 'first',  # Assuming the Pickup State/Province is the same for each carrier
+    'Pickup Country': 'first',  # Assuming the Pickup Country is the same for each carrier
+    'Destination City': 'first',  # Assuming the Destination City is the same for each carrier
+    'Destination State/Province': 'first',  # Assuming the Destination State/Province is the same for each carrier
+    'Destination Country': 'first',  # Assuming the Destination Country is the same for each carrier
+    'Transport Requests': 'sum',  # Total transport requests for each carrier
+    'Avg. Cost Per Km': 'mean',  # Average cost per km for each carrier
+    'Estimated Amount': 'mean',  # Average estimated amount for each carrier
+    'Avg. Delivery Day': 'mean',  # Average delivery day for each carrier
+    'On-time': 'mean',  # Average on-time percentage for each carrier
+    'Late Delivery': 'mean',  # Average late delivery percentage for each carrier
+    'CountRequest': 'sum'  # Total requests count for each carrier
+}
+
+
+class LaneIndex:
+    """
+    Hash index from a (pickup, destination) key to the row positions serving that lane.
+    Rows are grouped with one stable argsort; the dict only stores slices into it.
+    """
+
+    def __init__(self, first: pd.Series, second: pd.Series):
+        codes_a, uniques_a = pd.factorize(first)
+        codes_b, uniques_b = pd.factorize(second)
+        pairs = codes_a.astype(np.int64) * len(uniques_b) + codes_b
+
+        self.order = np.argsort(pairs, kind='stable')
+        sorted_pairs = pairs[self.order]
+        starts = np.flatnonzero(np.r_[True, sorted_pairs[1:] != sorted_pairs[:-1]]) if len(pairs) else np.empty(0, dtype=np.int64)
+        ends = np.r_[starts[1:], len(pairs)].astype(np.int64)
+        keys = sorted_pairs[starts]
+        firsts = np.asarray(uniques_a, dtype=object)[keys // max(len(uniques_b), 1)]
+        seconds = np.asarray(uniques_b, dtype=object)[keys % max(len(uniques_b), 1)]
+        self._slices = dict(zip(zip(firsts.tolist(), seconds.tolist()), zip(starts.tolist(), ends.tolist())))
+
+    def __len__(self):
+        return len(self._slices)
+
+    def __contains__(self, key):
+        return key in self._slices
+
+    def keys(self):
+        return self._slices.keys()
+
+    def get(self, key):
+        bounds = self._slices.get(key)
+        if bounds is None:
+            return None
+        return self.order[bounds[0]:bounds[1]]
+
+
+class CarrierAggregates:
+    """
+    Per-carrier aggregates (CARRIER_AGGREGATION) of every (pickup, destination) key pair,
+    computed once per snapshot. The rows of a pair are contiguous and in carrier name
+    order, as groupby('Carrier Name') over that pair's rows would return them.
+    """
+
+    def __init__(self, data: pd.DataFrame, first: tuple, second: tuple, carriers: tuple):
+        """
+        `first`, `second` and `carriers` are (codes, sorted uniques) of the pair keys and the
+        carrier name of each row of `data`, as from pd.factorize(..., sort=True). Missing
+        values aggregate as 0.
+        """
+        codes, uniques = zip(first, second, carriers)
+        sizes = [max(len(u), 1) for u in uniques]
+        rows = np.flatnonzero((codes[0] >= 0) & (codes[1] >= 0) & (codes[2] >= 0))
+        group = (codes[0][rows].astype(np.int64) * sizes[1] + codes[1][rows]) * sizes[2] + codes[2][rows]
+        # sorted (pair, carrier) ids, the first row of each and every row's group
+        ids, firsts, inverse = np.unique(group, return_index=True, return_inverse=True)
+
+        reduced = {c: how for c, how in CARRIER_AGGREGATION.items() if how != 'first'}
+        numbers = data[list(reduced)] if len(rows) == len(data) else data[list(reduced)].iloc[rows]
+        totals = numbers.fillna(0).groupby(inverse).agg(reduced)
+        columns = {'Carrier Name': np.asarray(uniques[2], dtype=object)[ids % sizes[2]]}
+        for column, how in CARRIER_AGGREGATION.items():
+            if how == 'first':
+                values = data[column].to_numpy()[rows[firsts]]
+                # location columns are normalized to strings already
+                columns[column] = values if column in LOCATION_COLUMNS else pd.Series(values).fillna(0).to_numpy()
+            else:
+                columns[column] = totals[column].to_numpy()
+        self.frame = pd.DataFrame(columns)
+
+        pairs = ids // sizes[2]
+        starts = np.flatnonzero(np.r_[True, pairs[1:] != pairs[:-1]]) if len(pairs) else np.empty(0, dtype=np.int64)
+        ends = np.r_[starts[1:], len(pairs)].astype(np.int64)
+        keys = zip(np.asarray(uniques[0], dtype=object)[pairs[starts] // sizes[1]].tolist(),
+                   np.asarray(uniques[1], dtype=object)[pairs[starts] % sizes[1]].tolist())
+        self._slices = dict(zip(keys, zip(starts.tolist(), ends.tolist())))
+
+    def __len__(self):
+        return len(self._slices)
+
+    def __contains__(self, key):
+        return key in self._slices
+
+    def positions(self, key):
+        bounds = self._slices.get(key)
+        return None if bounds is None else np.arange(*bounds)
+
+    def get(self, key):
+        """One row per carrier serving the pair, or None when no lane has that pair."""
+        bounds = self._slices.get(key)
+        return None if bounds is None else self.frame.iloc[bounds[0]:bounds[1]]
+
+
+def _most_common(*sides) -> dict:
+    """
+    key -> its most frequent value over one or more ((key codes, keys), (value codes, values))
+    factorized column pairs; empty keys and missing values are skipped.
+    """
+    counts = {}
+    for (key_codes, keys), (value_codes, values) in sides:
+        valid = (key_codes >= 0) & (value_codes >= 0)
+        pairs = np.bincount(key_codes[valid].astype(np.int64) * len(values) + value_codes[valid])
+        for pair in np.flatnonzero(pairs).tolist():
+            key = (keys[pair // len(values)], values[pair % len(values)])
+            counts[key] = counts.get(key, 0) + int(pairs[pair])
+    best = {}
+    for (key, value), n in sorted(counts.items(), key=lambda item: -item[1]):
+        if key != "":
+            best.setdefault(key, value)
+    return best
+
+
+class CarrierSnapshot:
+    """
+    Carrier lane table normalized once at load time, with hash indexes keyed by the
+    (pickup, destination) city pair and the (pickup, destination) province pair, and an
+    alias index resolving requested city names to the table's city keys. Given a
+    gazetteer, the table's cities are also indexed by position for nearby-lane queries.
+
+    The fallback tiers are precomputed: per-carrier aggregates of every province pair and
+    of every (pickup country, destination country) corridor.
+    """
+
+    def __init__(self, carrierT: pd.DataFrame, version: str = None, gazetteer=None):
+        data = carrierT.reset_index(drop=True).copy()
+        factorized = {}
+        for column in LOCATION_COLUMNS:
+            # normalize each distinct value once
+            codes, uniques = pd.factorize(data[column].fillna(''))
+            normalized = np.asarray([normalize_text(v) for v in uniques], dtype=object)
+            data[column] = normalized[codes]
+            if column in PROVINCE_COLUMNS:
+                # the fallback aggregates are keyed on one spelling per province, codes resolved
+                normalized = np.asarray([region_key(v) for v in normalized], dtype=object)
+            merged, keys = pd.factorize(normalized, sort=True)
+            factorized[column] = (merged[codes], keys)
+        for column in ("Pickup Country", "Destination Country", "Carrier Name"):
+            factorized[column] = pd.factorize(data[column], sort=True)
+
+        self.data = data
+        self.version = version or uuid.uuid4().hex
+        self.city_index = LaneIndex(data["Pickup City"], data["Destination City"])
+        self.province_index = LaneIndex(data["Pickup State/Province"], data["Destination State/Province"])
+        self.cities = CityAliasIndex.from_columns(
+            (data["Pickup City"], data["Pickup State/Province"]),
+            (data["Destination City"], data["Destination State/Province"]),
+            is_place=None if gazetteer is None else (lambda city, province: gazetteer.locate(city, province) is not None),
+        )
+        self.province_carriers = CarrierAggregates(
+            data, factorized["Pickup State/Province"], factorized["Destination State/Province"], factorized["Carrier Name"])
+        self.corridor_carriers = CarrierAggregates(
+            data, factorized["Pickup Country"], factorized["Destination Country"], factorized["Carrier Name"])
+        # country of each province and city key, for lanes whose province pair has no lanes
+        self.province_countries = _most_common(
+            (factorized["Pickup State/Province"], factorized["Pickup Country"]),
+            (factorized["Destination State/Province"], factorized["Destination Country"]))
+        self.city_countries = _most_common(
+            (factorized["Pickup City"], factorized["Pickup Country"]),
+            (factorized["Destination City"], factorized["Destination Country"]))
+
+        self.nearby = None
+        if gazetteer is not None:
+            from src.gazetteer import NearbyCities
+            self.nearby = NearbyCities(self.cities.city_provinces, gazetteer)
+
+    def __len__(self):
+        return len(self.data)
+
+    def city_lane(self, pickup_city: str, destination_city: str) -> pd.DataFrame:
+        return self._take(self.city_index, (pickup_city, destination_city))
+
+    def city_lanes(self, pickup_cities: tuple, destination_cities: tuple) -> pd.DataFrame:
+        """Rows of every lane between any of the given city keys (several spellings of one city)."""
+        if len(pickup_cities) == 1 and len(destination_cities) == 1:
+            return self.city_lane(pickup_cities[0], destination_cities[0])
+        rows = [self.city_index.get((a, b)) for a in pickup_cities for b in destination_cities]
+        rows = [r for r in rows if r is not None]
+        if not rows:
+            return self.data.iloc[0:0]
+        return self.data.iloc[np.concatenate(rows)]
+
+    def nearby_lanes(self, origin, destination, pickup_radius_km: float, dropoff_radius_km: float,
+                     limit: int = None):
+        """
+        Rows of every lane from a table city within `pickup_radius_km` of `origin` to one
+        within `dropoff_radius_km` of `destination` ((lat, lon) points), with the pickup and
+        dropoff distances of each row in km. Empty without a spatial index.
+        """
+        empty = (self.data.iloc[0:0], np.empty(0), np.empty(0))
+        if self.nearby is None:
+            return empty
+        pickups = self.nearby.within(origin, pickup_radius_km, limit)
+        dropoffs = self.nearby.within(destination, dropoff_radius_km, limit) if pickups else []
+        rows, pickup_km, dropoff_km = [], [], []
+        for a, from_km in pickups:
+            for b, to_km in dropoffs:
+                lane = self.city_index.get((a, b))
+                if lane is not None:
+                    rows.append(lane)
+                    pickup_km.append(np.full(len(lane), from_km))
+                    dropoff_km.append(np.full(len(lane), to_km))
+        if not rows:
+            return empty
+        return self.data.iloc[np.concatenate(rows)], np.concatenate(pickup_km), np.concatenate(dropoff_km)
+
+    def country_of(self, province, city_keys=()):
+        """Country of a requested province (name or code), else of the first resolved city key that has one."""
+        key = region_key(province)
+        if key in self.province_countries:
+            return self.province_countries[key]
+        return next(filter(None, map(self.city_countries.get, city_keys)), None)
+
+    def fallback(self, pickup_province, dropoff_province, pickup_cities=(), destination_cities=()):
+        """
+        (tier, aggregates, key) of a lane's fallback carriers: the province pair when the
+        table has lanes between the two provinces, else the country corridor; None when
+        neither is known. Provinces may be given by name or code.
+        """
+        pair = (region_key(pickup_province), region_key(dropoff_province))
+        if pair in self.province_carriers:
+            return "province", self.province_carriers, pair
+        corridor = (self.country_of(pickup_province, pickup_cities), self.country_of(dropoff_province, destination_cities))
+        if corridor in self.corridor_carriers:
+            return "corridor", self.corridor_carriers, corridor
+        return None
+
+    def province_lane(self, pickup_province: str, dropoff_province: str) -> pd.DataFrame:
+        return self._take(self.province_index, (pickup_province, dropoff_province))
+
+    def _take(self, index: LaneIndex, key: tuple) -> pd.DataFrame:
+        rows = index.get(key)
+        if rows is None:
+            return self.data.iloc[0:0]
+        return self.data.iloc[rows]
+
+
 class CarrierRecommendationModel:
 
     _instance = None 
@@ -10,11 +294,17 @@ class CarrierRecommendationModel:
             cls._instance = super().__new__(cls)
         return cls._instance
 
-    def __init__(self, logger):
+    def __init__(self, logger, cache_size=256, cache_ttl=300):
         if not hasattr(self, "initialized"):  # Ensure __init__ runs only once
             self.logger = logger
+            # route -> recommendations, for the snapshot version in self._cache_version
+            self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+            self._cache_version = None
             self.initialized = True
 
+    def cache_stats(self) -> dict:
+        return {**self.cache.stats(), "snapshot_version": self._cache_version}
+
     def _transport_eff_m(self, avg_day, max_day, min_day, count_requests):
         if pd.isna(avg_day):
             return 0
@@ -70,95 +360,387 @@ class CarrierRecommendationModel:
             return "Cold"  # Below 25%
 
 
+    def _float_mask(self, values: pd.Series) -> np.ndarray:
+        # mirrors the isinstance(value, float) checks of the row-wise scorers
+        if values.dtype.kind == 'f':
+            return np.ones(len(values), dtype=bool)
+        if values.dtype.kind in 'iub':
+            return np.zeros(len(values), dtype=bool)
+        return values.map(lambda v: isinstance(v, float)).to_numpy(dtype=bool)
+
+    def _per_unique(self, func, values: np.ndarray) -> np.ndarray:
+        # evaluate a scalar formula once per distinct value, so python's round() semantics are kept
+        if values.size == 0:
+            return np.empty(0)
+        uniques, inverse = np.unique(values, return_inverse=True)
+        return np.array([func(v) for v in uniques], dtype=float)[inverse]
+
+    def _extremes(self, values: pd.Series, by=None):
+        """max and min of a candidate set, or per row the max and min of its lane when `by` labels the lanes."""
+        if by is None:
+            return values.max(), values.min()
+        grouped = values.groupby(by, sort=False)
+        return grouped.transform('max').to_numpy(dtype=float), grouped.transform('min').to_numpy(dtype=float)
+
+    def _transport_eff_v(self, avg_day: pd.Series, count_requests: pd.Series, by=None) -> np.ndarray:
+        """Vectorized _transport_eff_m over a candidate set (or over several lanes' sets, see _extremes)."""
+        avg = avg_day.to_numpy(dtype=float)
+        count = count_requests.to_numpy(dtype=float)
+        max_day, min_day = self._extremes(avg_day, by)
+
+        missing = np.isnan(avg)
+        flat = (min_day == max_day) & self._float_mask(avg_day)
+        scored = ~missing & ~flat
+
+        result = np.where(missing, 0.0, np.where(flat, 5.0, 0.0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            raw = 5 - (avg[scored] / np.broadcast_to(max_day, avg.shape)[scored]) * 5
+        raw = np.where(raw > 0, raw, 0)
+        scaling_factor = self._per_unique(
+            lambda c: 1 - round(1 / (1 + round(np.exp(-(c - 10)))), 3), count[scored]
+        )
+        teff = raw - raw * scaling_factor
+        slow_start = (avg[scored] < 2) & (count[scored] < 6)
+        result[scored] = np.where(slow_start, teff * 0.3, teff)
+        return result
+
+    def _reliability_v(self, on_time: pd.Series, late_delivery: pd.Series, count_requests: pd.Series) -> np.ndarray:
+        """Vectorized _reliability_m over a candidate set."""
+        on = on_time.to_numpy(dtype=float)
+        late = late_delivery.to_numpy(dtype=float)
+        count = count_requests.to_numpy(dtype=float)
+
+        scored = ~(((on + late) == 0) | np.isnan(late) | np.isnan(on))
+        result = np.zeros(len(on))
+        raw = (on[scored] / (on[scored] + late[scored]) * 5)
+        scale_factor = self._per_unique(
+            lambda c: 1 - round(1 / (1 + np.exp(-(c - 3))), 3), count[scored]
+        )
+        result[scored] = raw - raw * scale_factor
+        return result
+
+    def _cost_eff_v(self, estimated_cost: pd.Series, by=None) -> np.ndarray:
+        """Vectorized _cost_eff_m over a candidate set (or over several lanes' sets, see _extremes)."""
+        cost = estimated_cost.to_numpy(dtype=float)
+        max_cost, min_cost = self._extremes(estimated_cost, by)
+
+        missing = np.isnan(cost)
+        flat = (min_cost == max_cost) & self._float_mask(estimated_cost)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            raw = 10 - (cost / max_cost) * 10
+        raw = np.where(raw > 0, raw, 0)
+        return np.where(missing, 0.0, np.where(flat, 5.0, raw))
+
+    def _categorize_intensity_v(self, scores: pd.Series) -> np.ndarray:
+        """Vectorized _categorize_intensity_dynamic; thresholds are computed once per call."""
+        if scores.empty or len(scores) < 2:
+            return np.full(len(scores), "Cold", dtype=object)
+
+        mid_low_threshold, mid_threshold, high_threshold, very_high_threshold = np.percentile(scores, [50, 75, 90, 95])
+        cscore = scores.to_numpy(dtype=float)
+        return np.select(
+            [cscore >= very_high_threshold, cscore >= high_threshold, cscore >= mid_threshold, cscore >= mid_low_threshold],
+            ["Very Hot", "Hot", "Warm", "Moderate"],
+            default="Cold",
+        ).astype(object)
+
+    def _top_k(self, cscore: np.ndarray, k: int) -> np.ndarray:
+        """
+        Positions of the k best scores in ascending score order, found with a partial sort.
+        Ties are broken by candidate order (city matches first), NaN scores rank last.
+        """
+        keys = np.where(np.isnan(cscore), -np.inf, cscore)
+        if len(keys) > k:
+            kth = np.partition(-keys, k - 1)[k - 1]
+            above = np.flatnonzero(-keys < kth)
+            ties = np.flatnonzero(-keys == kth)[:k - len(above)]
+            top = np.concatenate([above, ties])
+        else:
+            top = np.arange(len(keys))
+        # best-first by score, earlier candidates first on ties
+        top = top[np.argsort(-keys[top], kind='stable')]
+        return top[np.argsort(cscore[top], kind='stable')]
+
+    def _score_carriers(self, recommended_carriers: pd.DataFrame, top_n: int = 14, by=None) -> pd.DataFrame:
+        """
+        Score and tier the candidate carriers and keep the best `top_n`, lowest score first.
+        With `by` (a lane label per row, each lane's rows contiguous) every lane is scored
+        and cut against its own candidates, as if it had been scored alone.
+        """
+        recommended_carriers['Transport Eff. Score'] = self._transport_eff_v(
+            recommended_carriers['Avg. Delivery Day'], recommended_carriers['CountRequest'], by)
+
+        recommended_carriers['Reliability Score'] = self._reliability_v(
+            recommended_carriers['On-time'], recommended_carriers['Late Delivery'], recommended_carriers['CountRequest'])
+
+        recommended_carriers['Cost Eff. Score'] = self._cost_eff_v(recommended_carriers['Estimated Amount'], by)
+
+        recommended_carriers = recommended_carriers.drop(columns=["Avg. Cost Per Km", "Transport Requests"], errors='ignore')
+
+        recommended_carriers['CScore'] = (
+            recommended_carriers['Transport Eff. Score'] +
+            recommended_carriers['Reliability Score'] +
+            recommended_carriers['Cost Eff. Score'] +
+            recommended_carriers['matching_score']
+        )
+
+        cscore = recommended_carriers['CScore'].to_numpy(dtype=float)
+        if by is None:
+            try:
+                recommended_carriers['Lead Score'] = self._categorize_intensity_v(recommended_carriers['CScore'])
+            except Exception as e:
+                self.logger.error(f"Lead Score Error: {e}")
+            return recommended_carriers.iloc[self._top_k(cscore, top_n)]
+
+        labels = np.asarray(by)
+        starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]]) if len(labels) else np.empty(0, dtype=np.int64)
+        ends = np.r_[starts[1:], len(labels)].astype(np.int64)
+        tiers = np.empty(len(labels), dtype=object)
+        keep = []
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            tiers[start:end] = self._categorize_intensity_v(recommended_carriers['CScore'].iloc[start:end])
+            keep.append(start + self._top_k(cscore[start:end], top_n))
+        recommended_carriers['Lead Score'] = tiers
+        return recommended_carriers.iloc[np.concatenate(keep) if keep else []]
+
+    def _resolve_city(self, snapshot, role, city, province):
+        match = snapshot.cities.resolve(city, province)
+        if not match.keys:
+            self.logger.debug("No %s city matches %r (%s)", role, city, match.rule)
+        elif match.rule != "exact":
+            self.logger.info("City alias (%s) for %s %r -> %s", match.rule, role, city, list(match.keys))
+        return match
+
+    @staticmethod
+    def _city_score(city, match) -> int:
+        # "alias" also covers a request spelled like one of several table spellings of the city
+        if match.rule == "alias" and normalize_text(city) in match.keys:
+            return CITY_MATCH_SCORES["exact"]
+        return CITY_MATCH_SCORES.get(match.rule, CITY_MATCH_SCORES["exact"])
+
+    def _city_lane_score(self, pickup_city, destination_city, pickup, destination) -> int:
+        """matching_score of the city-level lanes: that of the weaker of the two city matches."""
+        return min(self._city_score(pickup_city, pickup), self._city_score(destination_city, destination))
+
+    @staticmethod
+    def _city_match(pickup, destination) -> dict:
+        """How the requested cities were resolved, returned with the leads in DataFrame.attrs."""
+        return {"pickup": pickup.rule, "destination": destination.rule}
+
+    def _nearby_lanes(self, snapshot, pickup, destination, pickup_city, destination_city,
+                      pickup_province, dropoff_province):
+        """
+        Rows of the lanes within the pickup and dropoff radii, nearest first, with a
+        matching_score falling linearly with distance. None when the snapshot has no
+        spatial index or no lane is close enough.
+        """
+        if snapshot.nearby is None:
+            return None
+        origin = snapshot.nearby.locate(pickup_city, pickup_province, pickup.keys)
+        target = snapshot.nearby.locate(destination_city, dropoff_province, destination.keys)
+        lanes, pickup_km, dropoff_km = snapshot.nearby_lanes(
+            origin, target, PICKUP_RADIUS_KM, DROPOFF_RADIUS_KM, NEARBY_CITY_LIMIT)
+        if lanes.empty:
+            return None
+
+        closeness = 1 - (pickup_km / max(PICKUP_RADIUS_KM, 1e-9) + dropoff_km / max(DROPOFF_RADIUS_KM, 1e-9)) / 2
+        lanes = lanes.fillna(0).assign(matching_score=NEARBY_SCORE_FAR + (NEARBY_SCORE_NEAR - NEARBY_SCORE_FAR) * closeness)
+        # nearest lane first, so that the 'first' columns describe it
+        return lanes.iloc[np.argsort(-lanes['matching_score'].to_numpy(), kind='stable')]
+
+    def _nearby_carriers(self, snapshot, pickup, destination, pickup_city, destination_city,
+                         pickup_province, dropoff_province):
+        """
+        One row per carrier serving a lane within the pickup and dropoff radii, aggregated
+        like the province match, scored by its nearest lane; None if there is none.
+        """
+        lanes = self._nearby_lanes(snapshot, pickup, destination, pickup_city, destination_city,
+                                   pickup_province, dropoff_province)
+        if lanes is None:
+            return None
+        nearby = lanes.groupby('Carrier Name', sort=False).agg(
+            {**CARRIER_AGGREGATION, 'matching_score': 'max'}).reset_index()
+        self.logger.debug("%d nearby carriers for %r -> %r", len(nearby), pickup_city, destination_city)
+        return nearby
+
     def _normalize_text(self, text):
         if isinstance(text, str):
             return text.lower().strip().replace("é", "e")
         return text
 
-    def recommend_carriers(self, carrierT: pd.DataFrame, pickup_city : str, destination_city : str,pickup_province : str, dropoff_province :str):
-        try:
-            carrierT[["Pickup City", "Destination City","Pickup State/Province", "Destination State/Province"]] = carrierT[["Pickup City", "Destination City","Pickup State/Province", "Destination State/Province"]].fillna('')
-            
-            #city level matching
-            carrierT[["Pickup City", "Destination City", "Pickup State/Province", "Destination State/Province"]] = \
-            carrierT[["Pickup City", "Destination City", "Pickup State/Province", "Destination State/Province"]].applymap(self._normalize_text)
+    def recommend_carriers(self, carrierT, pickup_city : str, destination_city : str,pickup_province : str, dropoff_province :str):
+        """
+        Rank carriers for a lane. `carrierT` should be a CarrierSnapshot, whose results are
+        cached per route until the snapshot is replaced; a raw DataFrame is still accepted
+        but is normalized, indexed and scored on every call.
 
-                # Initialize an empty list to store final recommended carriers
-            recommended_carriers = pd.DataFrame()
+        The returned frame is always a private copy, callers may modify it.
+        """
+        if not isinstance(carrierT, CarrierSnapshot):
+            return self._recommend(carrierT, pickup_city, destination_city, pickup_province, dropoff_province)
 
-            # First match: City-level matching (both pickup and destination cities must match)
-            city_level_carriers = carrierT[
-                (carrierT['Pickup City'] == self._normalize_text(pickup_city)) &
-                (carrierT['Destination City'] == self._normalize_text(destination_city))
-            ]
-            city_level_carriers['matching_score'] = 10  # High score for exact city match
-            recommended_carriers = pd.concat([recommended_carriers, city_level_carriers], ignore_index=True)
+        if carrierT.version != self._cache_version:
+            self.cache.clear()
+            self._cache_version = carrierT.version
 
-            # Exclude carriers already matched in the city-level or partial city-level matches
-            remaining_carriers = carrierT[~carrierT['Carrier Name'].isin(recommended_carriers['Carrier Name'])]
-            remaining_carriers.fillna(0, inplace=True)  # Fill missing values with 0
-            # Second match: State-level matching (pickup and dropoff provinces must match)
-            state_level_carriers = remaining_carriers[
-                (remaining_carriers['Pickup State/Province'] == self._normalize_text(pickup_province)) &
-                (remaining_carriers['Destination State/Province'] == self._normalize_text(dropoff_province))
-            ]
-            
-            state_level_carriers = state_level_carriers.groupby('Carrier Name').agg({
-                    'Pickup City': 'first',  # Assuming the Pickup City is the same for each carrier
-                    'Pickup State/Province': 'first',  # Assuming the Pickup State/Province is the same for each carrier
-                    'Pickup Country': 'first',  # Assuming the Pickup Country is the same for each carrier
-                    'Destination City': 'first',  # Assuming the Destination City is the same for each carrier
-                    'Destination State/Province': 'first',  # Assuming the Destination State/Province is the same for each carrier
-                    'Destination Country': 'first',  # Assuming the Destination Country is the same for each carrier
-                    'Transport Requests': 'sum',  # Total transport requests for each carrier
-                    'Avg. Cost Per Km': 'mean',  # Average cost per km for each carrier
-                    'Estimated Amount': 'mean',  # Average estimated amount for each carrier
-                    'Avg. Delivery Day': 'mean',  # Average delivery day for each carrier
-                    'On-time': 'mean',  # Average on-time percentage for each carrier
-                    'Late Delivery': 'mean',  # Average late delivery percentage for each carrier
-                    'CountRequest': 'sum'  # Total requests count for each carrier
-                }).reset_index()
-            state_level_carriers['matching_score'] = -5  # Low score for state-level match
-            recommended_carriers = pd.concat([recommended_carriers, state_level_carriers], ignore_index=True)
-            # Drop duplicates to ensure no carrier is added more than once
-            recommended_carriers = recommended_carriers.drop_duplicates(subset='Carrier Name', keep='first')
+        route = self._route(carrierT, (pickup_city, destination_city, pickup_province, dropoff_province))
+        leads = self.cache.get(route)
+        if leads is None:
+            leads = self._recommend(carrierT, pickup_city, destination_city, pickup_province, dropoff_province)
+            self.cache.set(route, leads.copy())
+            return leads
+        return leads.copy()
+
+    def _route(self, snapshot, lane) -> tuple:
+        return (snapshot.version,) + tuple(self._normalize_text(v) for v in lane)
+
+    def recommend_carriers_batch(self, carrierT, lanes, top_n: int = 14) -> list:
+        """
+        Rank carriers for many (pickup_city, destination_city, pickup_province, dropoff_province)
+        lanes. Returns one frame per lane, in order, equal to what recommend_carriers returns
+        for it. Repeated and cached lanes are computed once; the rest share one candidate
+        frame that is aggregated and scored in a single grouped pass.
+        """
+        snapshot = carrierT if isinstance(carrierT, CarrierSnapshot) else CarrierSnapshot(carrierT)
+        if snapshot.version != self._cache_version:
+            self.cache.clear()
+            self._cache_version = snapshot.version
+
+        lanes = [tuple(lane) for lane in lanes]
+        results = {}
+        pending = {}
+        for lane in lanes:
+            route = self._route(snapshot, lane)
+            if route in results or route in pending:
+                continue
+            leads = self.cache.get(route)
+            if leads is None:
+                pending[route] = lane
+            else:
+                results[route] = leads
+
+        if pending:
+            try:
+                computed = self._recommend_many(snapshot, list(pending.values()), top_n)
+            except Exception as e:
+                self.logger.error(f"Batch Recommendation Error: {e}")
+                raise
+            for route, leads in zip(pending, computed):
+                self.cache.set(route, leads.copy())
+                results[route] = leads
+        return [results[self._route(snapshot, lane)].copy() for lane in lanes]
+
+    def _recommend_many(self, snapshot, lanes: list, top_n: int) -> list:
+        """_recommend for several distinct lanes, with the tiers of all lanes built and scored together."""
+        data = snapshot.data
+        city_rows, city_labels, city_scores, nearby, fallback_lanes, matches = [], [], [], [], {}, []
+        for label, (pickup_city, destination_city, pickup_province, dropoff_province) in enumerate(lanes):
+            pickup = self._resolve_city(snapshot, "pickup", pickup_city, pickup_province)
+            destination = self._resolve_city(snapshot, "destination", destination_city, dropoff_province)
+            matches.append(self._city_match(pickup, destination))
+            score = self._city_lane_score(pickup_city, destination_city, pickup, destination)
+            for a in pickup.keys:
+                for b in destination.keys:
+                    rows = snapshot.city_index.get((a, b))
+                    if rows is not None:
+                        city_rows.append(rows)
+                        city_labels.append(np.full(len(rows), label))
+                        city_scores.append(np.full(len(rows), score))
+            near = self._nearby_lanes(snapshot, pickup, destination, pickup_city, destination_city,
+                                      pickup_province, dropoff_province)
+            if near is not None:
+                nearby.append(near.assign(lane=label))
+            fallback = snapshot.fallback(pickup_province, dropoff_province, pickup.keys, destination.keys)
+            if fallback is not None:
+                fallback_lanes.setdefault(fallback, []).append(label)
+
+        if city_rows:
+            candidates = data.iloc[np.concatenate(city_rows)].assign(
+                lane=np.concatenate(city_labels), matching_score=np.concatenate(city_scores))
+        else:
+            candidates = data.iloc[0:0].assign(lane=np.empty(0, dtype=np.int64), matching_score=np.empty(0, dtype=np.int64))
+        matched = pd.MultiIndex.from_frame(candidates[['lane', 'Carrier Name']])
+
+        if nearby:
+            near = pd.concat(nearby)
+            near = near[~pd.MultiIndex.from_frame(near[['lane', 'Carrier Name']]).isin(matched)]
+            near = near.groupby(['lane', 'Carrier Name'], sort=False).agg(
+                {**CARRIER_AGGREGATION, 'matching_score': 'max'}).reset_index()
+            candidates = pd.concat([candidates, near], ignore_index=True)
+            matched = pd.MultiIndex.from_frame(candidates[['lane', 'Carrier Name']])
+
+        for tier, aggregates in (("province", snapshot.province_carriers), ("corridor", snapshot.corridor_carriers)):
+            positions, labels = [], []
+            for (_, source, key), members in fallback_lanes.items():
+                if source is aggregates:
+                    rows = aggregates.positions(key)
+                    positions.extend(rows for _ in members)
+                    labels.extend(np.full(len(rows), label) for label in members)
+            if not positions:
+                continue
+            fallback = aggregates.frame.iloc[np.concatenate(positions)].assign(lane=np.concatenate(labels))
+            fallback = fallback[~pd.MultiIndex.from_frame(fallback[['lane', 'Carrier Name']]).isin(matched)]
+            candidates = pd.concat([candidates, fallback.assign(matching_score=FALLBACK_SCORES[tier])], ignore_index=True)
 
-            recommended_carriers['Transport Eff. Score'] = recommended_carriers.apply(
-                lambda row: self._transport_eff_m(row['Avg. Delivery Day'],
-                                                 recommended_carriers['Avg. Delivery Day'].max(),
-                                                 recommended_carriers['Avg. Delivery Day'].min(),
-                                                 row['CountRequest']), axis=1)
+        # per lane: city, nearby, then fallback candidates, first occurrence of each carrier
+        candidates = candidates.drop_duplicates(subset=['lane', 'Carrier Name'], keep='first')
+        candidates = candidates.iloc[np.argsort(candidates['lane'].to_numpy(), kind='stable')].reset_index(drop=True)
+        scored = self._score_carriers(candidates, top_n, by=candidates['lane'].to_numpy())
 
-            recommended_carriers['Reliability Score'] = recommended_carriers.apply(
-                lambda row: self._reliability_m(row['On-time'], row['Late Delivery'], row['CountRequest']), axis=1)
+        # lanes stay in label order, so each lane's leads are one contiguous slice
+        bounds = np.searchsorted(scored['lane'].to_numpy(), np.arange(len(lanes) + 1))
+        scored = scored.drop(columns='lane')
+        results = []
+        for label in range(len(lanes)):
+            leads = scored.iloc[bounds[label]:bounds[label + 1]].reset_index(drop=True)
+            leads.attrs["city_match"] = matches[label]
+            results.append(leads)
+        return results
 
-            recommended_carriers['Cost Eff. Score'] = recommended_carriers.apply(
-                lambda row: self._cost_eff_m(row['Estimated Amount'],
-                                            recommended_carriers['Estimated Amount'].max(),
-                                            recommended_carriers['Estimated Amount'].min()), axis=1)
+    def _recommend(self, carrierT, pickup_city : str, destination_city : str,pickup_province : str, dropoff_province :str):
+        try:
+            snapshot = carrierT if isinstance(carrierT, CarrierSnapshot) else CarrierSnapshot(carrierT)
+
+                # Initialize an empty list to store final recommended carriers
+            recommended_carriers = pd.DataFrame()
 
-            recommended_carriers = recommended_carriers.drop(columns=["Avg. Cost Per Km", "Transport Requests"], errors='ignore')
+            # First match: City-level matching (both pickup and destination cities must match),
+            # with the requested names resolved through the alias index
+            pickup = self._resolve_city(snapshot, "pickup", pickup_city, pickup_province)
+            destination = self._resolve_city(snapshot, "destination", destination_city, dropoff_province)
+            city_level_carriers = snapshot.city_lanes(pickup.keys, destination.keys).copy()
+            # High score for a city match, lower when a requested name only resembled a table city
+            city_level_carriers['matching_score'] = self._city_lane_score(pickup_city, destination_city, pickup, destination)
+            recommended_carriers = pd.concat([recommended_carriers, city_level_carriers], ignore_index=True)
 
-            recommended_carriers['CScore'] = (
-                recommended_carriers['Transport Eff. Score'] +
-                recommended_carriers['Reliability Score'] +
-                recommended_carriers['Cost Eff. Score'] + 
-                recommended_carriers['matching_score']
-            )
+            # Nearby match: lanes between cities close to the requested ones, scored by distance
+            nearby_carriers = self._nearby_carriers(
+                snapshot, pickup, destination, pickup_city, destination_city, pickup_province, dropoff_province)
+            if nearby_carriers is not None:
+                nearby_carriers = nearby_carriers[~nearby_carriers['Carrier Name'].isin(recommended_carriers['Carrier Name'])]
+                recommended_carriers = pd.concat([recommended_carriers, nearby_carriers], ignore_index=True)
 
-            recommended_carriers = recommended_carriers.sort_values(by='CScore', ascending=False)
+            # Second match: State-level matching (pickup and dropoff provinces must match), or the
+            # country corridor when no lane joins the provinces; read from the snapshot's aggregates
+            fallback = snapshot.fallback(pickup_province, dropoff_province, pickup.keys, destination.keys)
+            if fallback is not None:
+                tier, aggregates, key = fallback
+                state_level_carriers = aggregates.get(key)
+                # Exclude carriers already matched in the city-level or partial city-level matches
+                state_level_carriers = state_level_carriers[
+                    ~state_level_carriers['Carrier Name'].isin(recommended_carriers['Carrier Name'])
+                ].copy()
+                state_level_carriers['matching_score'] = FALLBACK_SCORES[tier]  # Low score for state-level match
+                recommended_carriers = pd.concat([recommended_carriers, state_level_carriers], ignore_index=True)
+            # Drop duplicates to ensure no carrier is added more than once
             recommended_carriers = recommended_carriers.drop_duplicates(subset='Carrier Name', keep='first')
-            
-            try:
-                recommended_carriers['Lead Score'] = recommended_carriers.apply(
-                    lambda row: self._categorize_intensity_dynamic(row['CScore'], recommended_carriers['CScore']),
-                    axis=1)
-            except Exception as e:
-                self.logger.error(f"Lead Score Error: {e}")
 
+            recommended_carriers = self._score_carriers(recommended_carriers)
+            recommended_carriers.attrs["city_match"] = self._city_match(pickup, destination)
 
-            self.logger.info(recommended_carriers[['Carrier Name','CScore']])
-            return recommended_carriers[:14].sort_values(by='CScore', ascending=True)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Recommended carriers:\n%s", recommended_carriers[['Carrier Name','CScore']])
+            return recommended_carriers
 
         except Exception as e:
             self.logger.error(f"Recommendation Error: {e}")
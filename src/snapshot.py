@@ -0,0 +1,147 @@
+# src/snapshot.py
+"""
+Binary snapshot of the carrier lane table.
+
+The CSV export is converted at build time into a single uncompressed `.npz` bundle:
+string columns are dictionary encoded (int codes + one array of distinct values) and
+numeric columns keep their dtype, so loading is a handful of array reads instead of a
+CSV parse. Build it with:
+
+    python -m src.snapshot CarriersT.csv CarriersT.npz
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.gazetteer import default_gazetteer
+from src.recom import CarrierSnapshot
+from utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+FORMAT_VERSION = 1
+CSV_PATH = "CarriersT.csv"
+SNAPSHOT_PATH = "CarriersT.npz"
+
+
+def file_digest(path_or_bytes) -> str:
+    """Short sha256 of a file (or raw bytes), used as the dataset version."""
+    if isinstance(path_or_bytes, (bytes, bytearray)):
+        return hashlib.sha256(path_or_bytes).hexdigest()[:16]
+    sha = hashlib.sha256()
+    with open(path_or_bytes, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()[:16]
+
+
+def write_snapshot(frame: pd.DataFrame, target, source_digest: str = None, extra: dict = None):
+    """
+    Write `frame` as a snapshot bundle to a path or binary file object. `extra` adds
+    JSON-serializable keys to the manifest.
+    """
+    arrays = {}
+    columns = []
+    for i, name in enumerate(frame.columns):
+        values = frame[name]
+        if values.dtype == object:
+            codes, uniques = pd.factorize(values)  # missing values get code -1
+            dtype = np.int16 if len(uniques) < np.iinfo(np.int16).max else np.int32
+            arrays[f"c{i}_codes"] = codes.astype(dtype)
+            arrays[f"c{i}_dict"] = np.asarray(uniques, dtype=str)
+            columns.append({"name": name, "kind": "dict"})
+        else:
+            arrays[f"c{i}_values"] = values.to_numpy()
+            columns.append({"name": name, "kind": "values"})
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "rows": len(frame),
+        "columns": columns,
+        "source_digest": source_digest,
+        **(extra or {}),
+    }
+    arrays["manifest"] = np.frombuffer(json.dumps(manifest).encode("utf-8"), dtype=np.uint8)
+    np.savez(target, **arrays)
+    return manifest
+
+
+def read_snapshot(source):
+    """Read a snapshot bundle from a path or binary file object; returns (frame, manifest)."""
+    with np.load(source, allow_pickle=False) as bundle:
+        manifest = json.loads(bundle["manifest"].tobytes().decode("utf-8"))
+        if manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {manifest.get('format')}")
+
+        data = {}
+        for i, column in enumerate(manifest["columns"]):
+            if column["kind"] == "dict":
+                # trailing NaN so that code -1 decodes to a missing value
+                dictionary = np.append(bundle[f"c{i}_dict"].astype(object), np.nan)
+                data[column["name"]] = dictionary[bundle[f"c{i}_codes"]]
+            else:
+                data[column["name"]] = bundle[f"c{i}_values"]
+    return pd.DataFrame(data), manifest
+
+
+def build_snapshot(csv_path: str = CSV_PATH, snapshot_path: str = SNAPSHOT_PATH) -> dict:
+    """Convert the carrier CSV export into a snapshot bundle."""
+    frame = pd.read_csv(csv_path)
+    return write_snapshot(frame, snapshot_path, source_digest=file_digest(csv_path))
+
+
+def load_carrier_data(csv_path: str = CSV_PATH, snapshot_path: str = SNAPSHOT_PATH) -> CarrierSnapshot:
+    """
+    Load the carrier table from its snapshot bundle, falling back to the CSV when the
+    bundle is missing, unreadable or was built from a different CSV.
+    """
+    start = time.perf_counter()
+    csv_digest = file_digest(csv_path) if os.path.exists(csv_path) else None
+
+    if os.path.exists(snapshot_path):
+        try:
+            frame, manifest = read_snapshot(snapshot_path)
+            if csv_digest is None or manifest.get("source_digest") == csv_digest:
+                logger.info(f"Loaded carrier snapshot {snapshot_path} in {time.perf_counter() - start:.3f}s")
+                return CarrierSnapshot(frame, version=manifest.get("source_digest"), gazetteer=default_gazetteer())
+            logger.warning(f"Carrier snapshot {snapshot_path} is stale, falling back to {csv_path}")
+        except Exception as e:
+            logger.warning(f"Could not read carrier snapshot {snapshot_path}: {e}")
+
+    frame = pd.read_csv(csv_path)
+    logger.info(f"Loaded carrier CSV {csv_path} in {time.perf_counter() - start:.3f}s")
+    return CarrierSnapshot(frame, version=csv_digest, gazetteer=default_gazetteer())
+
+
+def payload_version(name: str, payload: bytes) -> str:
+    """Version the snapshot built from a downloaded export would have, without building it."""
+    if name.endswith(".npz"):
+        with np.load(io.BytesIO(payload), allow_pickle=False) as bundle:
+            manifest = json.loads(bundle["manifest"].tobytes().decode("utf-8"))
+        return manifest.get("source_digest") or file_digest(payload)
+    return file_digest(payload)
+
+
+def load_carrier_bytes(name: str, payload: bytes) -> CarrierSnapshot:
+    """Build a CarrierSnapshot from a downloaded CSV export or snapshot bundle."""
+    if name.endswith(".npz"):
+        frame, manifest = read_snapshot(io.BytesIO(payload))
+        return CarrierSnapshot(frame, version=manifest.get("source_digest") or file_digest(payload),
+                               gazetteer=default_gazetteer())
+    return CarrierSnapshot(pd.read_csv(io.BytesIO(payload)), version=file_digest(payload), gazetteer=default_gazetteer())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the binary carrier snapshot from the CSV export.")
+    parser.add_argument("csv_path", nargs="?", default=CSV_PATH)
+    parser.add_argument("snapshot_path", nargs="?", default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    manifest = build_snapshot(args.csv_path, args.snapshot_path)
+    print(f"Wrote {args.snapshot_path}: {manifest['rows']} rows, source {manifest['source_digest']}")
@@ -0,0 +1,131 @@
+# src/tax_rates.py
+import asyncio
+import time
+import unicodedata
+from typing import NamedTuple
+
+from utils.helpers import PROVINCE_CODES, extract_tax_province, get_logger
+
+logger = get_logger(__name__)
+
+
+class TaxRate(NamedTuple):
+    province: str
+    tax_name: str
+    tax_rate: float
+    tax_type: str
+
+
+class UnknownTaxProvince(LookupError):
+    """Raised when a province cannot be resolved to a row of the tax table."""
+
+
+def _strip_accents(text) -> str:
+    return "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+
+
+def _table_key(province) -> str:
+    return _strip_accents(province.strip()).casefold()
+
+
+def resolve_province(value) -> str:
+    """
+    Map a province name, code ("ON") or address ("Oakville, ON") to the full province
+    name used by the tax table; returns None when it cannot be resolved.
+    """
+    if not value or not str(value).strip():
+        return None
+    value = _strip_accents(str(value).strip())  # "Québec" resolves like "Quebec"
+    if value.upper() in PROVINCE_CODES:
+        return PROVINCE_CODES[value.upper()]
+    province = extract_tax_province(value)
+    if province != "Unknown Province":
+        return province
+    # a name already in table form, e.g. a territory spelled differently from the map
+    return value
+
+
+class TaxRateTable:
+    """
+    In-process copy of the (small, nearly static) Taxdb table.
+
+    `load` is an async callable returning TaxRate rows. Reloads are single-flight: the
+    lookups that need one share the load in flight. Once `ttl` seconds have passed the
+    next lookup starts a reload in the background and the current rows keep being
+    served meanwhile; lookups wait for the load only before the first one and after
+    invalidate(). If a reload fails the previous rows keep being served.
+    """
+
+    def __init__(self, load, ttl=3600):
+        self.load = load
+        self.ttl = ttl
+        self._rows = {}
+        self._loaded_at = None
+        self._generation = 0
+        self._inflight = None
+        self.reloads = 0
+        self.reload_failures = 0
+
+    def invalidate(self):
+        """Force a reload on the next lookup (e.g. after the tax table was edited)."""
+        self._generation += 1  # a load already running may predate the edit
+        self._inflight = None
+        self._loaded_at = None
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def reload(self) -> asyncio.Future:
+        """The reload in flight, or a new one."""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self.refresh())
+            # a background reload's error is already handled by refresh(); don't warn it was never retrieved
+            self._inflight.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return self._inflight
+
+    async def refresh(self):
+        generation = self._generation
+        try:
+            rows = await self.load()
+        except Exception as e:
+            self.reload_failures += 1
+            if not self._rows:
+                raise
+            logger.warning(f"Tax table reload failed, serving cached rates: {e}")
+            # retry in a minute rather than on every lookup
+            self._loaded_at = time.monotonic() - max(self.ttl - 60, 0)
+            return
+        if generation != self._generation:
+            return  # invalidated while loading: the reload that follows publishes the rows
+        table = {}
+        for row in rows:
+            table[_table_key(row.province)] = row
+            name = PROVINCE_CODES.get(row.province.strip().upper())
+            if name:  # rows stored under a code are reachable by name as well
+                table.setdefault(_table_key(name), row)
+        self._rows = table
+        self._loaded_at = time.monotonic()
+        self.reloads += 1
+        logger.info(f"Tax table loaded: {len(table)} provinces")
+
+    async def lookup(self, province) -> TaxRate:
+        """Return the tax row for `province`; raises UnknownTaxProvince if there is none."""
+        name = resolve_province(province)
+        if name is None:
+            raise UnknownTaxProvince(f"No tax province given ({province!r})")
+        if self._loaded_at is not None and self.is_stale():
+            self.reload()  # serve the current rows while it runs
+        while self._loaded_at is None:  # again if invalidated while it loaded
+            await asyncio.shield(self.reload())
+        row = self._rows.get(_table_key(name))
+        if row is None:
+            raise UnknownTaxProvince(f"No tax rate for province {province!r}")
+        return row
+
+    def stats(self) -> dict:
+        return {
+            "provinces": len(self._rows),
+            "reloads": self.reloads,
+            "reload_failures": self.reload_failures,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at is not None else None,
+        }
@@ -0,0 +1,150 @@
+# src/token_cache.py
+import asyncio
+import json
+import time
+import urllib.parse
+import urllib.request
+
+from utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+
+def zoho_token_fetcher(accounts_url, client_id, client_secret, refresh_token, timeout=10):
+    """
+    Build a fetch function for AccessTokenCache that exchanges the refresh token for an
+    access token; it returns (access_token, expires_in_seconds).
+    """
+    def fetch():
+        params = urllib.parse.urlencode({
+            "refresh_token": refresh_token,
+            "client_id": client_id,
+            "client_secret": client_secret,
+            "grant_type": "refresh_token",
+        }).encode("utf-8")
+        request = urllib.request.Request(f"{accounts_url.rstrip('/')}/oauth/v2/token", data=params, method="POST")
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            payload = json.loads(response.read().decode("utf-8"))
+        if "access_token" not in payload:
+            raise RuntimeError(f"Zoho token refresh failed: {payload.get('error', payload)}")
+        return payload["access_token"], int(payload.get("expires_in", 3600))
+    return fetch
+
+
+class AccessTokenCache:
+    """
+    Process-wide access token cache.
+
+    Tokens are served from memory. The blocking OAuth call runs on a worker thread, so a
+    refresh never stalls the event loop. Concurrent refreshes collapse into a single
+    in-flight future that the other callers await, and a refresh is scheduled on the
+    loop `refresh_margin` seconds before the token expires. close() cancels it.
+    """
+
+    def __init__(self, fetch, refresh_margin=300, wait_timeout=30):
+        self.fetch = fetch
+        self.refresh_margin = refresh_margin
+        self.wait_timeout = wait_timeout
+        self._token = None
+        self._expires_at = 0.0
+        self._inflight = None
+        self._last_error = None
+        self._timer = None
+        self._refresh_task = None  # the loop only keeps a weak reference to tasks
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.refresh_seconds_total = 0.0
+        self.refresh_seconds_max = 0.0
+
+    def _valid(self):
+        return self._token is not None and time.monotonic() < self._expires_at
+
+    async def get_access_token(self) -> str:
+        if self._valid():
+            self.hits += 1
+            return self._token
+        self.misses += 1
+        return await self.refresh()
+
+    async def refresh(self) -> str:
+        """Refresh now, or wait for the refresh already in flight; returns the current token."""
+        inflight = self._inflight
+        if inflight is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(inflight), self.wait_timeout)
+            except Exception:
+                pass  # the leader has logged it; serve the token if it is still good
+            if self._valid():
+                return self._token
+            raise RuntimeError(f"Access token unavailable: {self._last_error}")
+
+        inflight = self._inflight = asyncio.get_running_loop().create_future()
+        start = time.perf_counter()
+        try:
+            token, expires_in = await asyncio.to_thread(self.fetch)
+            self._token, self._expires_at = token, time.monotonic() + expires_in
+            self._last_error = None
+            self.refreshes += 1
+            self._schedule_refresh(max(expires_in - self.refresh_margin, 1))
+            return token
+        except Exception as e:
+            self._last_error = e
+            self.refresh_failures += 1
+            logger.error(f"Access token refresh failed: {e}")
+            if self._valid():
+                # the current token is still good: keep serving it and try again shortly
+                self._schedule_refresh(self._retry_delay())
+                return self._token
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.refresh_seconds_total += elapsed
+            self.refresh_seconds_max = max(self.refresh_seconds_max, elapsed)
+            self._inflight = None
+            inflight.set_result(None)
+
+    def _schedule_refresh(self, delay):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(delay, self._start_background_refresh)
+
+    def _retry_delay(self):
+        return max(min(30, self.refresh_margin / 2), 1)
+
+    def _start_background_refresh(self):
+        self._timer = None
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.get_running_loop().create_task(self.refresh())
+        self._refresh_task.add_done_callback(self._background_refresh_done)
+
+    def _background_refresh_done(self, task):
+        if self._refresh_task is task:
+            self._refresh_task = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Background token refresh failed, the next request will refresh on demand: {task.exception()}")
+
+    def close(self):
+        """Cancel the scheduled background refresh, and the one running if any."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        attempts = self.refreshes + self.refresh_failures
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "refresh_avg_ms": round(1000 * self.refresh_seconds_total / attempts, 2) if attempts else None,
+            "refresh_max_ms": round(1000 * self.refresh_seconds_max, 2),
+            "expires_in": round(self._expires_at - time.monotonic(), 1) if self._token else None,
+        }
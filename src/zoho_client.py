@@ -0,0 +1,70 @@
+# src/zoho_client.py
+import asyncio
+import json
+
+import aiohttp
+
+from utils.helpers import get_header, get_logger
+from utils.tracing import span
+
+logger = get_logger(__name__)
+
+
+class ZohoResponse:
+    """Result of a Zoho API call, with the `status_code` / `json()` surface of requests.Response."""
+
+    def __init__(self, status_code: int, text: str):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text) if self.text else {}
+
+
+class AsyncZohoClient:
+    """
+    Non-blocking Zoho CRM client. One aiohttp session (and so one keep-alive connection
+    pool) is reused for every call made from the same event loop.
+    """
+
+    def __init__(self, base_url="https://www.zohoapis.ca/crm/v2", timeout=15, connect_timeout=5, pool_size=20):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.pool_size = pool_size
+        self._session = None
+        self._loop = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            # sessions are bound to the loop they were created on
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=self.timeout,
+            )
+            self._loop = loop
+        return self._session
+
+    async def request(self, method: str, path: str, token: str, data: dict = None) -> ZohoResponse:
+        with span(f"zoho.{method} {path.split('/')[0]}") as stage:
+            async with self._get_session().request(
+                method, f"{self.base_url}/{path}", headers=get_header(token), json=data
+            ) as response:
+                stage["status_code"] = response.status
+                return ZohoResponse(response.status, await response.text())
+
+    async def create_record(self, moduleName: str, data: dict, token: str) -> ZohoResponse:
+        return await self.request("POST", moduleName, token, data)
+
+    async def update_record(self, moduleName: str, id: str, data: dict, token: str) -> ZohoResponse:
+        return await self.request("PUT", f"{moduleName}/{id}", token, data)
+
+    async def update_records(self, moduleName: str, records: list, token: str, batch_size: int = 100) -> list:
+        """Update many records (each carrying its "id") with Zoho's bulk PUT, `batch_size` per call."""
+        chunks = [records[i:i + batch_size] for i in range(0, len(records), batch_size)]
+        return await asyncio.gather(*(self.request("PUT", moduleName, token, {"data": chunk}) for chunk in chunks))
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,46 @@
+import logging
+import pytest
+from bench.reference import compare_recommendations, normalize_locations, reference_recommend
+from bench.synthetic import SCENARIOS, make_carriers, make_lanes
+from src.recom import CarrierRecommendationModel, CarrierSnapshot
+from utils.cache import TTLCache
+from utils.helpers import normalize_text
+
+
+@pytest.fixture(scope="module")
+def table():
+    frame = make_carriers(3000, seed=3)
+    return frame, CarrierSnapshot(frame), normalize_locations(frame)
+
+
+def test_scenarios_produce_the_lanes_they_claim(table):
+    frame, snapshot, _ = table
+    for scenario in SCENARIOS:
+        for lane in make_lanes(frame, scenario, 20, seed=1):
+            city, province = (tuple(normalize_text(v) for v in pair) for pair in (lane[:2], lane[2:]))
+            assert (city in snapshot.city_index) == (scenario == "city_hit")
+            assert (province in snapshot.province_index) == (scenario != "miss")
+
+
+def test_model_matches_the_reference(table):
+    frame, snapshot, reference_frame = table
+    model = CarrierRecommendationModel(logging.getLogger("test"))
+    cache, model.cache = model.cache, TTLCache(maxsize=0)
+    try:
+        for scenario in SCENARIOS:
+            for lane in make_lanes(frame, scenario, 10, seed=2):
+                expected = reference_recommend(model, reference_frame, *lane)
+                assert compare_recommendations(expected, model.recommend_carriers(snapshot, *lane)) == []
+    finally:
+        model.cache = cache
+
+
+def test_compare_reports_changed_scores(table):
+    frame, _, reference_frame = table
+    model = CarrierRecommendationModel(logging.getLogger("test"))
+    lane = make_lanes(frame, "city_hit", 1, seed=4)[0]
+    expected = reference_recommend(model, reference_frame, *lane)
+    changed = expected.copy()
+    changed.iloc[-1, changed.columns.get_loc("CScore")] += 1
+
+    assert compare_recommendations(expected, changed)
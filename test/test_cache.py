@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+from utils.cache import ReadThroughCache, TTLCache
+
+
+def test_ttl_cache_expires_and_evicts():
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.get("a") is None and cache.get("c") == 3
+
+    cache.set("d", 4, ttl=0)
+    assert cache.get("d") is None
+
+
+@pytest.mark.asyncio
+async def test_negative_results_use_their_own_ttl():
+    cache = ReadThroughCache(ttl=60, negative_ttl=0.05)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return None
+
+    await cache.get_or_load("k", load)
+    await cache.get_or_load("k", load)
+    await asyncio.sleep(0.06)
+    await cache.get_or_load("k", load)
+    assert len(loads) == 2
+    assert cache.stats()["negative_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_load_running_during_invalidation_is_not_cached():
+    cache = ReadThroughCache(ttl=60)
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_old_read():
+        started.set()
+        await release.wait()
+        return "old price"
+
+    pending = asyncio.ensure_future(cache.get_or_load("route", slow_old_read))
+    await started.wait()
+    cache.invalidate("route")  # the write commits while the read is in flight
+    release.set()
+
+    assert await pending == "old price"
+
+    async def fresh():
+        return "new price"
+    assert await cache.get_or_load("route", fresh) == "new price"
+    assert cache.stats()["discarded_loads"] == 1
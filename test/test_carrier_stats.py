@@ -0,0 +1,121 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.carrier_source import CarrierDataReloader, LocalDirectorySource
+from src.carrier_stats import STATE_NAME, CarrierStats, LocalStatsStore, parse_location, seed, update
+from src.dbConnector import OrdersDB
+
+EXPORT = pd.DataFrame([
+    ["Fast Haul", "Toronto", "Ontario", "Canada", "Montréal", "Québec", "Canada", 2, 1.5, 400.0, 4.0, 3.0, 1.0, 4.0],
+    ["Fast Haul", "Ottawa", "Ontario", "Canada", "Toronto", "Ontario", "Canada", 1, np.nan, 300.0, np.nan, np.nan, np.nan, np.nan],
+], columns=["Carrier Name", "Pickup City", "Pickup State/Province", "Pickup Country", "Destination City",
+            "Destination State/Province", "Destination Country", "Transport Requests", "Avg. Cost Per Km",
+            "Estimated Amount", "Avg. Delivery Day", "On-time", "Late Delivery", "CountRequest"])
+
+
+def order(order_id, carrier, pickup, dropoff, cost, picked_up, delivered, estimate="3 - 5 Business Days"):
+    return {
+        "OrderID": order_id, "TransportRequestID": f"TR{order_id}", "CarrierName": carrier,
+        "PickupLocation": pickup, "DropoffLocation": dropoff, "CarrierCost": cost,
+        "EstimatedDropoffTime": estimate, "ActualPickupTime": picked_up, "ActualDeliveryTime": delivered,
+    }
+
+
+def lane(frame, carrier, pickup_city):
+    return frame[(frame["Carrier Name"] == carrier) & (frame["Pickup City"] == pickup_city)].iloc[0]
+
+
+@pytest.mark.parametrize("address, expected", [
+    ("12 King St W, Toronto, ON M5V 2T6, Canada", ("Toronto", "Ontario", "Canada")),
+    ("Montréal, Québec", ("Montréal", "Quebec", "Canada")),
+    ("5 Main St, Corona, CA 92879, USA", ("Corona", "California", "United States")),
+    ("Toronto", (None, None, None)),
+    (None, (None, None, None)),
+])
+def test_parse_location(address, expected):
+    assert parse_location(address) == expected
+
+
+def test_seed_reproduces_the_export():
+    frame = CarrierStats.from_carrier_frame(EXPORT).carrier_frame()
+    pd.testing.assert_frame_equal(frame, EXPORT, check_dtype=False)
+
+
+def test_orders_update_the_lane_aggregates_once():
+    stats = CarrierStats.from_carrier_frame(EXPORT)
+    orders = pd.DataFrame([
+        # Mon -> Fri: 4 business days, on time; accents and province codes match the export's lane
+        order(1, "Fast Haul", "1 Bay St, Toronto, ON", "9 Rue X, Montreal, QC", "$600.00",
+              datetime.datetime(2025, 3, 3, 8), datetime.datetime(2025, 3, 7, 17)),
+        order(2, "New Co", "Halifax, NS", "Moncton, NB", "900", datetime.datetime(2025, 3, 3),
+              datetime.datetime(2025, 3, 10), estimate="2 Days"),
+        order(3, "Nobody", "somewhere", "Moncton, NB", "100", None, datetime.datetime(2025, 3, 4)),
+    ])
+    assert stats.apply(orders) == 2
+    assert stats.apply(orders) == 0  # re-read inside the lookback window
+    assert stats.watermark == datetime.datetime(2025, 3, 10)
+
+    frame = stats.carrier_frame()
+    toronto = lane(frame, "Fast Haul", "Toronto")
+    assert toronto["Transport Requests"] == 3
+    assert toronto["Estimated Amount"] == pytest.approx((400 * 2 + 600) / 3)
+    assert toronto["Avg. Delivery Day"] == pytest.approx((4 * 2 + 4) / 3)
+    # the export counts each rated delivery twice, and so does the published table
+    assert (toronto["On-time"], toronto["Late Delivery"], toronto["CountRequest"]) == (5, 1, 6)
+    new = lane(frame, "New Co", "Halifax")
+    assert (new["On-time"], new["Late Delivery"], new["CountRequest"], new["Avg. Delivery Day"]) == (0, 2, 2, 7)
+    assert len(frame) == 3
+
+
+
+def test_orders_count_like_rows_of_the_export():
+    stats = CarrierStats.from_carrier_frame(EXPORT)
+    stats.apply(pd.DataFrame([
+        order(1, "Fast Haul", "Toronto, ON", "Montreal, QC", "500", datetime.datetime(2025, 3, 3), datetime.datetime(2025, 3, 5)),
+        order(2, "Fast Haul", "Toronto, ON", "Montreal, QC", "700", datetime.datetime(2025, 3, 3), datetime.datetime(2025, 3, 13)),
+    ]))
+    # the same two orders, one on time and one late, as the export would have counted them
+    export = EXPORT.copy()
+    export.loc[0, ["Transport Requests", "Estimated Amount", "Avg. Delivery Day", "On-time", "Late Delivery", "CountRequest"]] = [
+        4, (400 * 2 + 500 + 700) / 4, (4 * 2 + 2 + 10) / 4, 3 + 2, 1 + 2, 4 + 4]
+
+    updated, exported = lane(stats.carrier_frame(), "Fast Haul", "Toronto"), lane(export, "Fast Haul", "Toronto")
+    columns = ["Transport Requests", "Estimated Amount", "Avg. Delivery Day", "On-time", "Late Delivery", "CountRequest"]
+    assert updated[columns].astype(float).tolist() == pytest.approx(exported[columns].astype(float).tolist())
+    assert updated["On-time"] / updated["CountRequest"] == pytest.approx(5 / 8)
+
+
+def test_update_reads_past_the_watermark_and_publishes_for_the_reloader(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'orders.db'}")
+    OrdersDB.__table__.create(engine)
+    store = LocalStatsStore(str(tmp_path / "carrier-data"))
+    seed(store, EXPORT, since=datetime.datetime(2025, 3, 1))
+
+    published = []
+    reloader = CarrierDataReloader(LocalDirectorySource(store.directory), on_update=published.append)
+    assert reloader.poll_once()
+
+    with Session(engine) as session:
+        session.add_all([OrdersDB(**order(1, "Fast Haul", "Ottawa, ON", "Toronto, ON", "350",
+                                          datetime.datetime(2025, 2, 1), datetime.datetime(2025, 2, 3))),
+                         # inside the lookback window, but already in the export
+                         OrdersDB(**order(3, "Fast Haul", "Ottawa, ON", "Toronto, ON", "800",
+                                          datetime.datetime(2025, 2, 26), datetime.datetime(2025, 2, 28))),
+                         OrdersDB(**order(2, "Fast Haul", "Ottawa, ON", "Toronto, ON", "500",
+                                          datetime.datetime(2025, 3, 3), datetime.datetime(2025, 3, 4)))])
+        session.commit()
+
+        summary = update(store, session, batch_size=1)
+        assert (summary["orders_read"], summary["orders_counted"]) == (2, 1)  # order 1 predates the seed
+        assert update(store, session)["orders_counted"] == 0
+
+    assert CarrierStats.from_bytes(store.read(STATE_NAME)).watermark == datetime.datetime(2025, 3, 4)
+    assert reloader.poll_once()
+    ottawa = lane(published[-1].data, "Fast Haul", "ottawa")
+    assert ottawa["Transport Requests"] == 2
+    assert ottawa["Estimated Amount"] == pytest.approx(400)
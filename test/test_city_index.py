@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from src.city_index import CityAliasIndex, alias_key, edit_distance, strip_province_suffix
+
+
+@pytest.fixture(scope="module")
+def index():
+    cities = ["montreal", "trois-rivières", "trois-rivieres", "st. john's", "saint john", "mississauga",
+              "north vancouver", "city 00001", "city 00002", "richmond", "richmond"]
+    provinces = ["quebec", "quebec", "quebec", "newfoundland and labrador", "new brunswick", "ontario",
+                 "british columbia", "ontario", "ontario", "british columbia", "quebec"]
+    # a gazetteer that knows none of the requested names, so typos are fuzzy-matched
+    return CityAliasIndex.from_columns((pd.Series(cities), pd.Series(provinces)), is_place=lambda city, province: False)
+
+
+def test_alias_key_folds_accents_punctuation_and_abbreviations():
+    assert alias_key("St. Jérôme") == alias_key("saint-jerome") == "saint jerome"
+    assert alias_key("N Vancouver") == "north vancouver"
+    assert alias_key("St. John's") == "saint john s"
+    assert strip_province_suffix("Montreal, QC") == ("montreal", "quebec")
+    assert strip_province_suffix("Halifax Nova Scotia") == ("halifax", "nova scotia")
+    assert edit_distance("calgary", "calgray", 2) == 2
+    assert edit_distance("calgary", "toronto", 2) == 3
+
+
+@pytest.mark.parametrize("city, province, rule, keys", [
+    ("Montréal", None, "exact", ("montreal",)),
+    ("Trois-Rivieres", None, "alias", ("trois-rivieres", "trois-rivières")),
+    ("Saint John's", None, "alias", ("st. john's",)),
+    ("N. Vancouver", None, "alias", ("north vancouver",)),
+    ("Montreal QC", None, "province_suffix", ("montreal",)),
+    ("Missisauga", "ON", "fuzzy", ("mississauga",)),
+    ("Mississaugua", None, "fuzzy", ("mississauga",)),
+    ("City 00003", None, "miss", ()),           # numbers must match
+    ("Mississauga", "Quebec", "exact", ("mississauga",)),  # exact matches ignore the province
+    ("Missisauga", "Quebec", "miss", ()),        # fuzzy ones don't
+    ("", None, "miss", ()),
+])
+def test_resolve(index, city, province, rule, keys):
+    match = index.resolve(city, province)
+    assert (match.rule, match.keys) == (rule, keys)
+
+
+def test_resolve_counts_rules(index):
+    before = index.stats()["resolved"].get("fuzzy", 0)
+    index.resolve("Missisauga", "ON")
+    assert index.stats()["resolved"]["fuzzy"] == before + 1
+
+
+def test_known_places_are_not_fuzzy_matched():
+    places = {("hilton", "ontario"), ("hilton", None)}
+    index = CityAliasIndex.from_columns(
+        (pd.Series(["milton", "mississauga"]), pd.Series(["ontario", "ontario"])),
+        is_place=lambda city, province: (alias_key(city), province) in places,
+    )
+    assert index.resolve("Hilton", "ON") == ((), "place", "hilton")
+    assert index.resolve("Hilton, Ontario").rule == "place"
+    assert index.resolve("Miltn", "ON").keys == ("milton",)  # a typo is still matched
+
+
+def test_nothing_is_fuzzy_matched_without_a_gazetteer():
+    index = CityAliasIndex.from_columns((pd.Series(["milton", "mississauga"]), pd.Series(["ontario", "ontario"])))
+    assert index.resolve("Hilton", "ON") == ((), "miss", "hilton")
+    assert index.resolve("Hilton, ON").rule == "miss"
+    assert index.resolve("Milton, ON").rule == "province_suffix"  # the exact rules still apply
@@ -0,0 +1,457 @@
+import asyncio
+import time
+import pytest
+from sqlalchemy import create_engine
+from src.dbConnector import AsyncSessionRunner, DatabaseConnection, TaxDataBase, TransportQuotation
+from src.funcmain import get_quote_cache
+from utils.helpers import route_key
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    """Point DatabaseConnection at a throwaway SQLite file holding the service schema."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'quotes.db'}")
+    TransportQuotation.metadata.create_all(engine)
+    previous, DatabaseConnection.engine = DatabaseConnection.engine, engine
+    get_quote_cache().clear()
+    yield engine
+    DatabaseConnection.engine = previous
+    engine.dispose()
+
+
+def connect():
+    return DatabaseConnection(connection_string=None)
+
+
+@pytest.mark.asyncio
+async def test_runner_keeps_event_loop_free(sqlite_db):
+    runner = AsyncSessionRunner(max_workers=2, timeout=5)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    def slow_insert(session):
+        time.sleep(0.1)  # stands in for a slow round trip
+        session.add(TaxDataBase(tax_id="1", province="Ontario", tax_name="ON HST", tax_rate=13.0, tax_type="HST"))
+        session.commit()
+        return session.query(TaxDataBase).count()
+
+    count, _ = await asyncio.gather(runner.run(connect, slow_insert), ticker())
+    assert count == 1
+    assert ticks[-1] - ticks[0] < 0.1
+    runner.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_runner_times_out(sqlite_db):
+    runner = AsyncSessionRunner(max_workers=1, timeout=0.05)
+    with pytest.raises(asyncio.TimeoutError):
+        await runner.run(connect, lambda session: time.sleep(0.3))
+    runner.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_runner_drops_calls_that_time_out_while_queued(sqlite_db):
+    runner = AsyncSessionRunner(max_workers=1, timeout=5)
+    ran = []
+    busy = asyncio.ensure_future(runner.run(connect, lambda session: time.sleep(0.2)))
+    await asyncio.sleep(0.02)
+    with pytest.raises(asyncio.TimeoutError):
+        await runner.run(connect, lambda session: ran.append(1), timeout=0.05)  # still queued behind `busy`
+    await busy
+    await asyncio.sleep(0.05)
+    assert ran == []
+    assert runner.stats() == {"max_workers": 1, "running": 0, "queued": 0}
+    runner.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_get_quote_against_sqlite(sqlite_db):
+    from src.funcmain import QuoteHandler
+
+    with connect() as session:
+        session.add(TransportQuotation(
+            CarrierName="Fast Haul", PickupCity="Oakville", DestinationCity="Ottawa", Estimated_Amount="200",
+            PickupKey="oakville", DestinationKey="ottawa",
+            QuoteStatus="ACTIVE", TaxRate=13.0, TaxName="ON HST", Additional=0, Surcharge=0, Rating=0,
+        ))
+        session.commit()
+
+    found = await QuoteHandler().get_quote(" OAKVILLE", "Ottawa ")
+    missing = await QuoteHandler().get_quote("Oakville", "Calgary")
+
+    assert found["code"] == 200 and found["data"]["CarrierName"] == "Fast Haul"
+    assert missing["code"] == 404
+
+
+@pytest.mark.asyncio
+async def test_store_quotes_batch_against_sqlite(sqlite_db):
+    from unittest.mock import AsyncMock, MagicMock, patch
+    from src.funcmain import QuoteHandler, get_tax_table
+
+    with connect() as session:
+        session.add(TaxDataBase(tax_id="1", province="Ontario", tax_name="ON HST", tax_rate=13.0, tax_type="HST"))
+        for carrier, amount in (("Fast Haul", "200"), ("Slow Haul", "150")):
+            session.add(TransportQuotation(
+                CarrierName=carrier, PickupCity="Oakville", DestinationCity="Ottawa", Estimated_Amount=amount,
+                PickupKey="oakville", DestinationKey="ottawa", QuoteStatus="ACTIVE", TaxRate=13.0, TaxName="ON HST", Additional=0, Surcharge=0, Rating=0,
+            ))
+        session.commit()
+    get_tax_table().invalidate()
+
+    def quote(carrier, amount, **extra):
+        return {"CarrierName": carrier, "Pickup_City": "Oakville", "Dropoff_City": "Ottawa",
+                "Estimated_Amount": amount, "Tax_Province": "ON", **extra}
+
+    zoho = MagicMock(update_records=AsyncMock())
+    with patch("src.funcmain.get_zoho_api", return_value=zoho), \
+            patch("src.funcmain.get_token_instance", return_value=MagicMock(get_access_token=AsyncMock())), \
+            patch("src.funcmain.notify_quote_channel") as notify:
+        response = await QuoteHandler().store_sql_quotes_batch({"quotes": [
+            quote("Fast Haul", "200"),                                  # already active
+            quote("Slow Haul", "170"),                                  # superseded by the next one
+            quote("Slow Haul", "160", QuotationRequestID="Q1"),         # replaces the active 150 quote
+            quote("New Haul", "300", QuotationRequestID="Q2"),
+            quote("Bad Haul", "300", Tax_Province="Narnia"),
+            {"CarrierName": "No Route"},
+        ]})
+
+    assert [r["status"] for r in response["results"]] == ["exists", "superseded", "stored", "stored", "failed", "failed"]
+    assert response["status"] == "partial"
+    zoho.update_records.assert_awaited_once()
+    assert [r["id"] for r in zoho.update_records.await_args.kwargs["records"]] == ["Q1", "Q2"]
+    notify.assert_called_once()
+
+    with connect() as session:
+        active = session.query(TransportQuotation.CarrierName, TransportQuotation.Estimated_Amount).filter(
+            TransportQuotation.QuoteStatus == "ACTIVE").order_by(TransportQuotation.CarrierName).all()
+    assert active == [("Fast Haul", "200"), ("New Haul", "300"), ("Slow Haul", "160")]
+
+
+@pytest.mark.asyncio
+async def test_store_quotes_batch_fails_with_500_when_the_tax_table_cannot_load(sqlite_db):
+    from unittest.mock import patch
+    from src.funcmain import QuoteHandler
+    from src.tax_rates import TaxRateTable
+
+    async def load():
+        raise TimeoutError("SQL call timed out after 10.0s")
+
+    quotes = [{"CarrierName": "Fast Haul", "Pickup_City": "Oakville", "Dropoff_City": "Ottawa", "Tax_Province": "ON"},
+              {"CarrierName": "No Route"},
+              {"CarrierName": "Slow Haul", "Pickup_City": "Oakville", "Dropoff_City": "Ottawa", "Tax_Province": "ON"}]
+    with patch("src.funcmain.get_tax_table", return_value=TaxRateTable(load)), \
+            patch("src.funcmain.notify_quote_channel") as notify:
+        response = await QuoteHandler().store_sql_quotes_batch({"quotes": quotes})
+
+    assert (response["status"], response["code"]) == ("failed", 500)
+    assert [(r["status"], r["code"]) for r in response["results"]] == [("failed", 500), ("failed", 500), ("failed", 500)]
+    notify.assert_called_once()
+    with connect() as session:
+        assert session.query(TransportQuotation).count() == 0
+
+
+@pytest.mark.asyncio
+async def test_lead_quote_lookup_matches_route_keys_not_substrings(sqlite_db):
+    from src.funcmain import LeadHandler
+
+    with connect() as session:
+        for carrier, pickup in (("Accent Haul", "Montréal"), ("Substring Haul", "North Montreal")):
+            session.add(TransportQuotation(
+                CarrierName=carrier, PickupCity=pickup, DestinationCity="Québec", Estimated_Amount="500",
+                PickupKey=route_key(pickup), DestinationKey=route_key("Québec"),
+                QuoteStatus="ACTIVE", TaxRate=14.975, TaxName="QC", Additional=0, Surcharge=0, Rating=0,
+            ))
+        session.commit()
+
+        quotes = LeadHandler()._find_active_quotes(session, "MONTREAL", "quebec")
+
+    assert [q.CarrierName for q in quotes] == ["Accent Haul"]
+
+
+def test_migration_backfills_keys_on_a_legacy_table(sqlite_db):
+    from sqlalchemy import inspect, text
+    from scripts.migrate_route_keys import migrate
+
+    with sqlite_db.begin() as conn:  # the table as it was before route keys
+        conn.execute(text("DROP INDEX ix_quote_status_route"))
+        conn.execute(text("ALTER TABLE TransportQuotation DROP COLUMN PickupKey"))
+        conn.execute(text("ALTER TABLE TransportQuotation DROP COLUMN DestinationKey"))
+        conn.execute(text(
+            "INSERT INTO TransportQuotation (CarrierName, PickupCity, DestinationCity, Estimated_Amount, CreateDate, "
+            "QuoteStatus, Additional, Surcharge) VALUES ('Fast Haul', ' Saint-Jérôme', 'OTTAWA', '200', CURRENT_TIMESTAMP, "
+            "'ACTIVE', 0, 0)"
+        ))
+
+    assert migrate(sqlite_db, batch_size=1) == 1
+    assert migrate(sqlite_db) == 0
+
+    with connect() as session:
+        row = session.query(TransportQuotation).one()
+    assert (row.PickupKey, row.DestinationKey) == ("saint jerome", "ottawa")
+    assert "ix_quote_status_route" in {index["name"] for index in inspect(sqlite_db).get_indexes("TransportQuotation")}
+
+
+@pytest.mark.asyncio
+async def test_get_quote_is_cached_until_the_route_changes(sqlite_db):
+    from src.funcmain import QuoteHandler
+
+    handler = QuoteHandler()
+    fields = ("hits", "misses", "negative_hits", "invalidations")
+    before = get_quote_cache().stats()
+    with connect() as session:
+        session.add(TransportQuotation(
+            CarrierName="Fast Haul", PickupCity="Oakville", DestinationCity="Ottawa", Estimated_Amount="200",
+            PickupKey="oakville", DestinationKey="ottawa",
+            QuoteStatus="ACTIVE", TaxRate=13.0, TaxName="ON HST", Additional=0, Surcharge=0, Rating=0,
+        ))
+        session.commit()
+
+    assert (await handler.get_quote("Oakville", "Ottawa"))["data"]["TotalAmount"] is None
+    with connect() as session:  # a change made behind the service's back is only seen after the TTL
+        session.query(TransportQuotation).update({"TotalAmount": 1.0})
+        session.commit()
+    assert (await handler.get_quote("oakville", "OTTAWA"))["data"]["TotalAmount"] is None
+
+    await handler.update_sql_quote({"CarrierName": "Fast Haul", "PickupCity": "Oakville", "DestinationCity": "Ottawa",
+                                    "Customer_Price": 100})
+    assert (await handler.get_quote("Oakville", "Ottawa"))["data"]["TotalAmount"] == 113.0
+
+    await handler.get_quote("Oakville", "Calgary")
+    assert (await handler.get_quote("Oakville", "Calgary"))["code"] == 404
+
+    after = get_quote_cache().stats()
+    assert tuple(after[f] - before[f] for f in fields) == (2, 3, 1, 1)
+
+
+def test_pool_records_waits_timeouts_and_recycles(tmp_path):
+    from sqlalchemy import exc, text
+    from src.dbConnector import create_pooled_engine
+
+    engine = create_pooled_engine(f"sqlite:///{tmp_path / 'pool.db'}", pool_size=1, max_overflow=0,
+                                  pool_timeout=0.1, pool_recycle=3600)
+    metrics = engine.pool.metrics
+    with engine.connect() as held:
+        held.execute(text("select 1"))
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+    assert metrics.stats()["timeouts"] == 1
+
+    engine.pool._recycle = 0  # every connection is now too old and gets replaced on checkout
+    time.sleep(0.01)
+    with engine.connect() as conn:
+        conn.execute(text("select 1"))
+
+    stats = metrics.stats()
+    assert (stats["checkouts"], stats["connects"], stats["recycles"], stats["peak_checked_out"]) == (2, 2, 1, 1)
+    assert stats["wait_max_ms"] >= 100
+    engine.dispose()
+
+
+def test_sessions_share_one_factory_per_engine(sqlite_db):
+    first, second = connect(), connect()
+    with first as a, second as b:
+        assert a is not b
+    assert DatabaseConnection.session_factory() is DatabaseConnection.session_factory()
+    assert DatabaseConnection.session_factory().kw["bind"] is sqlite_db
+    assert DatabaseConnection.pool_stats()["checked_out"] == 0
+
+
+@pytest.mark.asyncio
+async def test_lead_requests_run_once_per_deal(sqlite_db):
+    from src.idempotency import LeadIdempotency
+
+    runner = AsyncSessionRunner(max_workers=4, timeout=5)
+    calls = []
+
+    async def work(writes):
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return {"status": "success", "attach_response": {"n": len(calls)}}
+
+    # two workers: the second sees the first one's claim in the table and waits for its response
+    first = LeadIdempotency(runner, connect, poll_interval=0.02)
+    second = LeadIdempotency(runner, connect, poll_interval=0.02)
+
+    async def later(call):
+        await asyncio.sleep(0.03)  # once the first worker holds the claim
+        return await call
+
+    responses = await asyncio.gather(
+        first.run("D1", "D1", work), first.run("D1", "D1", work), later(second.run("D1", "D1", work)))
+    assert responses == [{"status": "success", "attach_response": {"n": 1}}] * 3
+    assert (first.outcomes["joined"], second.outcomes["waited"]) == (1, 1)
+
+    assert await second.run("D1", "D1", work) == responses[0]  # a later retry replays the stored response
+    assert await second.run("D1|retry-2", "D1", work) == {"status": "success", "attach_response": {"n": 2}}
+    assert len(calls) == 2
+    runner.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_failed_and_expired_lead_requests_run_again(sqlite_db):
+    import datetime
+    from src.dbConnector import LeadRequest
+    from src.idempotency import LeadIdempotency, purge_expired
+
+    runner = AsyncSessionRunner(max_workers=2, timeout=5)
+    idempotency = LeadIdempotency(runner, connect, wait=0.1, poll_interval=0.02)
+    responses = iter([{"status": "failed", "code": 500}, {"status": "success"}])
+
+    async def work(writes):
+        return next(responses)
+
+    assert (await idempotency.run("D2", "D2", work))["status"] == "failed"
+    assert (await idempotency.run("D2", "D2", work))["status"] == "success"
+
+    with connect() as session:  # a claim left behind by a worker that died, and an old response
+        now = datetime.datetime.utcnow()
+        session.add(LeadRequest(IdempotencyKey="D3", Status="processing", CreatedAt=now, ExpiresAt=now + datetime.timedelta(hours=1)))
+        session.add(LeadRequest(IdempotencyKey="D4", Status="processing", CreatedAt=now, ExpiresAt=now - datetime.timedelta(seconds=1)))
+        session.commit()
+
+    assert (await idempotency.run("D3", "D3", work))["code"] == 409  # still leased: gave up waiting
+    responses = iter([{"status": "success", "deal": "D4"}])
+    assert await idempotency.run("D4", "D4", work) == {"status": "success", "deal": "D4"}
+
+    with connect() as session:
+        session.query(LeadRequest).update({"ExpiresAt": now - datetime.timedelta(seconds=1)})
+        session.commit()
+        assert purge_expired(session) == 3
+    runner.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_lead_request_failing_after_a_crm_write_is_not_run_again(sqlite_db):
+    from unittest.mock import AsyncMock, MagicMock, patch
+    import pandas as pd
+    from src.dbConnector import LeadRequest
+    from src.funcmain import LeadHandler
+    from src.idempotency import LeadIdempotency
+
+    with connect() as session:
+        session.add(TransportQuotation(
+            CarrierName="Fast Haul", PickupCity="Toronto", DestinationCity="Ottawa", Estimated_Amount="500",
+            PickupKey=route_key("Toronto"), DestinationKey=route_key("Ottawa"), QuoteStatus="ACTIVE", CarrierID="V1",
+            TaxRate=13.0, TaxName="ON", Additional=0, Surcharge=0, Rating=0,
+        ))
+        session.commit()
+
+    created = []
+    outages = {"Transport_Offers": 1}
+
+    async def create_record(moduleName, data, token):
+        if outages.get(moduleName):  # the request reaches Zoho but the answer is an error
+            outages[moduleName] -= 1
+            return MagicMock(status_code=500, json=lambda: {"code": "INTERNAL_ERROR"})
+        created.append(moduleName)
+        return MagicMock(status_code=201, json=lambda: {"data": []})
+
+    zoho = MagicMock(create_record=create_record, update_record=AsyncMock(return_value=MagicMock(status_code=200)))
+    handler = LeadHandler()
+    handler.idempotency = LeadIdempotency(AsyncSessionRunner(max_workers=2, timeout=5), connect)
+    handler._find_vendor_ids = lambda session, names: {name: "V1" for name in names}  # Vendors has no SQLite schema
+    handler._recom_model = MagicMock()
+    handler._recom_model.recommend_carriers.side_effect = lambda *lane: pd.DataFrame(
+        {"Carrier Name": ["Fast Haul"], "Lead Score": ["A"]})
+    body = {"deal_id": "D5", "order_id": "O5", "pickup_city": "Toronto", "dropoff_city": "Ottawa"}
+
+    with patch("src.funcmain.get_zoho_api", return_value=zoho), \
+            patch("src.funcmain.get_token_instance", return_value=MagicMock(get_access_token=AsyncMock())), patch("src.funcmain.get_carrier_data"):
+        first = await handler.add_carrier_and_quotes(body)
+        assert first["crm_writes"] == {"Potential_Carrier": "created", "Transport_Offers": "rejected"}
+        with connect() as session:
+            assert session.get(LeadRequest, "D5").Status == "done"  # kept: the carriers were created
+
+        # the retry creates only the Transport Offers that were rejected, then replays
+        second = await handler.add_carrier_and_quotes(body)
+        assert second["crm_writes"] == {"Potential_Carrier": "created", "Transport_Offers": "created"}
+        assert await handler.add_carrier_and_quotes(body) == second
+
+        # Zoho fails outright after the carriers were sent: the claim is kept too
+        zoho.update_record.side_effect = RuntimeError("Deals update timed out")
+        failed = await handler.add_carrier_and_quotes({**body, "deal_id": "D6"})
+        assert failed["status"] == "failed" and failed["crm_writes"]["Potential_Carrier"] == "created"
+        assert await handler.add_carrier_and_quotes({**body, "deal_id": "D6"}) == failed
+
+    assert sorted(created) == ["Potential_Carrier", "Potential_Carrier", "Transport_Offers", "Transport_Offers"]
+    assert handler.idempotency.stats()["resumed"] == 1
+    handler.idempotency.runner.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_lead_request_retries_carriers_when_the_vendor_lookup_failed(sqlite_db):
+    from unittest.mock import AsyncMock, MagicMock, patch
+    import pandas as pd
+    from src.funcmain import LeadHandler
+    from src.idempotency import LeadIdempotency
+
+    created = []
+    lookups = []
+
+    async def create_record(moduleName, data, token):
+        created.append((moduleName, data["data"][0]["VendorID"]))
+        return MagicMock(status_code=200, json=lambda: {"data": []})
+
+    def find_vendor_ids(session, names):  # Vendors has no SQLite schema
+        lookups.append(names)
+        if len(lookups) == 1:
+            raise TimeoutError("SQL call timed out after 10.0s")
+        return {name: "V1" for name in names}
+
+    handler = LeadHandler()
+    handler.idempotency = LeadIdempotency(AsyncSessionRunner(max_workers=2, timeout=5), connect)
+    handler._find_vendor_ids = find_vendor_ids
+    handler._recom_model = MagicMock()
+    handler._recom_model.recommend_carriers.side_effect = lambda *lane: pd.DataFrame(
+        {"Carrier Name": ["Fast Haul"], "Lead Score": ["A"]})
+    body = {"deal_id": "D7", "order_id": "O7", "pickup_city": "Toronto", "dropoff_city": "Kingston"}
+
+    with patch("src.funcmain.get_zoho_api", return_value=MagicMock(create_record=create_record)), \
+            patch("src.funcmain.get_token_instance", return_value=MagicMock(get_access_token=AsyncMock())), patch("src.funcmain.get_carrier_data"):
+        first = await handler.add_carrier_and_quotes(body)
+        assert first["crm_writes"] == {"Potential_Carrier": "failed"}
+        assert first["attach_response"]["potential carrier"]["status"] == "failed"
+        assert created == []
+
+        # the retry is not a replay of the failure: it runs the carrier step again
+        second = await handler.add_carrier_and_quotes(body)
+        assert second["crm_writes"] == {"Potential_Carrier": "created"}
+        assert second["attach_response"]["potential carrier"]["status"] == "success"
+        assert await handler.add_carrier_and_quotes(body) == second
+
+    assert created == [("Potential_Carrier", "V1")]
+    assert len(lookups) == 2
+    handler.idempotency.runner.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_lead_recommendation_keeps_event_loop_free(sqlite_db):
+    from unittest.mock import AsyncMock, MagicMock, patch
+    import pandas as pd
+    from src.funcmain import LeadHandler
+
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    def slow_recommendation(*lane):
+        time.sleep(0.1)  # stands in for a cold snapshot load
+        return pd.DataFrame({"Carrier Name": [], "Lead Score": []})
+
+    handler = LeadHandler()
+    handler._recom_model = MagicMock()
+    handler._recom_model.recommend_carriers.side_effect = slow_recommendation
+    with patch("src.funcmain.get_zoho_api"), patch("src.funcmain.get_carrier_data"), \
+            patch("src.funcmain.get_token_instance", return_value=MagicMock(get_access_token=AsyncMock())):
+        _, response = await asyncio.gather(
+            ticker(), handler._add_carrier_and_quotes({"deal_id": "D8", "pickup_city": "Toronto", "dropoff_city": "Ottawa"}))
+
+    assert response["status"] == "success"
+    assert ticks[-1] - ticks[0] < 0.1
@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import patch, MagicMock
-from src.funcmain import LeadHandler, QuoteHandler
+from src.funcmain import LeadHandler, QuoteHandler, get_tax_table
+from src.tax_rates import TaxRate
 import azure.functions as func
 import os
 os.environ["REFRESH_TOKEN"] = "fake_refresh_token"
@@ -44,22 +45,35 @@ async def test_add_carrier_and_quotes(mock_db, mock_zoho, mock_token, lead_handl
     assert response["status"] == "success"
 @pytest.mark.asyncio
 @patch("src.funcmain.ZOHO_API.update_record", return_value=MagicMock(status_code=200, json=lambda: {"status": "success"}))
-@patch("src.funcmain.send_message_to_channel", return_value=None)
+@patch("src.funcmain.notify_quote_channel", return_value=None)
 @patch("src.funcmain.DatabaseConnection")
 @patch("src.funcmain.TOKEN_INSTANCE.get_access_token", return_value="fake_token")
 async def test_store_sql_quote(mock_token, mock_db, mock_slack,mock_zoho_update, quote_handler, mock_request):
     mock_session = mock_db.return_value.__enter__.return_value
     mock_session.query.return_value.filter_by.return_value.first.return_value = None
     mock_session.query.return_value.filter.return_value.count.return_value = 0
+    mock_session.query.return_value.all.return_value = [TaxRate("Ontario", "HST", 13.0, "HST")]
+    get_tax_table().invalidate()
     req = mock_request({
         "CarrierName": "TestCarrier",
         "Pickup_City": "Toronto",
         "Dropoff_City": "Vancouver",
-        "Estimated_Amount": 500
+        "Estimated_Amount": 500,
+        "Tax_Province": "ON"
     })
     response = await quote_handler.store_sql_quote(req.get_json())
     assert response["status"] == "success"
 @pytest.mark.asyncio
+@patch("src.funcmain.notify_quote_channel", return_value=None)
+@patch("src.funcmain.DatabaseConnection")
+async def test_store_sql_quote_unknown_tax_province(mock_db, mock_slack, quote_handler, mock_request):
+    mock_session = mock_db.return_value.__enter__.return_value
+    mock_session.query.return_value.all.return_value = [TaxRate("Ontario", "HST", 13.0, "HST")]
+    get_tax_table().invalidate()
+    response = await quote_handler.store_sql_quote({"CarrierName": "TestCarrier", "Tax_Province": "Narnia"})
+    assert response["code"] == 400
+    mock_session.add.assert_not_called()
+@pytest.mark.asyncio
 @patch("src.funcmain.DatabaseConnection")
 async def test_get_quote(mock_db, quote_handler):
     mock_session = mock_db.return_value.__enter__.return_value
@@ -69,4 +83,17 @@ async def test_get_quote(mock_db, quote_handler):
     mock_quote.QuoteStatus = "ACTIVE"
     mock_session.query.return_value.filter.return_value.order_by.return_value.first.return_value = mock_quote
     response = await quote_handler.get_quote("Toronto", "Vancouver")
-    assert response["status"] == "success"
\ No newline at end of file
+    assert response["status"] == "success"
+@pytest.mark.asyncio
+async def test_recommend_batch(lead_handler):
+    response = await lead_handler.recommend_batch({"lanes": [
+        {"pickup_city": "Toronto", "dropoff_city": "Montreal", "pickup_province": "Ontario", "dropoff_province": "Québec"},
+        {"pickup_city": "Toronto"},
+    ], "top_n": 3})
+    assert response["status"] == "partial"
+    ranked, invalid = response["results"]
+    assert ranked["code"] == 200 and 0 < len(ranked["carriers"]) <= 3
+    assert [c["rank"] for c in ranked["carriers"]] == list(range(1, len(ranked["carriers"]) + 1))
+    assert ranked["carriers"][0]["score"] >= ranked["carriers"][-1]["score"]
+    assert invalid["code"] == 400
+    assert (await lead_handler.recommend_batch({"lanes": []}))["code"] == 400
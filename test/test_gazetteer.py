@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.gazetteer import Gazetteer, NearbyCities, build_gazetteer
+from utils.kdtree import KDTree
+
+PLACES = pd.DataFrame([
+    ["Toronto", "Ontario", "Canada", 43.6532, -79.3832, 2731571],
+    ["Mississauga", "Ontario", "Canada", 43.5890, -79.6441, 721599],
+    ["Montréal", "Quebec", "Canada", 45.5019, -73.5674, 1704694],
+    ["Laval", "Quebec", "Canada", 45.5699, -73.6920, 422993],
+    ["Ottawa", "Ontario", "Canada", 45.4215, -75.6972, 934243],
+    ["London", "Ontario", "Canada", 42.9849, -81.2453, 383822],
+    ["London", "Kentucky", "United States", 37.1290, -84.0833, 8126],
+], columns=["city", "province", "country", "lat", "lon", "population"])
+
+
+def test_kdtree_radius_query_matches_a_full_scan():
+    points = np.random.default_rng(7).random((2000, 3))
+    tree = KDTree(points, leaf_size=8)
+    for query in points[:20]:
+        rows, distances = tree.query_radius(query, 0.15)
+        expected = np.flatnonzero(np.linalg.norm(points - query, axis=1) <= 0.15)
+        assert sorted(rows) == sorted(expected)
+        assert list(distances) == sorted(distances)
+    assert len(KDTree(np.empty((0, 3))).query_radius([0, 0, 0], 1)[0]) == 0
+
+
+def test_locate_accepts_codes_accents_and_missing_provinces():
+    gazetteer = Gazetteer(PLACES)
+    assert gazetteer.locate("Montreal", "QC") == (45.5019, -73.5674)
+    assert gazetteer.locate("london", "KY") == (37.1290, -84.0833)
+    assert gazetteer.locate("London") == (42.9849, -81.2453)  # the most populous one
+    assert gazetteer.locate("Nowhere", "ON") is None
+
+
+def test_nearby_cities_are_found_within_the_radius():
+    nearby = NearbyCities({"toronto": {"ontario"}, "montreal": {"quebec"}, "laval": {"quebec"},
+                           "atlantis": {"ontario"}}, Gazetteer(PLACES))
+    assert len(nearby) == 3
+    mississauga = nearby.locate("Mississauga", "Ontario")
+    assert [city for city, _ in nearby.within(mississauga, 50)] == ["toronto"]
+    assert nearby.within(mississauga, 50)[0][1] == pytest.approx(22.5, abs=1)
+    assert [city for city, _ in nearby.within(nearby.locate("Laval"), 30)] == ["laval", "montreal"]
+    assert nearby.locate("Atlantis", "Ontario", keys=("atlantis",)) is None
+
+
+def test_build_gazetteer_from_a_geonames_dump(tmp_path):
+    rows = [
+        [6167865, "Toronto", "Toronto", "", 43.70011, -79.4163, "P", "PPLA", "CA", "", "08", "", "", "", 2600000],
+        [6077243, "Montréal", "Montreal", "", 45.50884, -73.58781, "P", "PPLA2", "CA", "", "10", "", "", "", 1600000],
+        [1, "Tiny Place", "Tiny Place", "", 45.0, -75.0, "P", "PPL", "CA", "", "08", "", "", "", 20],
+        [2, "Laval", "Laval", "", 45.56995, -73.692, "P", "PPL", "CA", "", "10", "", "", "", 0],
+        [3, "Toronto", "Toronto", "", 40.0, -80.0, "P", "PPL", "US", "", "OH", "", "", "", 5000],
+        [4, "Lake Ontario", "Lake Ontario", "", 43.6, -77.9, "H", "LK", "CA", "", "08", "", "", "", 0],
+    ]
+    dump = tmp_path / "cities500.txt"
+    dump.write_text("\n".join("\t".join(map(str, row + ["", "", "", ""])) for row in rows), encoding="utf-8")
+
+    frame = build_gazetteer(str(dump), carrier_cities=["Laval"], min_population=1000)
+    assert list(zip(frame["city"], frame["province"])) == [
+        ("Toronto", "Ontario"), ("Montréal", "Quebec"), ("Toronto", "Ohio"), ("Laval", "Quebec")]
+    assert Gazetteer(frame).locate("Toronto", "OH") == (40.0, -80.0)
+
+
+def test_missing_gazetteer_disables_the_nearby_tier_with_a_warning(tmp_path, monkeypatch, caplog):
+    from src.gazetteer import default_gazetteer
+
+    monkeypatch.setenv("GAZETTEER_PATH", str(tmp_path / "gazetteer.csv"))
+    default_gazetteer.cache_clear()
+    try:
+        with caplog.at_level("WARNING"):
+            assert default_gazetteer() is None
+        assert any("skip the nearby-lane tier" in r.getMessage() for r in caplog.records)
+    finally:
+        default_gazetteer.cache_clear()
@@ -0,0 +1,45 @@
+import json
+import os
+import subprocess
+import sys
+
+import aiohttp
+import pytest
+from loadtest.stubs import BackgroundServer, StubBehaviour, zoho_app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.asyncio
+async def test_zoho_stub_throttles_over_the_rate_limit():
+    behaviour = StubBehaviour(latency=0, jitter=0, rate_limit=3)
+    server = BackgroundServer(zoho_app(behaviour))
+    url = server.start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            statuses = []
+            for _ in range(5):
+                async with session.get(f"{url}/crm/v2/Deals/1") as response:
+                    statuses.append(response.status)
+    finally:
+        server.stop()
+    assert statuses.count(200) == 3
+    assert statuses.count(429) == 2
+    assert behaviour.throttled == 2
+
+
+def test_short_replay_reports_every_endpoint(tmp_path):
+    # a subprocess, since the harness points the app's settings at its own stand-ins
+    report_path = tmp_path / "report.json"
+    subprocess.run(
+        [sys.executable, "-m", "loadtest.run", "--requests", "30", "--concurrency", "4",
+         "--zoho-latency", "0.005", "--zoho-jitter", "0", "--slack-latency", "0.005", "--report", str(report_path)],
+        cwd=ROOT, check=True, capture_output=True, timeout=300,
+    )
+    report = json.loads(report_path.read_text())
+    endpoints = report["endpoints"]
+    assert {"v1/get-quote", "v1/leads", "v1/store-quotes", "v1/update-quotes"} <= set(endpoints)
+    assert endpoints["all"]["requests"] == 30
+    assert endpoints["all"]["http_errors"] == 0
+    assert report["zoho"]["calls"]["oauth/token"] == 1
+    assert "quotes.get" in report["stages"]
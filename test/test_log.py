@@ -0,0 +1,74 @@
+import io
+import logging
+import threading
+from unittest.mock import patch
+
+from utils.log import LogPipeline, RateLimitFilter, log_payload
+
+
+def make_logger(name, pipeline, level=logging.INFO):
+    logger = logging.getLogger(name)
+    logger.handlers = [pipeline.handler]
+    logger.propagate = False
+    logger.setLevel(level)
+    return logger
+
+
+def test_records_are_formatted_and_written_on_the_listener_thread():
+    stream = io.StringIO()
+    pipeline = LogPipeline(stream=stream)
+    pipeline.start()
+    logger = make_logger("test.log.async", pipeline)
+
+    formatted_on = []
+
+    class Payload:
+        def __str__(self):
+            formatted_on.append(threading.current_thread())
+            return "payload"
+
+    try:
+        logger.info("body: %s", Payload())
+        assert pipeline.flush()
+    finally:
+        pipeline.stop()
+    assert "test.log.async - INFO - body: payload" in stream.getvalue()
+    assert formatted_on and formatted_on[0] is not threading.main_thread()
+
+
+def test_full_queue_drops_records_instead_of_blocking():
+    pipeline = LogPipeline(queue_size=2)  # never started, so nothing drains
+    logger = make_logger("test.log.full", pipeline)
+    for i in range(5):
+        logger.info("record %d", i)
+    assert pipeline.queue.qsize() == 2
+    assert pipeline.handler.dropped == 3
+
+
+def test_rate_limit_suppresses_info_but_not_warnings():
+    rate_filter = RateLimitFilter(rate=0.001, burst=2)
+    record = lambda level: logging.LogRecord("x", level, __file__, 1, "message", None, None)
+    assert [rate_filter.filter(record(logging.INFO)) for _ in range(4)] == [True, True, False, False]
+    assert rate_filter.filter(record(logging.ERROR))
+    assert rate_filter.suppressed == 2
+
+    rate_filter._tokens = 1  # a token becomes available again
+    passed = record(logging.INFO)
+    assert rate_filter.filter(passed)
+    assert "[2 earlier records suppressed" in passed.getMessage()
+
+
+def test_payloads_are_logged_in_full_at_debug_and_sampled_at_info():
+    logger = logging.getLogger("test.log.payload")
+    logger.setLevel(logging.DEBUG)
+    with patch.object(logger, "debug") as debug:
+        log_payload(logger, "body", {"deal_id": "1"})
+    debug.assert_called_once_with("%s: %s", "body", {"deal_id": "1"})
+
+    logger.setLevel(logging.INFO)
+    with patch.object(logger, "info") as info:
+        for _ in range(10):
+            log_payload(logger, "body", {}, sample_rate=0)
+        assert not info.called
+        log_payload(logger, "body", {}, sample_rate=1)
+        info.assert_called_once_with("%s (sampled): %s", "body", {})
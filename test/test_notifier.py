@@ -0,0 +1,49 @@
+import json
+from utils.notifier import SlackDispatcher
+
+
+class FakeSlack:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.posts = []
+
+    def chat_postMessage(self, channel, text, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("slack unavailable")
+        self.posts.append((channel, text))
+
+
+def test_bursts_are_grouped_per_channel():
+    slack = FakeSlack()
+    dispatcher = SlackDispatcher("token", batch_window=0.2, client=slack)
+
+    for i in range(3):
+        dispatcher.notify("quotes", f"quote {i}")
+    dispatcher.notify("alerts", "alert")
+
+    assert dispatcher.flush(timeout=2)
+    assert sorted(channel for channel, _ in slack.posts) == ["alerts", "quotes"]
+    grouped = dict(slack.posts)["quotes"]
+    assert grouped.startswith("*3 notifications*") and "quote 2" in grouped
+
+
+def test_failed_posts_are_retried_with_backoff():
+    slack = FakeSlack(failures=2)
+    dispatcher = SlackDispatcher("token", batch_window=0, backoff=0.01, client=slack)
+
+    dispatcher.notify("quotes", "hello")
+
+    assert dispatcher.flush(timeout=2)
+    assert slack.posts == [("quotes", "hello")]
+    assert dispatcher.stats()["retries"] == 2
+
+
+def test_undeliverable_messages_spill_to_disk(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    dispatcher = SlackDispatcher("token", batch_window=0, max_retries=0, spill_path=str(spill), client=FakeSlack(failures=1))
+
+    dispatcher.notify("quotes", "kept for later")
+
+    assert dispatcher.flush(timeout=2)
+    assert [json.loads(line) for line in spill.read_text().splitlines()] == [{"channel": "quotes", "text": "kept for later"}]
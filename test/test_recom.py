@@ -0,0 +1,199 @@
+import logging
+import pandas as pd
+import pytest
+from src.recom import CarrierRecommendationModel, CarrierSnapshot
+
+
+def make_carriers():
+    return pd.DataFrame([
+        ["Fast Haul", "Toronto", "Ontario", "Canada", "Montréal", "Québec", "Canada", 3, 1.2, 500.0, 3.0, 4.0, 1.0, 5.0],
+        ["Fast Haul", "Ottawa", "Ontario", "Canada", "Laval", "Québec", "Canada", 1, None, 450.0, None, None, None, None],
+        ["North Lines", " TORONTO ", "Ontario", "Canada", "Montreal", "Québec", "Canada", 2, 1.5, 650.0, 5.0, 2.0, 2.0, 4.0],
+        ["East Carriers", "Kingston", "Ontario", "Canada", "Quebec City", "Québec", "Canada", 6, 1.1, 700.0, 4.0, 10.0, 2.0, 12.0],
+        ["East Carriers", "Ottawa", "Ontario", "Canada", "Gatineau", "Québec", "Canada", 2, 1.0, 300.0, 2.0, 3.0, 0.0, 3.0],
+        ["West Freight", "Calgary", "Alberta", "Canada", "Vancouver", "British Columbia", "Canada", 4, 1.3, 900.0, 6.0, 5.0, 1.0, 6.0],
+    ], columns=[
+        "Carrier Name", "Pickup City", "Pickup State/Province", "Pickup Country", "Destination City",
+        "Destination State/Province", "Destination Country", "Transport Requests", "Avg. Cost Per Km",
+        "Estimated Amount", "Avg. Delivery Day", "On-time", "Late Delivery", "CountRequest",
+    ])
+
+
+@pytest.fixture
+def model():
+    return CarrierRecommendationModel(logging.getLogger(__name__))
+
+
+def test_snapshot_indexes_normalized_lanes():
+    snapshot = CarrierSnapshot(make_carriers())
+    assert len(snapshot.city_lane("toronto", "montreal")) == 2
+    assert snapshot.city_lane("calgary", "montreal").empty
+    assert set(snapshot.province_lane("ontario", "quebec")["Carrier Name"]) == {"Fast Haul", "North Lines", "East Carriers"}
+
+
+def test_recommend_uses_city_then_province_matches(model):
+    leads = model.recommend_carriers(CarrierSnapshot(make_carriers()), "Toronto", "Montréal", "Ontario", "Québec")
+    scores = dict(zip(leads["Carrier Name"], leads["matching_score"]))
+    assert scores == {"Fast Haul": 10, "North Lines": 10, "East Carriers": -5}
+    assert list(leads["CScore"]) == sorted(leads["CScore"])
+
+
+def test_recommend_accepts_dataframe_without_mutating_it(model):
+    carriers = make_carriers()
+    from_frame = model.recommend_carriers(carriers, "Toronto", "Montréal", "Ontario", "Québec")
+    from_snapshot = model.recommend_carriers(CarrierSnapshot(carriers), "Toronto", "Montréal", "Ontario", "Québec")
+    pd.testing.assert_frame_equal(from_frame, from_snapshot)
+    assert carriers.loc[2, "Pickup City"] == " TORONTO "
+
+
+def test_vectorized_scores_match_row_wise_scorers(model):
+    candidates = make_carriers().fillna({"Avg. Delivery Day": 1.0, "CountRequest": 2.0})
+    candidates.loc[1, ["On-time", "Late Delivery"]] = 0.0
+    max_day, min_day = candidates["Avg. Delivery Day"].max(), candidates["Avg. Delivery Day"].min()
+    max_cost, min_cost = candidates["Estimated Amount"].max(), candidates["Estimated Amount"].min()
+
+    transport = candidates.apply(lambda r: model._transport_eff_m(r["Avg. Delivery Day"], max_day, min_day, r["CountRequest"]), axis=1)
+    reliability = candidates.apply(lambda r: model._reliability_m(r["On-time"], r["Late Delivery"], r["CountRequest"]), axis=1)
+    cost = candidates.apply(lambda r: model._cost_eff_m(r["Estimated Amount"], max_cost, min_cost), axis=1)
+    tiers = candidates["Estimated Amount"].apply(lambda s: model._categorize_intensity_dynamic(s, candidates["Estimated Amount"]))
+
+    assert list(model._transport_eff_v(candidates["Avg. Delivery Day"], candidates["CountRequest"])) == list(transport)
+    assert list(model._reliability_v(candidates["On-time"], candidates["Late Delivery"], candidates["CountRequest"])) == list(reliability)
+    assert list(model._cost_eff_v(candidates["Estimated Amount"])) == list(cost)
+    assert list(model._categorize_intensity_v(candidates["Estimated Amount"])) == list(tiers)
+
+
+def test_top_k_keeps_best_scores_in_ascending_order(model):
+    cscore = pd.Series([3.0, 9.0, 1.0, 9.0, 5.0]).to_numpy()
+    assert list(model._top_k(cscore, 3)) == [4, 1, 3]
+
+
+def test_recommendations_are_cached_per_route_and_snapshot(model):
+    snapshot = CarrierSnapshot(make_carriers())
+    first = model.recommend_carriers(snapshot, "Toronto", "Montréal", "Ontario", "Québec")
+    first["Carrier Name"] = "mutated"  # callers such as LeadHandler rewrite names in place
+    hits = model.cache.hits
+
+    second = model.recommend_carriers(snapshot, " toronto", "montreal", "ontario", "quebec")
+    assert model.cache.hits == hits + 1
+    assert "mutated" not in set(second["Carrier Name"])
+
+    reloaded = CarrierSnapshot(make_carriers())
+    model.recommend_carriers(reloaded, "Toronto", "Montréal", "Ontario", "Québec")
+    assert model.cache.hits == hits + 1
+    assert model.cache_stats()["snapshot_version"] == reloaded.version
+
+
+def test_recommend_resolves_city_aliases(model, caplog):
+    with caplog.at_level(logging.INFO):
+        leads = model.recommend_carriers(CarrierSnapshot(make_carriers()), "toronto, on", "Montreal, Québec", "Ontario", "Québec")
+    scores = dict(zip(leads["Carrier Name"], leads["matching_score"]))
+    assert scores == {"Fast Haul": 10, "North Lines": 10, "East Carriers": -5}
+    assert any("City alias (province_suffix) for pickup" in r.getMessage() for r in caplog.records)
+
+
+def test_city_matches_score_below_exact_by_rule(model):
+    from src.gazetteer import Gazetteer
+    from test.test_gazetteer import PLACES
+
+    snapshot = CarrierSnapshot(make_carriers(), gazetteer=Gazetteer(PLACES))
+    leads = model.recommend_carriers(snapshot, "Torontoo", "Montréal", "Ontario", "QC")
+    assert dict(zip(leads["Carrier Name"], leads["matching_score"])) == {
+        "Fast Haul": 6, "North Lines": 6, "East Carriers": -5}
+    assert leads.attrs["city_match"] == {"pickup": "fuzzy", "destination": "exact"}
+    assert model.recommend_carriers(snapshot, "Torontoo", "Montréal", "Ontario", "QC").attrs["city_match"]["pickup"] == "fuzzy"
+
+    leads = model.recommend_carriers(snapshot, "Toronto", "Montreal-Quebec", "Ontario", "Québec")
+    assert set(leads["matching_score"]) == {10, -5}  # a trailing province is not a weaker match
+
+    batch = model.recommend_carriers_batch(snapshot, [("Torontoo", "Montréal", "Ontario", "QC"), ("Toronto", "Montréal", "", "")])
+    assert [leads.attrs["city_match"]["pickup"] for leads in batch] == ["fuzzy", "exact"]
+    assert set(batch[0]["matching_score"]) == {6, -5}
+
+
+def test_known_places_are_not_rewritten_to_a_table_city(model):
+    from src.gazetteer import Gazetteer
+    from test.test_gazetteer import PLACES
+
+    carriers = make_carriers()
+    carriers.loc[0, "Pickup City"] = "Milton"
+    places = pd.concat([PLACES, pd.DataFrame([["Hilton", "Ontario", "Canada", 46.26, -83.89, 300]], columns=PLACES.columns)])
+    leads = model.recommend_carriers(CarrierSnapshot(carriers, gazetteer=Gazetteer(places)), "Hilton", "Montréal", "ON", "QC")
+    assert leads.attrs["city_match"]["pickup"] == "place"
+    assert set(leads["matching_score"]) == {-5}
+    leads = model.recommend_carriers(CarrierSnapshot(carriers), "Hilton", "Montréal", "ON", "QC")
+    assert leads.attrs["city_match"]["pickup"] == "miss"  # without a gazetteer nothing is fuzzy-matched
+    assert set(leads["matching_score"]) == {-5}
+
+
+def test_recommend_scores_nearby_lanes_by_distance(model):
+    from src.gazetteer import Gazetteer
+    from test.test_gazetteer import PLACES
+
+    with_places = model.recommend_carriers(CarrierSnapshot(make_carriers(), gazetteer=Gazetteer(PLACES)),
+                                           "Mississauga", "Laval", "Ontario", "Québec")
+    scores = dict(zip(with_places["Carrier Name"], with_places["matching_score"]))
+    # Toronto -> Montréal lanes are about 25 and 10 km from the requested cities
+    assert 8 > scores["Fast Haul"] == scores["North Lines"] > 3
+    assert scores["East Carriers"] == -5
+
+    without = model.recommend_carriers(CarrierSnapshot(make_carriers()), "Mississauga", "Laval", "Ontario", "Québec")
+    assert set(without["matching_score"]) == {-5}
+
+
+def test_batch_matches_single_lane_recommendations(model):
+    snapshot = CarrierSnapshot(make_carriers())
+    lanes = [
+        ("Toronto", "Montréal", "Ontario", "Québec"),
+        ("Ottawa", "Gatineau", "ON", "QC"),
+        ("Nowhere", "Somewhere", "Ontario", "Québec"),
+        ("Calgary", "Vancouver", "Alberta", "British Columbia"),
+        ("Toronto", "Montréal", "Ontario", "Québec"),
+        ("Halifax", "Moncton", "Nova Scotia", "New Brunswick"),
+    ]
+    batch = model.recommend_carriers_batch(snapshot, lanes)
+    assert len(batch) == len(lanes) and batch[5].empty
+    assert model.cache_stats()["size"] == 5  # the repeated lane is computed once
+
+    model.cache.clear()
+    for leads, lane in zip(batch, lanes):
+        expected = model.recommend_carriers(snapshot, *lane).reset_index(drop=True)
+        pd.testing.assert_frame_equal(leads, expected, check_dtype=False)
+
+
+def test_province_aggregates_are_precomputed_per_pair():
+    from src.recom import CARRIER_AGGREGATION
+
+    snapshot = CarrierSnapshot(make_carriers())
+    for pair in [("ontario", "quebec"), ("alberta", "british columbia")]:
+        expected = snapshot.province_lane(*pair).fillna(0).groupby('Carrier Name').agg(CARRIER_AGGREGATION).reset_index()
+        pd.testing.assert_frame_equal(snapshot.province_carriers.get(pair).reset_index(drop=True), expected)
+    assert snapshot.province_carriers.get(("ontario", "alberta")) is None
+
+
+def test_province_fallback_resolves_province_codes(model):
+    carriers = make_carriers()
+    carriers.loc[4, ["Pickup State/Province", "Destination State/Province"]] = ["ON", "QC"]  # codes in the table too
+    snapshot = CarrierSnapshot(carriers)
+    assert snapshot.fallback("ON", "QC")[:1] == snapshot.fallback("Ontario", "Québec")[:1] == ("province",)
+
+    leads = model.recommend_carriers(snapshot, "Nowhere", "Elsewhere", "ON", "QC")
+    assert dict(zip(leads["Carrier Name"], leads["matching_score"])) == {
+        "Fast Haul": -5, "North Lines": -5, "East Carriers": -5}
+    by_name = model.recommend_carriers(snapshot, "Nowhere", "Elsewhere", "Ontario", "Québec")
+    pd.testing.assert_frame_equal(leads, by_name)
+    assert snapshot.province_carriers.get(("ontario", "quebec"))["Transport Requests"].sum() == 14
+
+
+def test_recommend_falls_back_to_the_country_corridor(model):
+    snapshot = CarrierSnapshot(make_carriers())
+    # no lane joins Alberta and Ontario, but both are in Canada
+    leads = model.recommend_carriers(snapshot, "Calgary", "Toronto", "AB", "Ontario")
+    assert set(leads["matching_score"]) == {-8}
+    assert set(leads["Carrier Name"]) == {"Fast Haul", "North Lines", "East Carriers", "West Freight"}
+
+    # without provinces the countries come from the cities
+    leads = model.recommend_carriers(snapshot, "Toronto", "Montréal", "", "")
+    assert dict(zip(leads["Carrier Name"], leads["matching_score"])) == {
+        "Fast Haul": 10, "North Lines": 10, "East Carriers": -8, "West Freight": -8}
+    assert model.recommend_carriers(snapshot, "Nowhere", "Nothing", "", "").empty
@@ -0,0 +1,64 @@
+import os
+import pandas as pd
+from src.snapshot import build_snapshot, load_carrier_data, read_snapshot
+from test.test_recom import make_carriers
+
+
+def test_snapshot_round_trips_carrier_table(tmp_path):
+    csv_path, snapshot_path = tmp_path / "CarriersT.csv", tmp_path / "CarriersT.npz"
+    carriers = make_carriers()
+    carriers.to_csv(csv_path, index=False)
+    build_snapshot(csv_path, snapshot_path)
+
+    frame, manifest = read_snapshot(snapshot_path)
+    pd.testing.assert_frame_equal(frame, pd.read_csv(csv_path))
+    assert load_carrier_data(csv_path, snapshot_path).version == manifest["source_digest"]
+
+
+def test_stale_snapshot_falls_back_to_csv(tmp_path):
+    csv_path, snapshot_path = tmp_path / "CarriersT.csv", tmp_path / "CarriersT.npz"
+    make_carriers().to_csv(csv_path, index=False)
+    build_snapshot(csv_path, snapshot_path)
+    make_carriers().iloc[:2].to_csv(csv_path, index=False)
+
+    assert len(load_carrier_data(csv_path, snapshot_path)) == 2
+
+
+def test_reloader_publishes_only_changed_exports(tmp_path):
+    from src.carrier_source import CarrierDataReloader, LocalDirectorySource
+
+    make_carriers().to_csv(tmp_path / "CarriersT.csv", index=False)
+    published = []
+    reloader = CarrierDataReloader(
+        LocalDirectorySource(tmp_path),
+        on_update=published.append,
+        current=lambda: published[-1] if published else None,
+    )
+
+    assert reloader.poll_once() is True
+    assert reloader.poll_once() is False  # same ETag
+
+    make_carriers().iloc[:3].to_csv(tmp_path / "CarriersT.csv", index=False)
+    os.utime(tmp_path / "CarriersT.csv", ns=(0, 10**9))
+    assert reloader.poll_once() is True
+    assert [len(s) for s in published] == [6, 3]
+
+
+def test_reloader_does_not_rebuild_the_snapshot_loaded_at_startup(tmp_path, monkeypatch):
+    import time
+    from src import carrier_source
+    from src.carrier_source import CarrierDataReloader, LocalDirectorySource
+
+    make_carriers().to_csv(tmp_path / "CarriersT.csv", index=False)
+    build_snapshot(tmp_path / "CarriersT.csv", tmp_path / "CarriersT.npz")
+    loaded = load_carrier_data(tmp_path / "CarriersT.csv", tmp_path / "CarriersT.npz")
+    builds = []
+    monkeypatch.setattr(carrier_source, "load_carrier_bytes", lambda *args: builds.append(args))
+
+    reloader = CarrierDataReloader(LocalDirectorySource(tmp_path), on_update=None, current=lambda: loaded, interval=0.2)
+    reloader.start()
+    time.sleep(0.1)
+    assert reloader.etag is None  # the first poll waits an interval
+    time.sleep(0.2)
+    reloader.stop()
+    assert reloader.etag is not None and builds == []  # same version: fetched, not rebuilt
@@ -0,0 +1,88 @@
+import pytest
+from src.tax_rates import TaxRate, TaxRateTable, UnknownTaxProvince, resolve_province
+
+ROWS = [
+    TaxRate("Ontario", "HST", 13.0, "HST"),
+    TaxRate("Quebec", "GST + QST", 14.975, "GST+PST"),
+    TaxRate("Alberta", "GST", 5.0, "GST"),
+]
+
+
+class FakeLoader:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+        self.fail = False
+
+    async def __call__(self):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("database unavailable")
+        return list(self.rows)
+
+
+def test_resolve_province_accepts_names_codes_and_addresses():
+    assert resolve_province("ON") == "Ontario"
+    assert resolve_province(" qc ") == "Quebec"
+    assert resolve_province("Calgary, AB") == "Alberta"
+    assert resolve_province("Ontario") == "Ontario"
+    assert resolve_province("Lévis, Québec") == "Quebec"
+    assert resolve_province("") is None
+
+
+@pytest.mark.asyncio
+async def test_lookup_is_served_from_memory():
+    load = FakeLoader(ROWS)
+    table = TaxRateTable(load, ttl=60)
+
+    assert (await table.lookup("ON")).tax_rate == 13.0
+    assert (await table.lookup("Montreal, QC")).tax_name == "GST + QST"
+    assert (await table.lookup("Québec")).tax_name == "GST + QST"
+    assert load.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_unknown_province_fails_fast():
+    table = TaxRateTable(FakeLoader(ROWS))
+    with pytest.raises(UnknownTaxProvince):
+        await table.lookup("BC")
+    with pytest.raises(UnknownTaxProvince):
+        await table.lookup(None)
+
+
+@pytest.mark.asyncio
+async def test_invalidate_and_failed_reload_keep_serving_rates():
+    load = FakeLoader(ROWS)
+    table = TaxRateTable(load, ttl=60)
+    await table.lookup("ON")
+
+    load.rows = [TaxRate("Ontario", "HST", 15.0, "HST")]
+    table.invalidate()
+    assert (await table.lookup("ON")).tax_rate == 15.0
+
+    load.fail = True
+    table.invalidate()
+    assert (await table.lookup("ON")).tax_rate == 15.0
+    assert table.stats()["reload_failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_table_reloads_once_while_serving_the_old_rates():
+    import asyncio
+
+    class SlowLoader(FakeLoader):
+        async def __call__(self):
+            await asyncio.sleep(0.05)
+            return await super().__call__()
+
+    load = SlowLoader(ROWS)
+    table = TaxRateTable(load, ttl=0)
+    assert len(await asyncio.gather(*(table.lookup("ON") for _ in range(10)))) == 10
+    assert load.calls == 1  # the first load is shared
+
+    load.rows = [TaxRate("Ontario", "HST", 15.0, "HST")]
+    rates = await asyncio.gather(*(table.lookup("ON") for _ in range(10)))
+    assert {rate.tax_rate for rate in rates} == {13.0}  # expired: served at once, reloaded behind
+    await asyncio.sleep(0.1)
+    assert load.calls == 2
+    assert (await table.lookup("ON")).tax_rate == 15.0
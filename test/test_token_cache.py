@@ -0,0 +1,100 @@
+import asyncio
+import time
+import pytest
+from src.token_cache import AccessTokenCache
+
+
+class FakeFetch:
+    def __init__(self, expires_in=3600, delay=0.0):
+        self.expires_in = expires_in
+        self.delay = delay
+        self.calls = 0
+        self.fail = False
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("accounts server down")
+        return f"token-{self.calls}", self.expires_in
+
+
+@pytest.mark.asyncio
+async def test_tokens_are_served_from_memory():
+    fetch = FakeFetch()
+    cache = AccessTokenCache(fetch)
+
+    assert [await cache.get_access_token() for _ in range(3)] == ["token-1"] * 3
+    assert fetch.calls == 1
+    assert cache.stats()["hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_refreshes_collapse_into_one_call():
+    fetch = FakeFetch(delay=0.1)
+    cache = AccessTokenCache(fetch)
+
+    tokens = await asyncio.gather(*(cache.get_access_token() for _ in range(10)))
+
+    assert fetch.calls == 1
+    assert tokens == ["token-1"] * 10
+
+
+@pytest.mark.asyncio
+async def test_refresh_does_not_block_the_event_loop():
+    cache = AccessTokenCache(FakeFetch(delay=0.2))
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    token, _ = await asyncio.gather(cache.get_access_token(), ticker())
+    assert token == "token-1"
+    assert ticks[-1] - ticks[0] < 0.15
+
+
+@pytest.mark.asyncio
+async def test_token_is_refreshed_before_expiry():
+    fetch = FakeFetch(expires_in=1.5)
+    cache = AccessTokenCache(fetch, refresh_margin=1)
+
+    assert await cache.get_access_token() == "token-1"
+    await asyncio.sleep(1.3)
+    assert await cache.get_access_token() == "token-2"
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_is_raised_once_token_expired():
+    fetch = FakeFetch(expires_in=0)
+    cache = AccessTokenCache(fetch)
+    await cache.get_access_token()
+    fetch.fail = True
+
+    with pytest.raises(ConnectionError):
+        await cache.get_access_token()
+    assert cache.stats()["refresh_failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_background_refresh_is_kept_logged_and_cancelled_on_close(caplog):
+    fetch = FakeFetch(expires_in=0)
+    cache = AccessTokenCache(fetch)
+    await cache.get_access_token()
+
+    fetch.fail = True
+    cache._schedule_refresh(0)
+    await asyncio.sleep(0.05)  # the background refresh has run and failed
+    assert cache._refresh_task is None and fetch.calls == 2
+    assert any("Background token refresh failed" in r.getMessage() for r in caplog.records)
+
+    fetch.fail, fetch.delay = False, 0.2
+    cache._schedule_refresh(0)
+    await asyncio.sleep(0.05)
+    running = cache._refresh_task
+    assert running is not None and not running.done()
+    cache.close()
+    await asyncio.sleep(0)
+    assert running.cancelled() and cache._timer is None
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import pytest
+from utils.tracing import LatencyHistogram, Tracer
+
+
+def test_histogram_percentiles_are_within_a_bucket():
+    histogram = LatencyHistogram()
+    for ms in range(1, 1001):
+        histogram.record(float(ms))
+
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 1000
+    assert 500 <= snapshot["p50_ms"] <= 550
+    assert 950 <= snapshot["p95_ms"] <= 1000
+    assert snapshot["p99_ms"] <= snapshot["max_ms"] == 1000
+
+
+@pytest.mark.asyncio
+async def test_nested_spans_share_the_trace_and_log_dimensions(caplog):
+    tracer = Tracer()
+
+    async def stage(name):
+        with tracer.span(name) as dims:
+            await asyncio.sleep(0.01)
+            dims["status_code"] = 200
+
+    with caplog.at_level(logging.DEBUG, logger="tracing"):
+        with tracer.span("leads", deal_id="D1"):
+            await asyncio.gather(stage("zoho.POST Transport_Offers"), stage("zoho.PUT Deals"))
+
+    records = {r.custom_dimensions["span"]: r.custom_dimensions for r in caplog.records if hasattr(r, "custom_dimensions")}
+    assert set(records) == {"leads", "zoho.POST Transport_Offers", "zoho.PUT Deals"}
+    assert len({d["trace_id"] for d in records.values()}) == 1
+    assert records["zoho.PUT Deals"]["parent_span"] == "leads"
+    assert records["zoho.PUT Deals"]["status_code"] == "200"
+    assert records["leads"]["deal_id"] == "D1" and records["leads"]["parent_span"] is None
+    assert tracer.snapshot()["zoho.PUT Deals"]["p50_ms"] >= 10
+    spans = [r for r in caplog.records if hasattr(r, "custom_dimensions")]
+    assert {r.levelno for r in spans} == {logging.DEBUG}  # nothing logged at the default INFO level
+    assert "parent_span=leads" in spans[0].getMessage() and "status_code=200" in spans[0].getMessage()
+
+
+def test_sampled_traces_are_logged_at_info():
+    records = []
+
+    class Keep(logging.Handler):
+        def emit(self, record):
+            records.append(record)
+
+    logger = logging.getLogger("tracing.sampled")
+    logger.setLevel(logging.INFO)
+    logger.addHandler(Keep())
+    for sample_rate in (0.0, 1.0):
+        tracer = Tracer(logger=logger, sample_rate=sample_rate)
+        with tracer.span("leads"):
+            with tracer.span("leads.recommend"):
+                pass
+
+    # the unsampled trace goes to DEBUG, which this logger drops; the sampled one is logged whole
+    assert [(r.levelno, r.custom_dimensions["span"]) for r in records] == [
+        (logging.INFO, "leads.recommend"), (logging.INFO, "leads")]
+    assert records[0].custom_dimensions["trace_id"] == records[1].custom_dimensions["trace_id"]
+
+
+def test_failed_span_counts_as_error():
+    tracer = Tracer(log_spans=False)
+    with pytest.raises(ValueError):
+        with tracer.span("quotes.tax_lookup"):
+            raise ValueError("boom")
+    assert tracer.snapshot()["quotes.tax_lookup"]["errors"] == 1
@@ -0,0 +1,86 @@
+import asyncio
+import time
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from src.zoho_client import AsyncZohoClient
+
+
+@pytest_asyncio.fixture
+async def stub_zoho():
+    """Local stand-in for the Zoho CRM API; records every call it receives."""
+    calls = []
+    stub = {"delay": 0}
+
+    async def handle(request):
+        calls.append((request.method, request.path, request.headers.get("Authorization"), await request.json()))
+        await asyncio.sleep(stub["delay"])
+        return web.json_response({"data": [{"code": "SUCCESS"}]}, status=201 if request.method == "POST" else 200)
+
+    app = web.Application()
+    app.router.add_route("*", "/crm/v2/{tail:.*}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    yield stub, f"http://127.0.0.1:{port}/crm/v2", calls
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_create_and_update_records(stub_zoho):
+    stub, base_url, calls = stub_zoho
+    client = AsyncZohoClient(base_url=base_url)
+
+    created = await client.create_record(moduleName="Potential_Carrier", data={"data": [{"Name": "A"}]}, token="t0k")
+    updated = await client.update_record(moduleName="Deals", id="D1", data={"data": [{"Stage": "X"}]}, token="t0k")
+    await client.close()
+
+    assert created.status_code == 201 and created.json() == {"data": [{"code": "SUCCESS"}]}
+    assert updated.status_code == 200
+    assert calls == [
+        ("POST", "/crm/v2/Potential_Carrier", "Zoho-oauthtoken t0k", {"data": [{"Name": "A"}]}),
+        ("PUT", "/crm/v2/Deals/D1", "Zoho-oauthtoken t0k", {"data": [{"Stage": "X"}]}),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_update_records_batches_per_hundred(stub_zoho):
+    stub, base_url, calls = stub_zoho
+    client = AsyncZohoClient(base_url=base_url)
+
+    records = [{"id": str(i), "Pickup_City": "Oakville"} for i in range(150)]
+    responses = await client.update_records(moduleName="Transport_Offers", records=records, token="t")
+    await client.close()
+
+    assert [r.status_code for r in responses] == [200, 200]
+    assert sorted(len(body["data"]) for _, path, _, body in calls if path == "/crm/v2/Transport_Offers") == [50, 100]
+
+
+@pytest.mark.asyncio
+async def test_calls_run_concurrently_on_one_pool(stub_zoho):
+    stub, base_url, calls = stub_zoho
+    stub["delay"] = 0.2
+    client = AsyncZohoClient(base_url=base_url)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client.create_record(moduleName="Transport_Offers", data={}, token="t") for _ in range(3)))
+    elapsed = time.perf_counter() - start
+    pool_limit = client._session.connector.limit
+    await client.close()
+
+    assert len(calls) == 3
+    assert elapsed < 0.5
+    assert pool_limit == client.pool_size
+
+
+@pytest.mark.asyncio
+async def test_slow_responses_time_out(stub_zoho):
+    stub, base_url, calls = stub_zoho
+    stub["delay"] = 0.5
+    client = AsyncZohoClient(base_url=base_url, timeout=0.1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await client.update_record(moduleName="Deals", id="D1", data={}, token="t")
+    await client.close()
@@ -0,0 +1,133 @@
+# utils/cache.py
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe, bounded LRU cache whose entries also expire after `ttl` seconds.
+    """
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class ReadThroughCache:
+    """
+    Read-through cache in front of an async loader, stored in a TTLCache.
+
+    Values for which `is_negative(value)` is true (e.g. "not found") are kept for
+    `negative_ttl` seconds instead of `ttl`. invalidate() drops an entry as soon as its
+    source row changes; a load that was already running when any key was invalidated is
+    returned to its caller but not cached, so an old read can never repopulate an entry.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30, negative_ttl=5, is_negative=None):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.negative_ttl = negative_ttl
+        self.is_negative = is_negative or (lambda value: value is None)
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.negative_hits = 0
+        self.invalidations = 0
+        self.discarded_loads = 0
+        self.hit_age_total = 0.0
+        self.hit_age_max = 0.0
+
+    async def get_or_load(self, key, load):
+        """Return the cached value for `key`, or await `load()` and cache its result."""
+        entry = self.cache.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            age = time.monotonic() - stored_at
+            with self._lock:
+                self.hit_age_total += age
+                self.hit_age_max = max(self.hit_age_max, age)
+                if self.is_negative(value):
+                    self.negative_hits += 1
+            return value
+
+        generation = self._generation
+        value = await load()
+        with self._lock:
+            if generation != self._generation:
+                self.discarded_loads += 1
+                return value
+            ttl = self.negative_ttl if self.is_negative(value) else None
+            self.cache.set(key, (time.monotonic(), value), ttl=ttl)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self.cache.invalidate(key)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.cache.clear()
+
+    def stats(self):
+        stats = self.cache.stats()
+        with self._lock:
+            return {
+                **stats,
+                "negative_ttl": self.negative_ttl,
+                "negative_hits": self.negative_hits,
+                "invalidations": self.invalidations,
+                "discarded_loads": self.discarded_loads,
+                "avg_hit_age_seconds": round(self.hit_age_total / stats["hits"], 3) if stats["hits"] else None,
+                "max_hit_age_seconds": round(self.hit_age_max, 3),
+            }
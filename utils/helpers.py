@@ -2,8 +2,9 @@
 import re
 import logging
 import datetime
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
+import unicodedata
+
+from utils.log import configure_logger
 
 
 logger = logging.getLogger(__name__)
@@ -21,39 +22,13 @@ def standardize_name(name):
 def get_logger(name):
     # Create a logger
     logger = logging.getLogger(name)
-    
-    # If the logger already has handlers, don't add more (this avoids duplicate logs)
-    if not logger.hasHandlers():
-        # Set logging level
-        logger.setLevel(logging.INFO)
-        
-        # Create console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        
-        # Create formatter and add it to the handler
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        console_handler.setFormatter(formatter)
-        
-        # Add the console handler to the logger
-        logger.addHandler(console_handler)
-    
-    return logger
-
-def send_message_to_channel(bot_token, channel_id, message):
-    client = WebClient(token=bot_token)
 
-    try:
-        response = client.chat_postMessage(
-            channel=channel_id,
-            text=message,
-            unfurl_links=False,  # Disable link previews
-    unfurl_media=False 
-        )
-        print(f"Message successfully sent to channel {channel_id} on Slack")
-    except SlackApiError as e:
-        print(f"Error sending Message to slack: {e}")
+    # If the logger already has handlers (its own, or the Functions host's on the root
+    # logger), don't add more (this avoids duplicate logs). Otherwise records go through
+    # a queue to a background writer, see utils/log.py
+    configure_logger(logger, add_handler=not logger.hasHandlers())
 
+    return logger
 
 def manage_prv(url):
     if url.startswith("//"):
@@ -73,23 +48,39 @@ def get_header(token):
 
     return headers
 
+PROVINCE_CODES = {
+    "AB": "Alberta",
+    "BC": "British Columbia",
+    "MB": "Manitoba",
+    "NB": "New Brunswick",
+    "NL": "Newfoundland and Labrador",
+    "NS": "Nova Scotia",
+    "ON": "Ontario",
+    "PE": "Prince Edward Island",
+    "QC": "Quebec",
+    "SK": "Saskatchewan",
+    "NT": "Northwest Territories",
+    "NU": "Nunavut",
+    "YT": "Yukon"
+}
+
+US_STATE_CODES = {
+    "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas", "CA": "California",
+    "CO": "Colorado", "CT": "Connecticut", "DE": "Delaware", "DC": "District of Columbia",
+    "FL": "Florida", "GA": "Georgia", "HI": "Hawaii", "ID": "Idaho", "IL": "Illinois",
+    "IN": "Indiana", "IA": "Iowa", "KS": "Kansas", "KY": "Kentucky", "LA": "Louisiana",
+    "ME": "Maine", "MD": "Maryland", "MA": "Massachusetts", "MI": "Michigan", "MN": "Minnesota",
+    "MS": "Mississippi", "MO": "Missouri", "MT": "Montana", "NE": "Nebraska", "NV": "Nevada",
+    "NH": "New Hampshire", "NJ": "New Jersey", "NM": "New Mexico", "NY": "New York",
+    "NC": "North Carolina", "ND": "North Dakota", "OH": "Ohio", "OK": "Oklahoma", "OR": "Oregon",
+    "PA": "Pennsylvania", "RI": "Rhode Island", "SC": "South Carolina", "SD": "South Dakota",
+    "TN": "Tennessee", "TX": "Texas", "UT": "Utah", "VT": "Vermont", "VA": "Virginia",
+    "WA": "Washington", "WV": "West Virginia", "WI": "Wisconsin", "WY": "Wyoming",
+}
+
 def extract_tax_province(province_address):
     province_address = province_address.upper().strip()  # Convert to uppercase and remove leading/trailing spaces
-    province_map = {
-        "AB": "Alberta",
-        "BC": "British Columbia",
-        "MB": "Manitoba",
-        "NB": "New Brunswick",
-        "NL": "Newfoundland and Labrador",
-        "NS": "Nova Scotia",
-        "ON": "Ontario",
-        "PE": "Prince Edward Island",
-        "QC": "Quebec",
-        "SK": "Saskatchewan",
-        "NT": "Northwest Territories",
-        "NU": "Nunavut",
-        "YT": "Yukon"
-    }
+    province_map = PROVINCE_CODES
 
     # Check for full province name
     for code, full_name in province_map.items():
@@ -105,6 +96,18 @@ def extract_tax_province(province_address):
 
     return "Unknown Province"
 
+def route_key(city):
+    """
+    Lookup key for a quote's pickup/destination city: accents removed, case-folded,
+    every run of punctuation or whitespace collapsed to one space, and trimmed, so
+    "  Saint-Jérôme " and "saint jerome" share a key. Keys match exactly.
+    """
+    if city is None:
+        return ""
+    folded = unicodedata.normalize("NFKD", str(city))
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch)).casefold()
+    return re.sub(r"[\W_]+", " ", folded).strip()
+
 def normalize_text(text):
     if isinstance(text, str):
         return text.lower().strip().replace("é", "e")
@@ -0,0 +1,84 @@
+# utils/kdtree.py
+"""
+Static k-d tree for fixed-radius neighbour queries, numpy only.
+
+Built once over an (n, k) array; each node keeps the bounding box of its points so a
+query only descends into boxes that reach within the radius, and leaves are scanned
+with one vectorized distance computation.
+"""
+import numpy as np
+
+
+class KDTree:
+
+    def __init__(self, points, leaf_size: int = 32):
+        self.points = np.asarray(points, dtype=float)
+        if self.points.ndim == 1:
+            self.points = self.points.reshape(-1, 1)
+        self.index = np.arange(len(self.points))
+        self.leaf_size = max(1, leaf_size)
+        lows, highs, bounds, children = [], [], [], []
+
+        pending = [(0, len(self.points), None, 0)] if len(self.points) else []
+        while pending:
+            start, end, parent, side = pending.pop()
+            node = len(bounds)
+            if parent is not None:
+                children[parent][side] = node
+            block = self.points[self.index[start:end]]
+            low, high = block.min(axis=0), block.max(axis=0)
+            lows.append(low)
+            highs.append(high)
+            bounds.append((start, end))
+            children.append([-1, -1])
+            if end - start <= self.leaf_size:
+                continue
+            # split the widest dimension at the median
+            dim = int(np.argmax(high - low))
+            middle = (end - start) // 2
+            order = np.argpartition(block[:, dim], middle)
+            self.index[start:end] = self.index[start:end][order]
+            pending.append((start + middle, end, node, 1))
+            pending.append((start, start + middle, node, 0))
+
+        # plain tuples: per-node box tests are cheaper in python than as tiny numpy calls
+        self.boxes = [tuple(zip(low.tolist(), high.tolist())) for low, high in zip(lows, highs)]
+        self.bounds = bounds
+        self.children = children
+
+    def __len__(self):
+        return len(self.points)
+
+    def query_radius(self, point, radius: float):
+        """(indices, distances) of the points within `radius` of `point`, nearest first."""
+        point = np.asarray(point, dtype=float)
+        coordinates = point.tolist()
+        limit = radius * radius
+        found, distances = [], []
+        pending = [0] if self.bounds else []
+        while pending:
+            node = pending.pop()
+            gap = 0.0
+            for x, (low, high) in zip(coordinates, self.boxes[node]):
+                if x < low:
+                    gap += (low - x) ** 2
+                elif x > high:
+                    gap += (x - high) ** 2
+            if gap > limit:
+                continue
+            left, right = self.children[node]
+            if left >= 0:
+                pending.extend((left, right))
+                continue
+            start, end = self.bounds[node]
+            rows = self.index[start:end]
+            distance = np.sqrt(((self.points[rows] - point) ** 2).sum(axis=1))
+            near = distance <= radius
+            found.append(rows[near])
+            distances.append(distance[near])
+
+        if not found:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        found, distances = np.concatenate(found), np.concatenate(distances)
+        order = np.argsort(distances, kind="stable")
+        return found[order], distances[order]
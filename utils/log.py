@@ -0,0 +1,191 @@
+# utils/log.py
+"""
+Queue-backed logging for the request path.
+
+Loggers from get_logger() hand records to a bounded queue. A single background
+listener formats them and writes them to the console, so a request only pays for building
+the record. Formatting of %-style arguments is deferred to that listener thread as
+well. Don't pass arguments that are mutated after the call.
+
+Two filters keep bursts cheap:
+- RateLimitFilter caps each logger's DEBUG/INFO records per second. Warnings and
+  errors always pass. The next record that gets through notes how many were dropped.
+- log_payload() dumps request/response payloads in full at DEBUG. At INFO only a
+  sampled share of calls (LOG_PAYLOAD_SAMPLE_RATE) is logged.
+
+Settings: LOG_LEVEL (INFO), LOG_ASYNC (true), LOG_QUEUE_SIZE (10000), LOG_RATE_LIMIT
+(records per second per logger, 50; 0 disables), LOG_RATE_BURST (200),
+LOG_PAYLOAD_SAMPLE_RATE (0.01).
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def _env_flag(name, default):
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket over a logger's records below WARNING: `rate` per second, bursts up to `burst`."""
+
+    def __init__(self, rate, burst):
+        super().__init__()
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._pending_suppressed = 0
+        self.suppressed = 0
+
+    def filter(self, record):
+        if self.rate <= 0 or record.levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                self._pending_suppressed += 1
+                self.suppressed += 1
+                return False
+            self._tokens -= 1
+            skipped, self._pending_suppressed = self._pending_suppressed, 0
+        if skipped:
+            record.msg = f"{record.msg} [{skipped} earlier records suppressed by the log rate limit]"
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves message formatting to the listener thread and counts
+    records dropped because the queue is full instead of blocking the caller.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        if record.exc_info:
+            # tracebacks reference live frames; render them while they are still valid
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """The process-wide log queue and the listener thread that drains it."""
+
+    def __init__(self, queue_size=10000, stream=None):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stream_handler = logging.StreamHandler(stream)
+        self.stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        self.handler = DeferredQueueHandler(self.queue)
+        self.listener = logging.handlers.QueueListener(self.queue, self.stream_handler, respect_handler_level=True)
+        self._started = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if not self._started:
+                self.listener.start()
+                self._started = True
+                atexit.register(self.stop)
+
+    def stop(self):
+        """Drain the queue and stop the listener; safe to call more than once."""
+        with self._lock:
+            if self._started:
+                self.listener.stop()
+                self._started = False
+
+    def flush(self, timeout=5.0) -> bool:
+        """Wait until every queued record has been written; True if the queue drained in time."""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.005)
+        self.stream_handler.flush()
+        return not self.queue.unfinished_tasks
+
+
+_PIPELINE = None
+_PIPELINE_LOCK = threading.Lock()
+_RATE_FILTERS = {}
+
+
+def get_pipeline() -> LogPipeline:
+    global _PIPELINE
+    if _PIPELINE is None:
+        with _PIPELINE_LOCK:
+            if _PIPELINE is None:
+                pipeline = LogPipeline(queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+                pipeline.start()
+                _PIPELINE = pipeline
+    return _PIPELINE
+
+
+def configure_logger(logger, add_handler=True):
+    """Set the level and rate limit of a logger (once), and attach the output handler if asked."""
+    if logger.name in _RATE_FILTERS:
+        return logger
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    if add_handler:
+        if _env_flag("LOG_ASYNC", "true"):
+            handler = get_pipeline().handler
+        else:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logger.addHandler(handler)
+
+    rate_filter = RateLimitFilter(
+        rate=float(os.getenv("LOG_RATE_LIMIT", "50")),
+        burst=int(os.getenv("LOG_RATE_BURST", "200")),
+    )
+    logger.addFilter(rate_filter)
+    _RATE_FILTERS[logger.name] = rate_filter
+    return logger
+
+
+PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+_payloads = {"logged": 0, "skipped": 0}
+
+
+def log_payload(logger, label, payload, sample_rate=None):
+    """
+    Log a request/response payload lazily: in full when `logger` is at DEBUG, otherwise
+    at INFO for a random `sample_rate` share of calls.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s: %s", label, payload)
+    elif random.random() < (PAYLOAD_SAMPLE_RATE if sample_rate is None else sample_rate):
+        logger.info("%s (sampled): %s", label, payload)
+    else:
+        _payloads["skipped"] += 1
+        return
+    _payloads["logged"] += 1
+
+
+def log_stats() -> dict:
+    pipeline = _PIPELINE
+    return {
+        "queued": pipeline.queue.qsize() if pipeline else 0,
+        "dropped": pipeline.handler.dropped if pipeline else 0,
+        "rate_limited": {name: f.suppressed for name, f in sorted(_RATE_FILTERS.items()) if f.suppressed},
+        "payloads_logged": _payloads["logged"],
+        "payloads_skipped": _payloads["skipped"],
+    }
@@ -0,0 +1,153 @@
+# utils/notifier.py
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from utils.helpers import get_logger
+
+logger = get_logger(__name__)
+
+
+class SlackDispatcher:
+    """
+    Sends Slack messages from a background thread so requests never wait on Slack.
+
+    Messages go into a bounded queue. Messages arriving within `batch_window` seconds
+    for the same channel are posted together as one grouped message. Failed posts are
+    retried with exponential backoff (honouring Retry-After on rate limits). When the
+    queue is full, or a post keeps failing, messages are appended to `spill_path` and
+    replayed later; without a spill path they are dropped.
+    """
+
+    def __init__(self, bot_token, max_queue=500, batch_window=2.0, max_batch=20,
+                 max_retries=4, backoff=1.0, spill_path=None, base_url=None, client=None):
+        self.bot_token = bot_token
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.spill_path = spill_path
+        self.base_url = base_url
+        self._client = client
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._spill_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.counters = defaultdict(int)
+
+    @property
+    def client(self):
+        if self._client is None:
+            from slack_sdk import WebClient
+            kwargs = {"base_url": self.base_url} if self.base_url else {}
+            self._client = WebClient(token=self.bot_token, **kwargs)
+        return self._client
+
+    def notify(self, channel_id, message) -> bool:
+        """Queue a message without blocking; returns False if it had to be spilled or dropped."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((channel_id, message))
+            self.counters["queued"] += 1
+            return True
+        except queue.Full:
+            self._spill([(channel_id, message)])
+            return False
+
+    def flush(self, timeout=10.0) -> bool:
+        """Wait until every queued message has been handled; True if the queue drained in time."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def stats(self) -> dict:
+        return {**self.counters, "pending": self._queue.qsize()}
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="slack-dispatcher", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                by_channel = defaultdict(list)
+                for channel_id, message in batch:
+                    by_channel[channel_id].append(message)
+                delivered = True
+                for channel_id, messages in by_channel.items():
+                    if not self._post(channel_id, messages):
+                        delivered = False
+                        self._spill([(channel_id, m) for m in messages])
+                if delivered:  # Slack is reachable again, pick up anything spilled earlier
+                    self._replay_spill()
+            except Exception as e:
+                logger.error(f"Slack dispatcher error: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _post(self, channel_id, messages) -> bool:
+        text = messages[0] if len(messages) == 1 else f"*{len(messages)} notifications*\n\n" + "\n\n───\n\n".join(messages)
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.client.chat_postMessage(channel=channel_id, text=text, unfurl_links=False, unfurl_media=False)
+                self.counters["posts"] += 1
+                self.counters["sent"] += len(messages)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.warning(f"Giving up on Slack message to {channel_id}: {e}")
+                    return False
+                self.counters["retries"] += 1
+                headers = getattr(getattr(e, "response", None), "headers", None) or {}
+                retry_after = headers.get("Retry-After") or headers.get("retry-after")
+                time.sleep(float(retry_after) if retry_after else self.backoff * (2 ** attempt))
+        return False
+
+    def _spill(self, items):
+        if not self.spill_path:
+            self.counters["dropped"] += len(items)
+            return
+        with self._spill_lock:
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for channel_id, message in items:
+                    f.write(json.dumps({"channel": channel_id, "text": message}) + "\n")
+        self.counters["spilled"] += len(items)
+
+    def _replay_spill(self):
+        """Re-queue spilled messages while there is room in the queue."""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        with self._spill_lock:
+            with open(self.spill_path, encoding="utf-8") as f:
+                items = [json.loads(line) for line in f if line.strip()]
+            os.remove(self.spill_path)
+
+        leftover = []
+        for item in items:
+            try:
+                self._queue.put_nowait((item["channel"], item["text"]))
+                self.counters["replayed"] += 1
+            except queue.Full:
+                leftover.append((item["channel"], item["text"]))
+        if leftover:
+            self._spill(leftover)
+            self.counters["spilled"] -= len(leftover)
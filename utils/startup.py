@@ -0,0 +1,59 @@
+# utils/startup.py
+"""
+Startup timing report: how long each import and lazy initialization took.
+
+Usage:
+    with timed("import pandas"):
+        import pandas as pd
+
+Run `python -m utils.startup` to import the function app and print the report.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+PROCESS_START = time.perf_counter()
+
+_timings = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+@contextmanager
+def timed(component):
+    """Record how long the block takes under `component`; blocks may nest."""
+    depth = getattr(_local, "depth", 0)
+    _local.depth = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _local.depth = depth
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _timings.append({
+                "component": component,
+                "seconds": round(elapsed, 4),
+                "started_at": round(start - PROCESS_START, 4),
+                "depth": depth,
+            })
+
+
+def startup_report():
+    """Recorded timings in start order, with the total of the top-level entries."""
+    with _lock:
+        components = sorted(_timings, key=lambda t: t["started_at"])
+    return {
+        "components": components,
+        "total_seconds": round(sum(t["seconds"] for t in components if t["depth"] == 0), 4),
+    }
+
+
+if __name__ == "__main__":
+    # use the importable module, not this __main__ copy, so the app's timings are seen
+    from utils import startup
+
+    with startup.timed("import function_app"):
+        import function_app  # noqa: F401
+    print(json.dumps(startup.startup_report(), indent=2))
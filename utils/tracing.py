@@ -0,0 +1,176 @@
+# utils/tracing.py
+"""
+Lightweight latency spans.
+
+`with span("leads.recommend"):` (or `@traced("leads")` on a function) times a stage,
+adds it to an in-process latency histogram and logs a record. A sampled share of traces
+(TRACE_SPAN_SAMPLE_RATE) is logged at INFO, so it reaches Application Insights in
+production; the other spans are logged at DEBUG, like log_payload() does for payloads.
+The dimensions are written into the message, which is all the Functions host forwards;
+they are also attached as `custom_dimensions` for handlers that export them (e.g. an
+OpenCensus AzureLogHandler). Spans opened inside another span share its trace id, its
+sampling decision, and name it as their parent, across awaits and gathered tasks.
+"""
+import bisect
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from utils.helpers import get_logger
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# histogram bucket upper bounds: 0.1 ms up to ~2 minutes, each bound 10% above the last,
+# so reported percentiles are within 10% of the true value
+BUCKET_BOUNDS_MS = []
+_bound = 0.1
+while _bound < 120_000:
+    BUCKET_BOUNDS_MS.append(round(_bound, 4))
+    _bound *= 1.1
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; constant memory however many samples it records."""
+
+    def __init__(self, bounds=BUCKET_BOUNDS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, ms, error=False):
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.errors += error
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-quantile (0 < q <= 1), capped at the max seen."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                bound = self.bounds[index] if index < len(self.bounds) else self.max_ms
+                return round(min(bound, self.max_ms), 2)
+        return round(self.max_ms, 2)
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else None,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+class Tracer:
+    """Per-stage latency histograms, plus a structured log record for every span."""
+
+    def __init__(self, logger=None, log_spans=True, sample_rate=0.0):
+        """`sample_rate` is the share of traces whose spans are logged at INFO rather than DEBUG."""
+        self.logger = logger or get_logger("tracing")
+        self.log_spans = log_spans
+        self.sample_rate = sample_rate
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **dimensions):
+        """
+        Time the enclosed block as stage `name`. Yields a dict; keys added to it (e.g. a
+        status code) are logged with the span.
+        """
+        parent = _current_span.get()
+        if parent:
+            trace_id, _, sampled = parent
+        else:
+            trace_id, sampled = uuid.uuid4().hex[:16], random.random() < self.sample_rate
+        token = _current_span.set((trace_id, name, sampled))
+        start = time.perf_counter()
+        error = None
+        try:
+            yield dimensions
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            _current_span.reset(token)
+            self.record(name, elapsed_ms, error=error is not None)
+            if self.log_spans:
+                level = logging.INFO if sampled else logging.DEBUG
+                self._log(level, name, elapsed_ms, trace_id, parent[1] if parent else None, error, dimensions)
+
+    def record(self, name, elapsed_ms, error=False):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            histogram.record(elapsed_ms, error)
+
+    def _log(self, level, name, elapsed_ms, trace_id, parent, error, dimensions):
+        if not self.logger.isEnabledFor(level):
+            return
+        custom_dimensions = {
+            "span": name,
+            "duration_ms": round(elapsed_ms, 2),
+            "trace_id": trace_id,
+            "parent_span": parent,
+            "status": "error" if error is not None else "ok",
+            **{key: str(value) for key, value in dimensions.items()},
+        }
+        if error is not None:
+            custom_dimensions["error"] = type(error).__name__
+        details = " ".join(f"{key}={value}" for key, value in custom_dimensions.items() if key not in ("span", "duration_ms"))
+        self.logger.log(level, "span %s took %.1f ms %s", name, elapsed_ms, details,
+                        extra={"custom_dimensions": custom_dimensions})
+
+    def snapshot(self):
+        """Latency summary per stage, sorted by stage name."""
+        with self._lock:
+            return {name: self._histograms[name].snapshot() for name in sorted(self._histograms)}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+TRACER = Tracer(
+    log_spans=os.getenv("TRACE_LOG_SPANS", "true").lower() in ("1", "true", "yes"),
+    sample_rate=float(os.getenv("TRACE_SPAN_SAMPLE_RATE", "0.1")),
+)
+span = TRACER.span
+
+
+def traced(name):
+    """Decorator form of span() for plain and async functions."""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate